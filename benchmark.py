@@ -0,0 +1,133 @@
+"""Measures mini_ruthen startup time and how RunPopulation scales with the number of worker processes."""
+
+import argparse
+import csv
+import os
+import pickle
+import subprocess
+import sys
+import time
+
+import mini_ruthen
+import person
+
+# A fixed, middle-of-the-road strategy so that runs are comparable
+BENCHMARK_STRATEGY = person.Strategy(
+    planned_retirement_age=65,
+    savings_threshold=0,
+    savings_rate=0.1,
+    savings_rrsp_fraction=0.1,
+    savings_tfsa_fraction=0.2,
+    lico_target_fraction=1.0,
+    working_period_drawdown_tfsa_fraction=0.5,
+    working_period_drawdown_nonreg_fraction=0.5,
+    oas_bridging_fraction=1.0,
+    drawdown_ced_fraction=0.8,
+    initial_cd_fraction=0.04,
+    drawdown_preferred_rrsp_fraction=0.35,
+    drawdown_preferred_tfsa_fraction=0.5,
+    reinvestment_preference_tfsa_fraction=0.8)
+
+SCALING_FIELDS = ("mode", "workers", "n", "wall_seconds", "lives_per_sec", "speedup", "efficiency",
+                  "pool_startup_seconds", "simulation_seconds", "ipc_seconds", "merge_seconds",
+                  "peak_rss_kb", "bundle_bytes")
+
+STARTUP_FIELDS = ("measure", "seconds", "overhead_seconds", "budget_seconds", "within_budget")
+
+def MeasureStartup(budget_seconds, repeats, writer):
+  """Times fresh interpreters doing progressively more of a short run.
+
+  Overheads are relative to a bare interpreter. The budget applies to
+  importing mini_ruthen, which every scripted run pays before simulating.
+  """
+  commands = [
+      ("interpreter", [sys.executable, "-c", "pass"], None),
+      ("import mini_ruthen", [sys.executable, "-c", "import mini_ruthen"], budget_seconds),
+      ("validation run, 10 lives", [sys.executable, "mini_ruthen.py", "--number=10", "--basic_run", "--disable_multiprocessing"], None),
+  ]
+  cwd = os.path.dirname(os.path.abspath(mini_ruthen.__file__))
+  interpreter_seconds = None
+  for measure, command, budget in commands:
+    best = None
+    for _ in range(repeats):
+      start = time.perf_counter()
+      subprocess.run(command, cwd=cwd, stdout=subprocess.DEVNULL, check=True)
+      elapsed = time.perf_counter() - start
+      best = elapsed if best is None else min(best, elapsed)
+    if interpreter_seconds is None:
+      interpreter_seconds = best
+    overhead_seconds = best - interpreter_seconds
+    writer.writerow((measure, best, overhead_seconds, budget, None if budget is None else overhead_seconds <= budget))
+
+def WorkerCounts(max_workers):
+  """Returns 1, 2, 4, ... up to and including max_workers."""
+  counts = []
+  workers = 1
+  while workers < max_workers:
+    counts.append(workers)
+    workers *= 2
+  counts.append(max_workers)
+  return counts
+
+def RunScaling(mode, n, max_workers, basic, repeats, writer):
+  """Runs a fixed workload at each worker count and writes one row per count.
+
+  In strong mode every worker count simulates n lives. In weak mode each
+  worker simulates n lives, so efficiency is the ratio of single worker wall
+  time to wall time at the given count.
+  """
+  baseline = None
+  for workers in WorkerCounts(max_workers):
+    lives = n if mode == "strong" else n * workers
+    best = None
+    for _ in range(repeats):
+      accumulators, timing = mini_ruthen.TimedRunPopulation(
+          BENCHMARK_STRATEGY, person.FEMALE, lives, basic, True, True, processes=workers)
+      if best is None or timing.wall_seconds < best.wall_seconds:
+        best = timing
+
+    # Blocks are shared out between the workers, so this is each worker's simulation time if the load is balanced
+    simulation_seconds = sum(t.simulation_seconds for t in best.worker_timings) / best.workers
+    ipc_seconds = max(0, best.wall_seconds - best.pool_startup_seconds - simulation_seconds - best.merge_seconds)
+    lives_per_sec = lives / best.wall_seconds
+    if baseline is None:
+      baseline = lives_per_sec
+    speedup = lives_per_sec / baseline
+    writer.writerow((
+        mode,
+        workers,
+        lives,
+        best.wall_seconds,
+        lives_per_sec,
+        speedup,
+        speedup / workers,
+        best.pool_startup_seconds,
+        simulation_seconds,
+        ipc_seconds,
+        best.merge_seconds,
+        max(t.peak_rss_kb for t in best.worker_timings),
+        len(pickle.dumps(accumulators))))
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Benchmark the simulation engine')
+  parser.add_argument('--number', help='Lives to simulate (per worker in weak scaling mode)', type=int, default=1000)
+  parser.add_argument('--max_workers', help='Largest worker count to try', type=int, default=os.cpu_count())
+  parser.add_argument('--scaling', help='Which scaling experiment to run', choices=["strong", "weak", "both", "none"], default="both")
+  parser.add_argument('--repeats', help='Runs per worker count; the fastest one is reported', type=int, default=1)
+  parser.add_argument('--startup_repeats', help='Launches per startup measurement; the fastest one is reported', type=int, default=5)
+  parser.add_argument('--startup_budget_ms', help='Allowed time to import mini_ruthen, over that of a bare interpreter', type=float, default=50)
+  parser.add_argument('--full_tables', help='Accumulate everything needed for the full set of output tables', action='store_true', default=False)
+  args = parser.parse_args()
+
+  writer = csv.writer(sys.stdout, lineterminator='\n')
+  writer.writerow(STARTUP_FIELDS)
+  MeasureStartup(args.startup_budget_ms / 1000, args.startup_repeats, writer)
+
+  if args.scaling != "none":
+    sys.stdout.write('\n')
+    writer.writerow(SCALING_FIELDS)
+    modes = ["strong", "weak"] if args.scaling == "both" else [args.scaling]
+    for mode in modes:
+      RunScaling(mode, args.number, args.max_workers, not args.full_tables, args.repeats, writer)
+      sys.stdout.flush()
@@ -1,45 +1,130 @@
-"""Copies fitness values from multiple optimization runs into one CSV file with one run per column."""
+"""Copies fitness values from multiple optimization runs into one CSV file with one run per column.
+
+Files are parsed in parallel and each run's values are spilled to a temporary
+file as they arrive, so memory use is bounded by the largest single input
+rather than the whole campaign. Values are copied as they are written in the
+inputs. Runs may have different numbers of generations; missing generations
+are left blank and every run's final fitness lines up in the last row. Inputs may be glob patterns, and files
+ending in .gz, .bz2 or .xz are decompressed on the fly.
+"""
 
 import argparse
+import array
+import bz2
 import csv
+import glob
+import gzip
 import logging
+import lzma
+import multiprocessing
+import os
 import sys
+import tempfile
+
+HEADER = "Generation,Best Fitness,Fitness Mean,Fitness Stddev,Best Individual ID\n"
+
+OPENERS = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open}
+
+# Number of values held in memory at once while transposing the spilled runs
+BLOCK_VALUES = 1 << 20
+
+# Spilled values are padded with this to their run's widest value, so each one can be found by its index
+PADDING = b" "
+
+def OpenInput(path):
+  """Opens path for reading as text, decompressing it according to its extension"""
+  return OPENERS.get(os.path.splitext(path)[1], open)(path, "rt")
+
+def ExpandPaths(patterns):
+  """Returns the files matching each pattern in order, sorted within a pattern. Patterns matching nothing are warned about."""
+  paths = []
+  for pattern in patterns:
+    matches = sorted(glob.glob(pattern)) or ([pattern] if os.path.exists(pattern) else [])
+    if not matches:
+      logging.warning("%s matches no files", pattern)
+    paths.extend(matches)
+  return paths
+
+def ReadRun(path):
+  """Returns (path, fitness values by generation, final fitness or None) for one optimization output, or None if it has none.
+
+  Values are returned as the ASCII bytes they are written as.
+  """
+  try:
+    with OpenInput(path) as f:
+      if next(f, None) != HEADER:
+        logging.warning("%s does not appear to contain fitness values", path)
+        return None
+
+      # Copy the fitness values during the optimization
+      generations = []
+      for line in f:
+        line = line.strip()
+        if not line:
+          break
+        generations.append(line.split(',')[1].encode('ascii'))
+
+      # Find the final run's fitness value
+      final = None
+      for line in f:
+        if line.startswith('Fitness Function Value,'):
+          final = line.strip().split(',')[1]
+          break
+  # UnicodeError is a ValueError, for values that aren't ASCII
+  except (OSError, EOFError, ValueError, IndexError, lzma.LZMAError) as e:
+    logging.warning("%s could not be read: %s", path, e)
+    return None
+
+  return path, generations, final
+
+def Combine(paths, out, processes=None):
+  """Writes the combined table for paths to out, with one row per generation and one column per readable run"""
+  offsets = array.array('q')
+  lengths = array.array('q')
+  widths = array.array('q')
+  finals = []
+
+  with tempfile.TemporaryFile() as spill:
+    # Spill each run's generations as fixed-width records, in the order the files were given
+    with multiprocessing.Pool(processes) as pool:
+      for run in pool.imap(ReadRun, paths, chunksize=16):
+        if run is None:
+          continue
+        _, generations, final = run
+        width = max(map(len, generations), default=0)
+        offsets.append(spill.tell())
+        lengths.append(len(generations))
+        widths.append(width)
+        finals.append(final)
+        spill.write(b"".join(value.ljust(width, PADDING) for value in generations))
+
+    if not lengths:
+      logging.error("No fitness values found")
+      return
+
+    # Transpose a block of generations at a time
+    w = csv.writer(out)
+    rows = max(lengths)
+    block_rows = max(1, BLOCK_VALUES // len(lengths))
+    for start in range(0, rows, block_rows):
+      stop = min(start + block_rows, rows)
+      block = []
+      for offset, length, width in zip(offsets, lengths, widths):
+        values = []
+        if start < length:
+          spill.seek(offset + start * width)
+          records = spill.read((min(stop, length) - start) * width)
+          values = [records[i:i + width].rstrip(PADDING).decode('ascii') for i in range(0, len(records), width)]
+        block.append(values)
+      for i in range(start, stop):
+        w.writerow(['Gen %d' % i] + [values[i - start] if i - start < len(values) else '' for values in block])
+    w.writerow(['Final'] + ['' if final is None else final for final in finals])
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Copy fitness values into one CSV table')
+  parser.add_argument('files', metavar='file', nargs='+', help='file or glob pattern to extract fitness values from; may be .gz, .bz2 or .xz compressed')
+  parser.add_argument('--processes', help='number of files to parse in parallel; defaults to the number of CPUs', type=int, default=None)
 
-parser = argparse.ArgumentParser(description='Copy fitness values into one CSV table')
-parser.add_argument('files', metavar='file', type=open, nargs='+', help='file to extract fitness values from')
-
-args = parser.parse_args()
-
-t = []
-for f in args.files:
-  header = next(f)
-  if header != "Generation,Best Fitness,Fitness Mean,Fitness Stddev,Best Individual ID\n":
-    logging.warning("%s does not appear to contain fitness values", f.name)
-    continue
-
-  col = []
-  # Copy the fitness values during the optimization
-  for line in f:
-    line = line.strip()
-    if not line:
-      break
-
-    row = line.split(',')
-    col.append(row[1])
-  # Find the final run's fitness value and copy it in last
-  for line in f:
-    line = line.strip()
-    if line.startswith('Fitness Function Value,'):
-      row = line.split(',')
-      col.append(row[1])
-      break
-
-  t.append(col)
-
-# Insert what will become the header column in the table once it's transposed
-header_row = ['Gen %d' % i for i in range(len(t[0])-1)] + ['Final']
-t.insert(0, header_row)
-
-w = csv.writer(sys.stdout)
-for row in zip(*t):
-  w.writerow(row)
+  args = parser.parse_args()
+  Combine(ExpandPaths(args.files), sys.stdout, args.processes)
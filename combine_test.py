@@ -0,0 +1,72 @@
+import gzip
+import io
+import os
+import tempfile
+import unittest
+import combine
+
+class CombineTest(unittest.TestCase):
+
+  def setUp(self):
+    self.tmpdir = tempfile.TemporaryDirectory()
+    self.addCleanup(self.tmpdir.cleanup)
+
+  def WriteRun(self, name, generations, final, opener=open):
+    """Writes an optimization output with the given best fitness strings and returns its path"""
+    path = os.path.join(self.tmpdir.name, name)
+    with opener(path, "wt") as f:
+      f.write(combine.HEADER)
+      for i, fitness in enumerate(generations):
+        f.write("%d,%s,0.5,0.1,%d\n" % (i, fitness, i))
+      f.write("\nFitness Function Value,%s\n" % final)
+    return path
+
+  def Combine(self, paths):
+    out = io.StringIO()
+    combine.Combine(paths, out, processes=2)
+    return out.getvalue().splitlines()
+
+  def testEqualLengthRuns(self):
+    a = self.WriteRun("a.csv", ["36849", "1e-05", "0.10"], "37000.50")
+    b = self.WriteRun("b.csv", ["1.5", "2.25", "-3"], "4")
+    # Values are copied as written
+    self.assertEqual(self.Combine([a, b]), ["Gen 0,36849,1.5", "Gen 1,1e-05,2.25", "Gen 2,0.10,-3", "Final,37000.50,4"])
+
+  def testRaggedRuns(self):
+    a = self.WriteRun("a.csv", ["1", "2", "3"], "3.5")
+    b = self.WriteRun("b.csv", ["10"], "10.5")
+    c = self.WriteRun("c.csv", ["100", "200"], "250")
+    self.assertEqual(self.Combine([a, b, c]), ["Gen 0,1,10,100", "Gen 1,2,,200", "Gen 2,3,,", "Final,3.5,10.5,250"])
+
+  def testRaggedRunsAcrossBlocks(self):
+    a = self.WriteRun("a.csv", ["1", "22", "333", "4444", "5"], "6")
+    b = self.WriteRun("b.csv", ["7.0", "8"], "9")
+    whole = self.Combine([a, b])
+    block_values = combine.BLOCK_VALUES
+    combine.BLOCK_VALUES = 2
+    try:
+      self.assertEqual(self.Combine([a, b]), whole)
+    finally:
+      combine.BLOCK_VALUES = block_values
+    self.assertEqual(whole[:2], ["Gen 0,1,7.0", "Gen 1,22,8"])
+    self.assertEqual(whole[4:], ["Gen 4,5,", "Final,6,9"])
+
+  def testSkipsUnreadableFiles(self):
+    a = self.WriteRun("a.csv", ["1"], "2")
+    other = os.path.join(self.tmpdir.name, "other.csv")
+    with open(other, "w") as f:
+      f.write("not,fitness,values\n")
+    compressed = self.WriteRun("c.csv.gz", ["3"], "4", gzip.open)
+    with self.assertLogs(level="WARNING"):
+      self.assertIsNone(combine.ReadRun(other))
+    self.assertEqual(self.Combine([a, other, compressed]), ["Gen 0,1,3", "Final,2,4"])
+
+  def testMissingFinal(self):
+    path = os.path.join(self.tmpdir.name, "a.csv")
+    with open(path, "w") as f:
+      f.write(combine.HEADER + "0,1.25,0,0,0\n")
+    self.assertEqual(self.Combine([path]), ["Gen 0,1.25", "Final,"])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,76 @@
+"""Stores the raw fitness components of evaluated strategies so they can be rescored under new weights.
+
+Each record is one JSON object per line holding the strategy, the number of
+lives simulated, the gender, whether values were real, a hash of the sampling
+options, and the value and standard error of every fitness component.
+Weights are only applied when rescoring, so one file serves any weighting,
+but only records simulated alike should be ranked against each other.
+"""
+
+import collections
+import json
+import math
+import person
+
+ComponentsRecord = collections.namedtuple("ComponentsRecord", ["strategy", "n", "components", "gender", "real_values", "sampling"],
+                                          defaults=[None, None, None])
+
+RescoredStrategy = collections.namedtuple("RescoredStrategy", ["fitness", "record"])
+
+class ComponentsWriter(object):
+  """Appends ComponentsRecords to a file, one per line as each strategy is evaluated."""
+
+  def __init__(self, path):
+    self.out = open(path, 'a', buffering=1)
+
+  def Write(self, strategy, n, rows, gender, real_values, sampling):
+    """Writes the record for strategy, taking the components from FitnessFunctionCompositionRows.
+
+    sampling is a hash that tells the sampling options apart, such as mini_ruthen.SamplingHash's.
+    """
+    record = {
+        "strategy": strategy._asdict(),
+        "n": n,
+        "gender": gender,
+        "real_values": real_values,
+        "sampling": sampling,
+        "components": {row.component: [row.value, row.stderr] for row in rows},
+    }
+    self.out.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+  def Close(self):
+    self.out.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.Close()
+
+
+def ReadRecords(path):
+  """Returns the ComponentsRecords in a file written by ComponentsWriter"""
+  records = []
+  with open(path) as f:
+    for line in f:
+      if not line.strip():
+        continue
+      record = json.loads(line)
+      components = {component: tuple(value_stderr) for component, value_stderr in record["components"].items()}
+      records.append(ComponentsRecord(person.Strategy(**record["strategy"]), record["n"], components,
+                                      record.get("gender"), record.get("real_values"), record.get("sampling")))
+  return records
+
+def Matching(records, gender, real_values, sampling):
+  """Returns the records simulated with the given gender, real_values and sampling hash. Records written without them never match."""
+  return [record for record in records
+          if (record.gender, record.real_values, record.sampling) == (gender, real_values, sampling)]
+
+def Fitness(components, weights):
+  """Returns the weighted sum of component values. Components without a non-zero weight are ignored, even if NaN."""
+  return sum(weight * components[component][0] for component, weight in weights.items() if weight)
+
+def Rescore(records, weights):
+  """Returns a RescoredStrategy for every record, best fitness first and NaN fitness last"""
+  return sorted((RescoredStrategy(Fitness(record.components, weights), record) for record in records),
+                key=lambda rescored: (not math.isnan(rescored.fitness), rescored.fitness), reverse=True)
@@ -0,0 +1,87 @@
+import collections
+import json
+import math
+import os
+import tempfile
+import unittest
+import components
+import person
+
+# Stand-in for mini_ruthen.FitnessFunctionCompositionRow
+Row = collections.namedtuple("Row", ["component", "value", "stderr", "weight", "contribution"])
+
+class ComponentsTest(unittest.TestCase):
+
+  def setUp(self):
+    self.strategy = person.Strategy(
+        planned_retirement_age=65,
+        savings_threshold=0,
+        savings_rate=0.1,
+        savings_rrsp_fraction=0.1,
+        savings_tfsa_fraction=0.2,
+        lico_target_fraction=1.0,
+        working_period_drawdown_tfsa_fraction=0.5,
+        working_period_drawdown_nonreg_fraction=0.5,
+        oas_bridging_fraction=1.0,
+        drawdown_ced_fraction=0.8,
+        initial_cd_fraction=0.04,
+        drawdown_preferred_rrsp_fraction=0.35,
+        drawdown_preferred_tfsa_fraction=0.5,
+        reinvestment_preference_tfsa_fraction=0.8)
+
+  def testWriteReadRoundTrip(self):
+    rows = [Row("A", 10, 0.5, 1, 10), Row("B", 3, None, 0, 0), Row("C", float('nan'), float('nan'), 0, 0)]
+    with tempfile.TemporaryDirectory() as tmpdir:
+      path = os.path.join(tmpdir, "components.jsonl")
+      with components.ComponentsWriter(path) as writer:
+        writer.Write(self.strategy, 100, rows, person.FEMALE, True, "abc")
+      with components.ComponentsWriter(path) as writer:
+        writer.Write(self.strategy._replace(savings_rate=0.2), 200, rows, person.MALE, False, "def")
+      records = components.ReadRecords(path)
+
+    self.assertEqual(len(records), 2)
+    self.assertEqual(records[0].strategy, self.strategy)
+    self.assertEqual(records[1].strategy.savings_rate, 0.2)
+    self.assertEqual(records[1].n, 200)
+    self.assertEqual((records[0].gender, records[0].real_values, records[0].sampling), (person.FEMALE, True, "abc"))
+    self.assertEqual((records[1].gender, records[1].real_values, records[1].sampling), (person.MALE, False, "def"))
+    self.assertEqual(records[0].components["A"], (10, 0.5))
+    self.assertEqual(records[0].components["B"], (3, None))
+    self.assertTrue(math.isnan(records[0].components["C"][0]))
+
+  def testFitnessIgnoresZeroWeights(self):
+    self.assertEqual(components.Fitness({"A": (10, 1), "B": (float('nan'), None)}, {"A": 2, "B": 0}), 20)
+
+  def testRescore(self):
+    records = [
+        components.ComponentsRecord(self.strategy, 10, {"A": (1, 0), "B": (5, 0)}),
+        components.ComponentsRecord(self.strategy, 20, {"A": (3, 0), "B": (1, 0)}),
+        components.ComponentsRecord(self.strategy, 30, {"A": (float('nan'), 0), "B": (1, 0)}),
+    ]
+
+    self.assertEqual([r.record.n for r in components.Rescore(records, {"A": 1, "B": 0})], [20, 10, 30])
+    self.assertEqual([r.record.n for r in components.Rescore(records, {"A": 0, "B": 1})], [10, 20, 30])
+    self.assertEqual(components.Rescore(records, {"A": 1, "B": 1})[0].fitness, 6)
+
+  def testMatching(self):
+    records = [
+        components.ComponentsRecord(self.strategy, 10, {}, person.FEMALE, True, "abc"),
+        components.ComponentsRecord(self.strategy, 20, {}, person.MALE, True, "abc"),
+        components.ComponentsRecord(self.strategy, 30, {}, person.FEMALE, False, "abc"),
+        components.ComponentsRecord(self.strategy, 40, {}, person.FEMALE, True, "def"),
+        components.ComponentsRecord(self.strategy, 50, {}),
+    ]
+    self.assertEqual([record.n for record in components.Matching(records, person.FEMALE, True, "abc")], [10])
+
+  def testReadRecordsWithoutSimulationFields(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      path = os.path.join(tmpdir, "components.jsonl")
+      with open(path, "w") as f:
+        f.write('{"strategy":%s,"n":100,"components":{"A":[1,0]}}\n' % json.dumps(self.strategy._asdict()))
+      records = components.ReadRecords(path)
+    self.assertEqual(records[0].components, {"A": (1, 0)})
+    self.assertEqual(components.Matching(records, person.FEMALE, True, "abc"), [])
+
+
+if __name__ == '__main__':
+  unittest.main()
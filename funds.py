@@ -5,11 +5,7 @@ import utils
 import world
 import incomes
 
-# Special value indicating fund has no cap on deposits
-NO_ROOM_LIMIT = "No limit"
-
 # Types of funds, used in receipts
-FUND_TYPE_NONE = "Generic Fund"
 FUND_TYPE_TFSA = "TFSA"
 FUND_TYPE_RRSP = "RRSP"
 FUND_TYPE_NONREG = "Non Registered"
@@ -23,194 +19,150 @@ TaxReceipt = collections.namedtuple('TaxReceipt', ('gross_gain', 'fund_type'))
 GrowthRecord = collections.namedtuple('GrowthRecord', ('growth_amount', 'fund_type'))
 
 
-class Fund(object):
+# The fixed slots of a FundLedger: working period funds, the RRSP bridging fund, and the retirement funds drawn down
+# by the CD and CED rules. They are in the order a person's funds are opened in, which is the order sums over them take.
+WP_TFSA, WP_RRSP, WP_NONREG, BRIDGING, CD_RRSP, CED_RRSP, CD_TFSA, CED_TFSA, CD_NONREG, CED_NONREG = range(10)
+SLOT_FUND_TYPES = (FUND_TYPE_TFSA, FUND_TYPE_RRSP, FUND_TYPE_NONREG, FUND_TYPE_BRIDGING, FUND_TYPE_RRSP, FUND_TYPE_RRSP,
+                   FUND_TYPE_TFSA, FUND_TYPE_TFSA, FUND_TYPE_NONREG, FUND_TYPE_NONREG)
 
-  def __init__(self):
-    self.fund_type = FUND_TYPE_NONE
-    self.amount = 0
-    self.room_replenishes = False
-    self.unrealized_gains = 0
-    self.forced_withdraw = 0
-  
-  def Deposit(self, amount, year_rec):
-    room = self.GetRoom(year_rec)
-    if room == NO_ROOM_LIMIT:
-      self.amount += amount
-      deposited = amount
-    else:
-      if room >= amount:
-        self.amount += amount
-        room -= amount
-        deposited = amount
-      else:
-        deposited = room
-        self.amount += deposited
-        room = 0
-    year_rec.deposits.append(DepositReceipt(deposited, self.fund_type))
-    self.SetRoom(year_rec, room)
-    return (deposited, year_rec)
 
-  def Withdraw(self, amount, year_rec):
-    room = self.GetRoom(year_rec)
-    try:
-      gain_proportion = self.unrealized_gains / self.amount
-    except ZeroDivisionError:
-      gain_proportion = 0
+class FundLedger(object):
+  """All of a person's funds, as lists of amounts, unrealized gains and forced withdrawals indexed by fixed slots.
 
-    if self.forced_withdraw > amount:
-      amount = self.forced_withdraw
+  A slot's fund type decides how it behaves. TFSA and RRSP deposits are
+  limited by the year's room, and TFSA withdrawals give room back. Bridging
+  funds take no deposits. RRSPs have a minimum withdrawal each year, and
+  non-registered funds realize part of their gains every year. Only open
+  slots take part in Update and Total; the working period slots start open.
+  """
 
-    if self.amount >= amount:
-      withdrawn = amount
-      self.amount -= amount
+  def __init__(self):
+    self.amount = [0] * len(SLOT_FUND_TYPES)
+    self.unrealized_gains = [0] * len(SLOT_FUND_TYPES)
+    self.forced_withdraw = [0] * len(SLOT_FUND_TYPES)
+    self.open_slots = [WP_TFSA, WP_RRSP, WP_NONREG]
+
+  def Open(self, slot):
+    """Opens an empty slot"""
+    if slot not in self.open_slots:
+      self.open_slots = sorted(self.open_slots + [slot])
+
+  def Close(self, slot):
+    """Closes a slot, emptying it"""
+    self.open_slots = [open_slot for open_slot in self.open_slots if open_slot != slot]
+    self.amount[slot] = self.unrealized_gains[slot] = self.forced_withdraw[slot] = 0
+
+  def Copy(self):
+    ledger = FundLedger()
+    ledger.amount = list(self.amount)
+    ledger.unrealized_gains = list(self.unrealized_gains)
+    ledger.forced_withdraw = list(self.forced_withdraw)
+    ledger.open_slots = list(self.open_slots)
+    return ledger
+
+  def Total(self, fund_type=None):
+    """Returns the total amount in the open slots, or in those of the given fund type"""
+    if fund_type is None:
+      return sum(self.amount[slot] for slot in self.open_slots)
+    return sum(self.amount[slot] for slot in self.open_slots if SLOT_FUND_TYPES[slot] == fund_type)
+
+  def Deposit(self, slot, amount, year_rec):
+    """Deposits into a slot as far as its room allows, returning the amount deposited"""
+    fund_type = SLOT_FUND_TYPES[slot]
+    if fund_type == FUND_TYPE_TFSA:
+      deposited = min(amount, year_rec.tfsa_room)
+      year_rec.tfsa_room -= deposited
+    elif fund_type == FUND_TYPE_RRSP:
+      deposited = min(amount, year_rec.rrsp_room)
+      year_rec.rrsp_room -= deposited
+    elif fund_type == FUND_TYPE_BRIDGING:
+      deposited = 0
     else:
-      withdrawn = self.amount
-      self.amount = 0
-    
-    if room != NO_ROOM_LIMIT and self.room_replenishes:
-      room += withdrawn
-
-    self.forced_withdraw = 0
+      deposited = amount
+    self.amount[slot] += deposited
+    year_rec.deposits.append(DepositReceipt(deposited, fund_type))
+    return (deposited, year_rec)
 
+  def Withdraw(self, slot, amount, year_rec):
+    """Withdraws from a slot, at least its forced withdrawal and at most its amount, realizing its share of the unrealized gains"""
+    fund_amount = self.amount[slot]
+    gain_proportion = self.unrealized_gains[slot] / fund_amount if fund_amount else 0
+    withdrawn = min(max(amount, self.forced_withdraw[slot]), fund_amount)
+    self.amount[slot] = fund_amount - withdrawn
+    self.forced_withdraw[slot] = 0
     realized_gains = withdrawn * gain_proportion
-    self.unrealized_gains -= realized_gains
+    self.unrealized_gains[slot] -= realized_gains
 
-    year_rec.withdrawals.append(WithdrawReceipt(withdrawn, realized_gains, self.fund_type))
-    self.SetRoom(year_rec, room)
+    fund_type = SLOT_FUND_TYPES[slot]
+    if fund_type == FUND_TYPE_TFSA:
+      year_rec.tfsa_room += withdrawn
+    year_rec.withdrawals.append(WithdrawReceipt(withdrawn, realized_gains, fund_type))
     return (withdrawn, realized_gains, year_rec)
 
-  def Update(self, year_rec):
-    pass
-
-  def Growth(self, year_rec):
-    """Calculates the amount to be added to the fund based on the growth rate.
-    The growth rate is 0 if the fund does not change, positive if it should
-    grow, and negative if it should shrink. Regardless of the rate, Growth()
-    will not return a number so negative it would cause the fund amount to go
-    negative.
+  def Split(self, source, sink, amount):
+    """Partitions source, moving up to amount to sink with the same share of its unrealized gains"""
+    if self.amount[source] == 0:
+      return
+    amount_to_move = min(amount, self.amount[source])
+    unrealized_gains_to_move = self.unrealized_gains[source] * amount_to_move / self.amount[source]
+    self.amount[source] -= amount_to_move
+    self.amount[sink] += amount_to_move
+    self.unrealized_gains[source] -= unrealized_gains_to_move
+    self.unrealized_gains[sink] += unrealized_gains_to_move
+
+  def Move(self, source, sink):
+    """Moves everything in source to the empty slot sink, closing source and opening sink"""
+    self.Open(sink)
+    self.amount[sink] = self.amount[source]
+    self.unrealized_gains[sink] = self.unrealized_gains[source]
+    self.forced_withdraw[sink] = self.forced_withdraw[source]
+    self.Close(source)
+
+  def ChainedDeposit(self, amount, slots, proportions, year_rec):
+    total_withdrawn, _, year_rec = self.ChainedTransaction(-amount, slots, proportions, proportions, year_rec)
+    return (-total_withdrawn, year_rec)
+
+  def ChainedWithdraw(self, amount, slots, proportions, year_rec):
+    return self.ChainedTransaction(amount, slots, proportions, proportions, year_rec)
+
+  def ChainedTransaction(self, amount, slots, withdrawal_proportions, deposit_proportions, year_rec):
+    """Withdraws amount across slots in turn, each giving its proportion of what is left.
+
+    If forced withdrawals take out more than amount, the excess is deposited
+    into the later slots by their deposit proportions instead. Returns the
+    net amount withdrawn and the realized gains.
     """
-    growth = max(self.amount * (1+year_rec.growth_rate) * (1+year_rec.inflation) - self.amount, -self.amount)
-    year_rec.growth_records.append(GrowthRecord(growth, self.fund_type))
-    return growth
-
-  def GetRoom(self, year_rec):
-    return NO_ROOM_LIMIT
-
-  def SetRoom(self, year_rec, room):
-    pass
-
-class TFSA(Fund):
-
-  def __init__(self):
-    super().__init__()
-    self.fund_type = FUND_TYPE_TFSA
-    self.room_replenishes = True
-
-  def Update(self, year_rec):
-    self.amount += self.Growth(year_rec)
-
-  def GetRoom(self, year_rec):
-    return year_rec.tfsa_room
-
-  def SetRoom(self, year_rec, room):
-    year_rec.tfsa_room = room
-
-
-class RRSP(Fund):
-
-  def __init__(self):
-    super().__init__()
-    self.fund_type = FUND_TYPE_RRSP
-    self.room = world.RRSP_INITIAL_LIMIT
-
-  def Update(self, year_rec):
-    # RRSP new room calculation TODO move this logic to person
-    # earning_receipts = [receipt for receipt in year_rec.incomes
-    #                     if receipt.income_type == incomes.INCOME_TYPE_EARNINGS]
-    # earnings_total = sum(receipt.amount for receipt in earning_receipts)
-    # self.room += min(utils.Indexed(world.RRSP_LIMIT, year_rec.year), world.RRSP_ACCRUAL_FRACTION * earnings_total)
-
-    # Growth
-    self.amount += self.Growth(year_rec)
-
-    # calculate RRSP mandatory withdrawal
-    self.forced_withdraw = world.MINIMUM_WITHDRAWAL_FRACTION[year_rec.age+1] * self.amount
-
-  def GetRoom(self, year_rec):
-    return year_rec.rrsp_room
-
-  def SetRoom(self, year_rec, room):
-    year_rec.rrsp_room = room
-
-
-class NonRegistered(Fund):
-
-  def __init__(self):
-    super().__init__()
-    self.fund_type = FUND_TYPE_NONREG
-  
-  def Update(self, year_rec):
-    growth = self.Growth(year_rec)
-    self.amount += growth
-    realized_gains = world.UNREALIZED_GAINS_REALIZATION_FRACTION * self.unrealized_gains
-    self.unrealized_gains -= realized_gains
-    new_realized_gains = growth * world.IMMEDIATELY_REALIZED_GAINS_FRACTION
-    year_rec.tax_receipts.append(TaxReceipt(realized_gains + new_realized_gains, self.fund_type))
-    self.unrealized_gains += growth - new_realized_gains
-
-
-class RRSPBridging(Fund):
-
-  def __init__(self):
-    super().__init__()
-    self.fund_type = FUND_TYPE_BRIDGING
-
-  def Deposit(self, amount, year_rec):
-    deposited = 0 # No deposits allowed after account creation
-    year_rec.deposits.append(DepositReceipt(deposited, self.fund_type))
-    return (deposited, year_rec)
+    total_withdrawn = 0
+    total_realized_gains = 0
+    for slot, withdrawal_proportion, deposit_proportion in zip(slots, withdrawal_proportions, deposit_proportions):
+      if total_withdrawn <= amount:
+        withdrawn, realized_gains, year_rec = self.Withdraw(slot, (amount - total_withdrawn) * withdrawal_proportion, year_rec)
+        total_withdrawn += withdrawn
+        total_realized_gains += realized_gains
+      else:
+        deposited, year_rec = self.Deposit(slot, (total_withdrawn - amount) * deposit_proportion, year_rec)
+        total_withdrawn -= deposited
+    return (total_withdrawn, total_realized_gains, year_rec)
 
   def Update(self, year_rec):
-    self.amount += self.Growth(year_rec)
-
-
-def ChainedDeposit(amount, funds, proportions, year_rec):
-  total_withdrawn, _, year_rec = ChainedTransaction(
-    -amount, funds, proportions, proportions, year_rec)
-  return (-total_withdrawn, year_rec)
-
-def ChainedWithdraw(amount, funds, proportions, year_rec):
-  withdrawn, realized_gains, year_rec = ChainedTransaction(
-      amount, funds, proportions, proportions, year_rec)
-  return (withdrawn, realized_gains, year_rec)
-
-def ChainedTransaction(amount, funds, withdrawal_proportions,
-                       deposit_proportions, year_rec):
-  total_withdrawn = 0
-  total_realized_gains = 0
-
-  for fund, withdrawal_proportion, deposit_proportion in zip(funds, withdrawal_proportions, deposit_proportions):
-    if total_withdrawn <= amount:
-      to_withdraw = (amount - total_withdrawn) * withdrawal_proportion
-      withdrawn, realized_gains, year_rec = fund.Withdraw(to_withdraw,
-                                                          year_rec)
-      total_withdrawn += withdrawn
-      total_realized_gains += realized_gains
-    elif total_withdrawn > amount:
-      to_deposit = (total_withdrawn - amount) * deposit_proportion
-      deposited, year_rec = fund.Deposit(to_deposit, year_rec)
-      total_withdrawn -= deposited
-  return (total_withdrawn, total_realized_gains, year_rec)
-
-def SplitFund(source, sink, amount):
-  """Partition a fund into two pieces, transferring gains as appropriate."""
-  if source.amount == 0:
-    return (source, sink)
-  amount_to_move = min(amount, source.amount)
-  unrealized_gains_to_move = source.unrealized_gains * amount_to_move / source.amount
-  source.amount -= amount_to_move
-  sink.amount += amount_to_move
-  source.unrealized_gains -= unrealized_gains_to_move
-  sink.unrealized_gains += unrealized_gains_to_move
-  return (source, sink)
+    """Grows every open slot for the year, sets RRSP forced withdrawals and realizes non-registered gains.
 
+    Growth can shrink a slot to nothing, but not below.
+    """
+    minimum_withdrawal_fraction = None
+    for slot in self.open_slots:
+      amount = self.amount[slot]
+      fund_type = SLOT_FUND_TYPES[slot]
+      growth = max(amount * (1 + year_rec.growth_rate) * (1 + year_rec.inflation) - amount, -amount)
+      year_rec.growth_records.append(GrowthRecord(growth, fund_type))
+      self.amount[slot] = amount = amount + growth
+      if fund_type == FUND_TYPE_RRSP:
+        if minimum_withdrawal_fraction is None:
+          minimum_withdrawal_fraction = world.MINIMUM_WITHDRAWAL_FRACTION[year_rec.age + 1]
+        self.forced_withdraw[slot] = minimum_withdrawal_fraction * amount
+      elif fund_type == FUND_TYPE_NONREG:
+        realized_gains = world.UNREALIZED_GAINS_REALIZATION_FRACTION * self.unrealized_gains[slot]
+        self.unrealized_gains[slot] -= realized_gains
+        new_realized_gains = growth * world.IMMEDIATELY_REALIZED_GAINS_FRACTION
+        year_rec.tax_receipts.append(TaxReceipt(realized_gains + new_realized_gains, fund_type))
+        self.unrealized_gains[slot] += growth - new_realized_gains
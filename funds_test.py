@@ -1,669 +1,502 @@
 import unittest
-import unittest.mock
 import funds
 import utils
 import world
-import incomes
+
+def LedgerWith(slot, amount=0, unrealized_gains=0, forced_withdraw=0):
+  """Returns a FundLedger with only the given slot open, holding the given amounts"""
+  ledger = funds.FundLedger()
+  for open_slot in ledger.open_slots:
+    ledger.Close(open_slot)
+  ledger.Open(slot)
+  ledger.amount[slot] = amount
+  ledger.unrealized_gains[slot] = unrealized_gains
+  ledger.forced_withdraw[slot] = forced_withdraw
+  return ledger
+
 
 class FundTest(unittest.TestCase):
 
   def testDepositUnlimitedRoom(self):
-    fund = funds.Fund()
-    deposited, year_rec = fund.Deposit(15, utils.YearRecord())
+    ledger = LedgerWith(funds.WP_NONREG)
+    deposited, year_rec = ledger.Deposit(funds.WP_NONREG, 15, utils.YearRecord())
     self.assertEqual(deposited, 15)
-    self.assertEqual(fund.amount, 15)
-    self.assertIn(funds.DepositReceipt(15, funds.FUND_TYPE_NONE),
+    self.assertEqual(ledger.amount[funds.WP_NONREG], 15)
+    self.assertIn(funds.DepositReceipt(15, funds.FUND_TYPE_NONREG),
                   year_rec.deposits)
 
   def testDepositSufficientRoom(self):
-    fund = funds.Fund()
-    fund.GetRoom = unittest.mock.MagicMock(return_value=20)
-    set_room = unittest.mock.MagicMock()
-    fund.SetRoom = set_room
-    deposited, year_rec = fund.Deposit(15, utils.YearRecord())
+    ledger = LedgerWith(funds.WP_TFSA)
+    year_rec = utils.YearRecord()
+    year_rec.tfsa_room = 20
+    deposited, year_rec = ledger.Deposit(funds.WP_TFSA, 15, year_rec)
     self.assertEqual(deposited, 15)
-    self.assertEqual(fund.amount, 15)
-    self.assertIn(funds.DepositReceipt(15, funds.FUND_TYPE_NONE),
+    self.assertEqual(ledger.amount[funds.WP_TFSA], 15)
+    self.assertIn(funds.DepositReceipt(15, funds.FUND_TYPE_TFSA),
                   year_rec.deposits)
-    set_room.assert_called_with(unittest.mock.ANY, 5)
+    self.assertEqual(year_rec.tfsa_room, 5)
 
   def testDepositInsufficientRoom(self):
-    fund = funds.Fund()
-    fund.GetRoom = unittest.mock.MagicMock(return_value=10)
-    set_room = unittest.mock.MagicMock()
-    fund.SetRoom = set_room
-    deposited, year_rec = fund.Deposit(15, utils.YearRecord())
+    ledger = LedgerWith(funds.WP_TFSA)
+    year_rec = utils.YearRecord()
+    year_rec.tfsa_room = 10
+    deposited, year_rec = ledger.Deposit(funds.WP_TFSA, 15, year_rec)
     self.assertEqual(deposited, 10)
-    self.assertEqual(fund.amount, 10)
-    self.assertIn(funds.DepositReceipt(10, funds.FUND_TYPE_NONE),
+    self.assertEqual(ledger.amount[funds.WP_TFSA], 10)
+    self.assertIn(funds.DepositReceipt(10, funds.FUND_TYPE_TFSA),
                   year_rec.deposits)
-    set_room.assert_called_with(unittest.mock.ANY, 0)
-    
+    self.assertEqual(year_rec.tfsa_room, 0)
+
   def testWithdrawSufficientFunds(self):
-    fund = funds.Fund()
-    fund.amount = 20
-    withdrawn, gains, year_rec = fund.Withdraw(15, utils.YearRecord())
+    ledger = LedgerWith(funds.WP_NONREG, 20)
+    withdrawn, gains, year_rec = ledger.Withdraw(funds.WP_NONREG, 15, utils.YearRecord())
     self.assertEqual(withdrawn, 15)
-    self.assertEqual(fund.amount, 5)
-    self.assertIn(funds.WithdrawReceipt(15, 0, funds.FUND_TYPE_NONE),
+    self.assertEqual(ledger.amount[funds.WP_NONREG], 5)
+    self.assertIn(funds.WithdrawReceipt(15, 0, funds.FUND_TYPE_NONREG),
                   year_rec.withdrawals)
 
   def testWithdrawInsufficientFunds(self):
-    fund = funds.Fund()
-    fund.amount = 5
-    withdrawn, gains, year_rec = fund.Withdraw(15, utils.YearRecord())
+    ledger = LedgerWith(funds.WP_NONREG, 5)
+    withdrawn, gains, year_rec = ledger.Withdraw(funds.WP_NONREG, 15, utils.YearRecord())
     self.assertEqual(withdrawn, 5)
-    self.assertEqual(fund.amount, 0)
-    self.assertIn(funds.WithdrawReceipt(5, 0, funds.FUND_TYPE_NONE),
+    self.assertEqual(ledger.amount[funds.WP_NONREG], 0)
+    self.assertIn(funds.WithdrawReceipt(5, 0, funds.FUND_TYPE_NONREG),
                   year_rec.withdrawals)
 
   def testWithdrawRealizedGains(self):
-    fund = funds.Fund()
-    fund.amount = 40
-    fund.unrealized_gains = 5
-    withdrawn, gains, year_rec = fund.Withdraw(10, utils.YearRecord())
+    ledger = LedgerWith(funds.WP_NONREG, 40, unrealized_gains=5)
+    withdrawn, gains, year_rec = ledger.Withdraw(funds.WP_NONREG, 10, utils.YearRecord())
     self.assertEqual(withdrawn, 10)
     self.assertEqual(gains, 1.25)
-    self.assertEqual(fund.unrealized_gains, 3.75)
-    self.assertIn(funds.WithdrawReceipt(10, 1.25, funds.FUND_TYPE_NONE),
+    self.assertEqual(ledger.unrealized_gains[funds.WP_NONREG], 3.75)
+    self.assertIn(funds.WithdrawReceipt(10, 1.25, funds.FUND_TYPE_NONREG),
                   year_rec.withdrawals)
 
   def testWithdrawRoomReplenishment(self):
-    fund = funds.Fund()
-    fund.amount = 20
-    fund.GetRoom = unittest.mock.MagicMock(return_value=5)
-    set_room = unittest.mock.MagicMock()
-    fund.SetRoom = set_room
-    fund.room_replenishes = True
-    withdrawn, gains, year_rec = fund.Withdraw(10, utils.YearRecord())
-    set_room.assert_called_with(unittest.mock.ANY, 15)
+    ledger = LedgerWith(funds.WP_TFSA, 20)
+    year_rec = utils.YearRecord()
+    year_rec.tfsa_room = 5
+    withdrawn, gains, year_rec = ledger.Withdraw(funds.WP_TFSA, 10, year_rec)
+    self.assertEqual(year_rec.tfsa_room, 15)
 
   def testWithdrawForcedPassive(self):
-    fund = funds.Fund()
-    fund.amount = 20
-    fund.forced_withdraw = 5
-    withdrawn, gains, year_rec = fund.Withdraw(10, utils.YearRecord())
+    ledger = LedgerWith(funds.WP_RRSP, 20, forced_withdraw=5)
+    withdrawn, gains, year_rec = ledger.Withdraw(funds.WP_RRSP, 10, utils.YearRecord())
     self.assertEqual(withdrawn, 10)
-    self.assertEqual(fund.amount, 10)
-    self.assertEqual(fund.forced_withdraw, 0)
+    self.assertEqual(ledger.amount[funds.WP_RRSP], 10)
+    self.assertEqual(ledger.forced_withdraw[funds.WP_RRSP], 0)
 
   def testWithdrawForcedActive(self):
-    fund = funds.Fund()
-    fund.amount = 20
-    fund.forced_withdraw = 15
-    withdrawn, gains, year_rec = fund.Withdraw(10, utils.YearRecord())
+    ledger = LedgerWith(funds.WP_RRSP, 20, forced_withdraw=15)
+    withdrawn, gains, year_rec = ledger.Withdraw(funds.WP_RRSP, 10, utils.YearRecord())
     self.assertEqual(withdrawn, 15)
-    self.assertEqual(fund.amount, 5)
-    self.assertEqual(fund.forced_withdraw, 0)
+    self.assertEqual(ledger.amount[funds.WP_RRSP], 5)
+    self.assertEqual(ledger.forced_withdraw[funds.WP_RRSP], 0)
 
   def testWithdrawForcedInsufficient(self):
-    fund = funds.Fund()
-    fund.amount = 10
-    fund.forced_withdraw = 15
-    withdrawn, gains, year_rec = fund.Withdraw(5, utils.YearRecord())
+    ledger = LedgerWith(funds.WP_RRSP, 10, forced_withdraw=15)
+    withdrawn, gains, year_rec = ledger.Withdraw(funds.WP_RRSP, 5, utils.YearRecord())
     self.assertEqual(withdrawn, 10)
-    self.assertEqual(fund.amount, 0)
-    self.assertEqual(fund.forced_withdraw, 0)
-  
+    self.assertEqual(ledger.amount[funds.WP_RRSP], 0)
+    self.assertEqual(ledger.forced_withdraw[funds.WP_RRSP], 0)
+
   def testWithdrawZero(self):
-    fund = funds.Fund()
-    fund.amount = 0
-    withdrawn, gains, year_rec = fund.Withdraw(10, utils.YearRecord())
+    ledger = LedgerWith(funds.WP_NONREG, 0)
+    withdrawn, gains, year_rec = ledger.Withdraw(funds.WP_NONREG, 10, utils.YearRecord())
     self.assertEqual(withdrawn, 0)
     self.assertEqual(gains, 0)
-    self.assertIn(funds.WithdrawReceipt(0, 0, funds.FUND_TYPE_NONE),
+    self.assertIn(funds.WithdrawReceipt(0, 0, funds.FUND_TYPE_NONREG),
                   year_rec.withdrawals)
 
-  def testGrowthZero(self):
-    fund = funds.Fund()
-    fund.amount = 20
+  def Growth(self, growth_rate, inflation=0):
+    ledger = LedgerWith(funds.BRIDGING, 20)
     year_rec = utils.YearRecord()
-    year_rec.growth_rate = 0
-    self.assertEqual(fund.Growth(year_rec), 0)
+    year_rec.growth_rate = growth_rate
+    year_rec.inflation = inflation
+    ledger.Update(year_rec)
+    self.assertEqual(year_rec.growth_records, [funds.GrowthRecord(ledger.amount[funds.BRIDGING] - 20, funds.FUND_TYPE_BRIDGING)])
+    return year_rec.growth_records[0].growth_amount
+
+  def testGrowthZero(self):
+    self.assertEqual(self.Growth(0), 0)
 
   def testGrowthPositive(self):
-    fund = funds.Fund()
-    fund.amount = 20
-    year_rec = utils.YearRecord()
-    year_rec.growth_rate = 0.1
-    self.assertEqual(fund.Growth(year_rec), 2)
+    self.assertEqual(self.Growth(0.1), 2)
 
   def testGrowthNegative(self):
-    fund = funds.Fund()
-    fund.amount = 20
-    year_rec = utils.YearRecord()
-    year_rec.growth_rate = -0.1
-    self.assertEqual(fund.Growth(year_rec), -2)
+    self.assertEqual(self.Growth(-0.1), -2)
 
   def testGrowthVeryNegative(self):
-    fund = funds.Fund()
-    fund.amount = 20
-    year_rec = utils.YearRecord()
-    year_rec.growth_rate = -1.2
-    self.assertEqual(fund.Growth(year_rec), -20)
+    self.assertEqual(self.Growth(-1.2), -20)
 
   def testGrowthInflation(self):
-    fund = funds.Fund()
-    fund.amount = 20
-    year_rec = utils.YearRecord()
-    year_rec.growth_rate = 0
-    year_rec.inflation = 1
-    self.assertEqual(fund.Growth(year_rec), 20)
+    self.assertEqual(self.Growth(0, inflation=1), 20)
 
 
 class TFSATest(unittest.TestCase):
 
-  @unittest.skip("Room replenishment needs to be done in person now")
-  def testTFSARoom(self):
-    fund = funds.TFSA()
-    self.assertEqual(fund.room, world.TFSA_INITIAL_CONTRIBUTION_LIMIT)
-    fund.Update(utils.YearRecord())
-    self.assertEqual(fund.room, (world.TFSA_INITIAL_CONTRIBUTION_LIMIT +
-                                 world.TFSA_ANNUAL_CONTRIBUTION_LIMIT))
-
   def testTFSADeposit(self):
-    fund = funds.TFSA()
+    ledger = LedgerWith(funds.WP_TFSA)
     year_rec = utils.YearRecord()
     year_rec.tfsa_room = 20
-    deposited, year_rec = fund.Deposit(15, year_rec)
+    deposited, year_rec = ledger.Deposit(funds.WP_TFSA, 15, year_rec)
     self.assertEqual(deposited, 15)
-    self.assertEqual(fund.amount, 15)
+    self.assertEqual(ledger.amount[funds.WP_TFSA], 15)
     self.assertIn(funds.DepositReceipt(15, funds.FUND_TYPE_TFSA),
                   year_rec.deposits)
-  
+
   def testTFSAWithdraw(self):
-    fund = funds.TFSA()
-    fund.amount = 20
+    ledger = LedgerWith(funds.WP_TFSA, 20)
     year_rec = utils.YearRecord()
     year_rec.tfsa_room = 0
-    withdrawn, gains, year_rec = fund.Withdraw(15, year_rec)
+    withdrawn, gains, year_rec = ledger.Withdraw(funds.WP_TFSA, 15, year_rec)
     self.assertEqual(withdrawn, 15)
-    self.assertEqual(fund.amount, 5)
+    self.assertEqual(ledger.amount[funds.WP_TFSA], 5)
     self.assertIn(funds.WithdrawReceipt(15, 0, funds.FUND_TYPE_TFSA),
                   year_rec.withdrawals)
     self.assertEqual(year_rec.tfsa_room, 15)
 
   def testTFSAUpdate(self):
-    fund = funds.TFSA()
-    fund.amount = 20
+    ledger = LedgerWith(funds.WP_TFSA, 20)
     year_rec = utils.YearRecord()
     year_rec.growth_rate = 0.2
     year_rec.inflation = 1
-    fund.Update(year_rec)
-    self.assertEqual(fund.amount, 48)
-    self.assertEqual(fund.unrealized_gains, 0)
+    ledger.Update(year_rec)
+    self.assertEqual(ledger.amount[funds.WP_TFSA], 48)
+    self.assertEqual(ledger.unrealized_gains[funds.WP_TFSA], 0)
 
 
 class RRSPTest(unittest.TestCase):
 
-  @unittest.skip("Room replenishment needs to be done in person now")
-  def testRRSPRoom(self):
-    fund = funds.RRSP()
-    year_rec = utils.YearRecord()
-    year_rec.incomes.append(incomes.IncomeReceipt(10000, incomes.INCOME_TYPE_EARNINGS))
-    self.assertEqual(fund.room, world.RRSP_INITIAL_LIMIT)
-    fund.Update(year_rec)
-    self.assertEqual(fund.room, world.RRSP_INITIAL_LIMIT+1800)
-
-  @unittest.skip("Room replenishment needs to be done in person now")
-  def testRRSPRoomLimit(self):
-    fund = funds.RRSP()
-    year_rec = utils.YearRecord()
-    year_rec.incomes.append(incomes.IncomeReceipt(140000, incomes.INCOME_TYPE_EARNINGS))
-    self.assertEqual(fund.room, world.RRSP_INITIAL_LIMIT)
-    fund.Update(year_rec)
-    self.assertEqual(fund.room, world.RRSP_INITIAL_LIMIT+world.RRSP_LIMIT)
-
   def testRRSPDeposit(self):
-    fund = funds.RRSP()
+    ledger = LedgerWith(funds.WP_RRSP)
     year_rec = utils.YearRecord()
     year_rec.rrsp_room = 20
-    deposited, year_rec = fund.Deposit(15, year_rec)
+    deposited, year_rec = ledger.Deposit(funds.WP_RRSP, 15, year_rec)
     self.assertEqual(deposited, 15)
-    self.assertEqual(fund.amount, 15)
+    self.assertEqual(ledger.amount[funds.WP_RRSP], 15)
     self.assertIn(funds.DepositReceipt(15, funds.FUND_TYPE_RRSP),
                   year_rec.deposits)
     self.assertEqual(year_rec.rrsp_room, 5)
-  
+
   def testRRSPWithdraw(self):
-    fund = funds.RRSP()
-    fund.amount = 20
+    ledger = LedgerWith(funds.WP_RRSP, 20)
     year_rec = utils.YearRecord()
     year_rec.rrsp_room = 0
-    withdrawn, gains, year_rec = fund.Withdraw(15, year_rec)
+    withdrawn, gains, year_rec = ledger.Withdraw(funds.WP_RRSP, 15, year_rec)
     self.assertEqual(withdrawn, 15)
-    self.assertEqual(fund.amount, 5)
+    self.assertEqual(ledger.amount[funds.WP_RRSP], 5)
     self.assertIn(funds.WithdrawReceipt(15, 0, funds.FUND_TYPE_RRSP),
                   year_rec.withdrawals)
     self.assertEqual(year_rec.rrsp_room, 0)
 
   def testRRSPForcedWithdrawEarly(self):
-    fund = funds.RRSP()
-    fund.amount = 10000
+    ledger = LedgerWith(funds.CD_RRSP, 10000)
     year_rec = utils.YearRecord()
     year_rec.age = 69
-    fund.Update(year_rec)
-    self.assertEqual(fund.forced_withdraw, 0)
+    ledger.Update(year_rec)
+    self.assertEqual(ledger.forced_withdraw[funds.CD_RRSP], 0)
 
   def testRRSPForcedWithdrawActive(self):
-    fund = funds.RRSP()
-    fund.amount = 10000
+    ledger = LedgerWith(funds.CD_RRSP, 10000)
     year_rec = utils.YearRecord()
     year_rec.age = 70
-    fund.Update(year_rec)
-    self.assertEqual(fund.forced_withdraw, 528)
+    ledger.Update(year_rec)
+    self.assertEqual(ledger.forced_withdraw[funds.CD_RRSP], 528)
 
   def testRRSPUpdate(self):
-    fund = funds.RRSP()
-    fund.amount = 20
+    ledger = LedgerWith(funds.WP_RRSP, 20)
     year_rec = utils.YearRecord()
     year_rec.growth_rate = 0.2
     year_rec.inflation = 1
-    year_rec.incomes.append(incomes.IncomeReceipt(10000, incomes.INCOME_TYPE_EARNINGS))
-    fund.Update(year_rec)
-    self.assertEqual(fund.amount, 48)
-    self.assertEqual(fund.unrealized_gains, 0)
+    ledger.Update(year_rec)
+    self.assertEqual(ledger.amount[funds.WP_RRSP], 48)
+    self.assertEqual(ledger.unrealized_gains[funds.WP_RRSP], 0)
 
 
 class NonRegisteredTest(unittest.TestCase):
 
   def testNonRegisteredDeposit(self):
-    fund = funds.NonRegistered()
-    deposited, year_rec = fund.Deposit(15, utils.YearRecord())
+    ledger = LedgerWith(funds.WP_NONREG)
+    deposited, year_rec = ledger.Deposit(funds.WP_NONREG, 15, utils.YearRecord())
     self.assertEqual(deposited, 15)
-    self.assertEqual(fund.amount, 15)
+    self.assertEqual(ledger.amount[funds.WP_NONREG], 15)
     self.assertIn(funds.DepositReceipt(15, funds.FUND_TYPE_NONREG),
                   year_rec.deposits)
-    self.assertEqual(fund.unrealized_gains, 0)
-  
+    self.assertEqual(ledger.unrealized_gains[funds.WP_NONREG], 0)
+
   def testNonRegisteredWithdraw(self):
-    fund = funds.NonRegistered()
-    fund.amount = 20
-    fund.unrealized_gains = 10
-    withdrawn, gains, year_rec = fund.Withdraw(15, utils.YearRecord())
+    ledger = LedgerWith(funds.WP_NONREG, 20, unrealized_gains=10)
+    withdrawn, gains, year_rec = ledger.Withdraw(funds.WP_NONREG, 15, utils.YearRecord())
     self.assertEqual(withdrawn, 15)
-    self.assertEqual(fund.amount, 5)
-    self.assertEqual(fund.unrealized_gains, 2.5)
+    self.assertEqual(ledger.amount[funds.WP_NONREG], 5)
+    self.assertEqual(ledger.unrealized_gains[funds.WP_NONREG], 2.5)
     self.assertIn(funds.WithdrawReceipt(15, 7.5, funds.FUND_TYPE_NONREG),
                   year_rec.withdrawals)
-  
+
   def testNonRegisteredWithdrawNegativeUnrealizedGains(self):
-    fund = funds.NonRegistered()
-    fund.amount = 20
-    fund.unrealized_gains = -10
-    withdrawn, gains, year_rec = fund.Withdraw(15, utils.YearRecord())
+    ledger = LedgerWith(funds.WP_NONREG, 20, unrealized_gains=-10)
+    withdrawn, gains, year_rec = ledger.Withdraw(funds.WP_NONREG, 15, utils.YearRecord())
     self.assertEqual(withdrawn, 15)
-    self.assertEqual(fund.amount, 5)
-    self.assertEqual(fund.unrealized_gains, -2.5)
+    self.assertEqual(ledger.amount[funds.WP_NONREG], 5)
+    self.assertEqual(ledger.unrealized_gains[funds.WP_NONREG], -2.5)
     self.assertIn(funds.WithdrawReceipt(15, -7.5, funds.FUND_TYPE_NONREG),
                   year_rec.withdrawals)
-  
+
   def testNonRegisteredWithdrawReallyNegativeUnrealizedGains(self):
-    fund = funds.NonRegistered()
-    fund.amount = 20
-    fund.unrealized_gains = -25
-    withdrawn, gains, year_rec = fund.Withdraw(20, utils.YearRecord())
+    ledger = LedgerWith(funds.WP_NONREG, 20, unrealized_gains=-25)
+    withdrawn, gains, year_rec = ledger.Withdraw(funds.WP_NONREG, 20, utils.YearRecord())
     self.assertEqual(withdrawn, 20)
-    self.assertEqual(fund.amount, 0)
-    self.assertEqual(fund.unrealized_gains, 0)
+    self.assertEqual(ledger.amount[funds.WP_NONREG], 0)
+    self.assertEqual(ledger.unrealized_gains[funds.WP_NONREG], 0)
     self.assertIn(funds.WithdrawReceipt(20, -25, funds.FUND_TYPE_NONREG),
                   year_rec.withdrawals)
 
-  def testNonRegisteredUpdateGainsIncrement(self):
-    fund = funds.NonRegistered()
-    fund.amount = 20
-    fund.unrealized_gains = 10
+  def Update(self, unrealized_gains, growth_rate):
+    ledger = LedgerWith(funds.WP_NONREG, 20, unrealized_gains=unrealized_gains)
     year_rec = utils.YearRecord()
-    year_rec.growth_rate = 0.4
-    fund.Update(year_rec)
-    self.assertEqual(fund.amount, 28)
-    self.assertEqual(fund.unrealized_gains, 13.6)
-    self.assertIn(funds.TaxReceipt(4.4, funds.FUND_TYPE_NONREG),
-                  year_rec.tax_receipts)
+    year_rec.growth_rate = growth_rate
+    ledger.Update(year_rec)
+    self.assertEqual(len(year_rec.tax_receipts), 1)
+    self.assertEqual(year_rec.tax_receipts[0].fund_type, funds.FUND_TYPE_NONREG)
+    return ledger.amount[funds.WP_NONREG], ledger.unrealized_gains[funds.WP_NONREG], year_rec.tax_receipts[0].gross_gain
+
+  def testNonRegisteredUpdateGainsIncrement(self):
+    amount, unrealized_gains, gross_gain = self.Update(10, 0.4)
+    self.assertEqual(amount, 28)
+    self.assertEqual(unrealized_gains, 13.6)
+    self.assertEqual(gross_gain, 4.4)
 
   def testNonRegisteredUpdateZeroGrowth(self):
-    fund = funds.NonRegistered()
-    fund.amount = 20
-    fund.unrealized_gains = 10
-    year_rec = utils.YearRecord()
-    year_rec.growth_rate = 0
-    fund.Update(year_rec)
-    self.assertEqual(fund.amount, 20)
-    self.assertAlmostEqual(fund.unrealized_gains, 8)
-    self.assertAlmostEqual(year_rec.tax_receipts[0].gross_gain, 2)
-    self.assertEqual(year_rec.tax_receipts[0].fund_type, funds.FUND_TYPE_NONREG)
-    self.assertEqual(len(year_rec.tax_receipts), 1)
+    amount, unrealized_gains, gross_gain = self.Update(10, 0)
+    self.assertEqual(amount, 20)
+    self.assertAlmostEqual(unrealized_gains, 8)
+    self.assertAlmostEqual(gross_gain, 2)
 
   def testNonRegisteredUpdateGainsDecrement(self):
-    fund = funds.NonRegistered()
-    fund.amount = 20
-    fund.unrealized_gains = 10
-    year_rec = utils.YearRecord()
-    year_rec.growth_rate = -0.4
-    fund.Update(year_rec)
-    self.assertEqual(fund.amount, 12)
-    self.assertAlmostEqual(fund.unrealized_gains, 2.4)
-    self.assertAlmostEqual(year_rec.tax_receipts[0].gross_gain, -0.4)
-    self.assertEqual(year_rec.tax_receipts[0].fund_type, funds.FUND_TYPE_NONREG)
-    self.assertEqual(len(year_rec.tax_receipts), 1)
+    amount, unrealized_gains, gross_gain = self.Update(10, -0.4)
+    self.assertEqual(amount, 12)
+    self.assertAlmostEqual(unrealized_gains, 2.4)
+    self.assertAlmostEqual(gross_gain, -0.4)
 
   def testNonRegisteredUpdateGainsDecrementPastZero(self):
-    fund = funds.NonRegistered()
-    fund.amount = 20
-    fund.unrealized_gains = 10
-    year_rec = utils.YearRecord()
-    year_rec.growth_rate = -0.6
-    fund.Update(year_rec)
-    self.assertEqual(fund.amount, 8)
-    self.assertAlmostEqual(fund.unrealized_gains, -0.4)
-    self.assertAlmostEqual(year_rec.tax_receipts[0].gross_gain, -1.6)
-    self.assertEqual(year_rec.tax_receipts[0].fund_type, funds.FUND_TYPE_NONREG)
-    self.assertEqual(len(year_rec.tax_receipts), 1)
+    amount, unrealized_gains, gross_gain = self.Update(10, -0.6)
+    self.assertEqual(amount, 8)
+    self.assertAlmostEqual(unrealized_gains, -0.4)
+    self.assertAlmostEqual(gross_gain, -1.6)
 
   def testNonRegisteredUpdateZeroGrowthNegativeUnrealizedGains(self):
-    fund = funds.NonRegistered()
-    fund.amount = 20
-    fund.unrealized_gains = -10
-    year_rec = utils.YearRecord()
-    year_rec.growth_rate = 0
-    fund.Update(year_rec)
-    self.assertEqual(fund.amount, 20)
-    self.assertAlmostEqual(fund.unrealized_gains, -8)
-    self.assertAlmostEqual(year_rec.tax_receipts[0].gross_gain, -2)
-    self.assertEqual(year_rec.tax_receipts[0].fund_type, funds.FUND_TYPE_NONREG)
-    self.assertEqual(len(year_rec.tax_receipts), 1)
+    amount, unrealized_gains, gross_gain = self.Update(-10, 0)
+    self.assertEqual(amount, 20)
+    self.assertAlmostEqual(unrealized_gains, -8)
+    self.assertAlmostEqual(gross_gain, -2)
 
   def testNonRegisteredUpdatePositiveGrowthNegativeUnrealizedGains(self):
-    fund = funds.NonRegistered()
-    fund.amount = 20
-    fund.unrealized_gains = -10
-    year_rec = utils.YearRecord()
-    year_rec.growth_rate = 0.4
-    fund.Update(year_rec)
-    self.assertEqual(fund.amount, 28)
-    self.assertAlmostEqual(fund.unrealized_gains, -2.4)
-    self.assertAlmostEqual(year_rec.tax_receipts[0].gross_gain, 0.4)
-    self.assertEqual(year_rec.tax_receipts[0].fund_type, funds.FUND_TYPE_NONREG)
-    self.assertEqual(len(year_rec.tax_receipts), 1)
+    amount, unrealized_gains, gross_gain = self.Update(-10, 0.4)
+    self.assertEqual(amount, 28)
+    self.assertAlmostEqual(unrealized_gains, -2.4)
+    self.assertAlmostEqual(gross_gain, 0.4)
 
   def testNonRegisteredUpdateNegativeGrowthNegativeUnrealizedGains(self):
-    fund = funds.NonRegistered()
-    fund.amount = 20
-    fund.unrealized_gains = -10
-    year_rec = utils.YearRecord()
-    year_rec.growth_rate = -0.4
-    fund.Update(year_rec)
-    self.assertEqual(fund.amount, 12)
-    self.assertAlmostEqual(fund.unrealized_gains, -13.6)
-    self.assertAlmostEqual(year_rec.tax_receipts[0].gross_gain, -4.4)
-    self.assertEqual(year_rec.tax_receipts[0].fund_type, funds.FUND_TYPE_NONREG)
-    self.assertEqual(len(year_rec.tax_receipts), 1)
+    amount, unrealized_gains, gross_gain = self.Update(-10, -0.4)
+    self.assertEqual(amount, 12)
+    self.assertAlmostEqual(unrealized_gains, -13.6)
+    self.assertAlmostEqual(gross_gain, -4.4)
 
 
 class RRSPBridgingTest(unittest.TestCase):
 
   def testRRSPBridgingDeposit(self):
-    fund = funds.RRSPBridging()
-    fund.amount = 30
-    deposited, year_rec = fund.Deposit(15, utils.YearRecord())
+    ledger = LedgerWith(funds.BRIDGING, 30)
+    deposited, year_rec = ledger.Deposit(funds.BRIDGING, 15, utils.YearRecord())
     self.assertEqual(deposited, 0)
-    self.assertEqual(fund.amount, 30)
+    self.assertEqual(ledger.amount[funds.BRIDGING], 30)
     self.assertIn(funds.DepositReceipt(0, funds.FUND_TYPE_BRIDGING),
                   year_rec.deposits)
-  
+
   def testRRSPBridgingWithdraw(self):
-    fund = funds.RRSPBridging()
-    fund.amount = 20
-    withdrawn, gains, year_rec = fund.Withdraw(15, utils.YearRecord())
+    ledger = LedgerWith(funds.BRIDGING, 20)
+    withdrawn, gains, year_rec = ledger.Withdraw(funds.BRIDGING, 15, utils.YearRecord())
     self.assertEqual(withdrawn, 15)
-    self.assertEqual(fund.amount, 5)
-    self.assertEqual(fund.unrealized_gains, 0)
+    self.assertEqual(ledger.amount[funds.BRIDGING], 5)
+    self.assertEqual(ledger.unrealized_gains[funds.BRIDGING], 0)
     self.assertIn(funds.WithdrawReceipt(15, 0, funds.FUND_TYPE_BRIDGING),
                   year_rec.withdrawals)
 
   def testRRSPBridgingUpdate(self):
-    fund = funds.RRSPBridging()
-    fund.amount = 20
+    ledger = LedgerWith(funds.BRIDGING, 20)
     year_rec = utils.YearRecord()
     year_rec.growth_rate = 0.2
     year_rec.inflation = 1
-    fund.Update(year_rec)
-    self.assertEqual(fund.amount, 48)
-    self.assertEqual(fund.unrealized_gains, 0)
+    ledger.Update(year_rec)
+    self.assertEqual(ledger.amount[funds.BRIDGING], 48)
+    self.assertEqual(ledger.unrealized_gains[funds.BRIDGING], 0)
+    self.assertEqual(ledger.forced_withdraw[funds.BRIDGING], 0)
 
 
 class ChainingTest(unittest.TestCase):
-  
+
   def testChainedDeposit(self):
+    ledger = funds.FundLedger()
+    ledger.Open(funds.BRIDGING)
+    ledger.amount[funds.BRIDGING] = 60
     year_rec = utils.YearRecord()
-    tfsa = funds.TFSA()
     year_rec.tfsa_room = 30
-    rrsp = funds.RRSP()
     year_rec.rrsp_room = 50
-    bridging = funds.RRSPBridging()
-    bridging.amount = 60
-    nonreg = funds.NonRegistered()
-    fund_chain = (tfsa, rrsp, bridging, nonreg)
+    fund_chain = (funds.WP_TFSA, funds.WP_RRSP, funds.BRIDGING, funds.WP_NONREG)
     proportions = (1, 1, 1, 1)
-    deposited, year_rec = funds.ChainedDeposit(100, fund_chain, proportions,
-                                               year_rec)
+    deposited, year_rec = ledger.ChainedDeposit(100, fund_chain, proportions, year_rec)
     self.assertEqual(deposited, 100)
     self.assertSequenceEqual(year_rec.deposits,
-                            [funds.DepositReceipt(30, funds.FUND_TYPE_TFSA),
-                             funds.DepositReceipt(50, funds.FUND_TYPE_RRSP),
-                             funds.DepositReceipt(0, funds.FUND_TYPE_BRIDGING),
-                             funds.DepositReceipt(20, funds.FUND_TYPE_NONREG)])
-    self.assertEqual(tfsa.amount, 30)
-    self.assertEqual(rrsp.amount, 50)
-    self.assertEqual(bridging.amount, 60)
-    self.assertEqual(nonreg.amount, 20)
-                             
+                             [funds.DepositReceipt(30, funds.FUND_TYPE_TFSA),
+                              funds.DepositReceipt(50, funds.FUND_TYPE_RRSP),
+                              funds.DepositReceipt(0, funds.FUND_TYPE_BRIDGING),
+                              funds.DepositReceipt(20, funds.FUND_TYPE_NONREG)])
+    self.assertEqual(ledger.amount[:4], [30, 50, 20, 60])
+    self.assertEqual(year_rec.tfsa_room, 0)
+    self.assertEqual(year_rec.rrsp_room, 0)
+
   def testChainedDepositInsufficientRoom(self):
+    ledger = funds.FundLedger()
     year_rec = utils.YearRecord()
-    tfsa = funds.TFSA()
     year_rec.tfsa_room = 30
-    rrsp = funds.RRSP()
     year_rec.rrsp_room = 50
-    fund_chain = (tfsa, rrsp)
-    proportions = (1, 1)
-    deposited, year_rec = funds.ChainedDeposit(100, fund_chain, proportions,
-                                               year_rec)
+    deposited, year_rec = ledger.ChainedDeposit(100, (funds.WP_TFSA, funds.WP_RRSP), (1, 1), year_rec)
     self.assertEqual(deposited, 80)
     self.assertSequenceEqual(year_rec.deposits,
                              [funds.DepositReceipt(30, funds.FUND_TYPE_TFSA),
                               funds.DepositReceipt(50, funds.FUND_TYPE_RRSP)])
-    self.assertEqual(tfsa.amount, 30)
-    self.assertEqual(rrsp.amount, 50)
-                             
+    self.assertEqual(ledger.amount[funds.WP_TFSA], 30)
+    self.assertEqual(ledger.amount[funds.WP_RRSP], 50)
+
   def testChainedDepositProportions(self):
+    ledger = funds.FundLedger()
     year_rec = utils.YearRecord()
-    tfsa = funds.TFSA()
     year_rec.tfsa_room = 30
-    rrsp = funds.RRSP()
     year_rec.rrsp_room = 30
-    nonreg = funds.NonRegistered()
-    fund_chain = (tfsa, rrsp, nonreg)
+    fund_chain = (funds.WP_TFSA, funds.WP_RRSP, funds.WP_NONREG)
     proportions = (0.2, 0.5, 1)
-    deposited, year_rec = funds.ChainedDeposit(100, fund_chain, proportions,
-                                               year_rec)
+    deposited, year_rec = ledger.ChainedDeposit(100, fund_chain, proportions, year_rec)
     self.assertEqual(deposited, 100)
     self.assertSequenceEqual(year_rec.deposits,
                              [funds.DepositReceipt(20, funds.FUND_TYPE_TFSA),
                               funds.DepositReceipt(30, funds.FUND_TYPE_RRSP),
                               funds.DepositReceipt(50, funds.FUND_TYPE_NONREG)])
-    self.assertEqual(tfsa.amount, 20)
-    self.assertEqual(rrsp.amount, 30)
-    self.assertEqual(nonreg.amount, 50)
+    self.assertEqual(ledger.amount[:3], [20, 30, 50])
+
+  def Ledger(self, rrsp, tfsa, nonreg, nonreg_unrealized_gains=0, rrsp_forced_withdraw=0):
+    """Returns a ledger with the given amounts in its working period funds, and their chain"""
+    ledger = funds.FundLedger()
+    ledger.amount[funds.WP_RRSP] = rrsp
+    ledger.forced_withdraw[funds.WP_RRSP] = rrsp_forced_withdraw
+    ledger.amount[funds.WP_TFSA] = tfsa
+    ledger.amount[funds.WP_NONREG] = nonreg
+    ledger.unrealized_gains[funds.WP_NONREG] = nonreg_unrealized_gains
+    return ledger, (funds.WP_RRSP, funds.WP_TFSA, funds.WP_NONREG)
 
   def testChainedWithdrawSufficientFunds(self):
-    rrsp = funds.RRSP()
-    rrsp.amount = 20
-    tfsa = funds.TFSA()
-    tfsa.amount = 50
-    nonreg = funds.NonRegistered()
-    nonreg.amount = 30
-    nonreg.unrealized_gains = 15
-    fund_chain = (rrsp, tfsa, nonreg)
-    proportions = (0.1, 0.5, 1)
-    withdrawn, gains, year_rec = funds.ChainedWithdraw(60, fund_chain,
-                                                       proportions,
-                                                       utils.YearRecord())
+    ledger, fund_chain = self.Ledger(20, 50, 30, nonreg_unrealized_gains=15)
+    withdrawn, gains, year_rec = ledger.ChainedWithdraw(60, fund_chain, (0.1, 0.5, 1), utils.YearRecord())
     self.assertEqual(withdrawn, 60)
     self.assertEqual(gains, 13.5)
     self.assertSequenceEqual(
-        year_rec.withdrawals, 
+        year_rec.withdrawals,
         [funds.WithdrawReceipt(6, 0, funds.FUND_TYPE_RRSP),
          funds.WithdrawReceipt(27, 0, funds.FUND_TYPE_TFSA),
          funds.WithdrawReceipt(27, 13.5, funds.FUND_TYPE_NONREG)])
-    self.assertEqual(rrsp.amount, 14)
-    self.assertEqual(tfsa.amount, 23)
-    self.assertEqual(nonreg.amount, 3)
-    self.assertEqual(nonreg.unrealized_gains, 1.5)
+    self.assertEqual(ledger.amount[funds.WP_RRSP], 14)
+    self.assertEqual(ledger.amount[funds.WP_TFSA], 23)
+    self.assertEqual(ledger.amount[funds.WP_NONREG], 3)
+    self.assertEqual(ledger.unrealized_gains[funds.WP_NONREG], 1.5)
 
   def testChainedWithdrawInsufficientFunds(self):
     # TODO check if this is correct behaviour, or if we need more complicated
     # logic for insufficient funds at the end of the chain
-    rrsp = funds.RRSP()
-    rrsp.amount = 20
-    tfsa = funds.TFSA()
-    tfsa.amount = 50
-    nonreg = funds.NonRegistered()
-    nonreg.amount = 20
-    nonreg.unrealized_gains = 10
-    fund_chain = (rrsp, tfsa, nonreg)
-    proportions = (0.1, 0.5, 1)
-    withdrawn, gains, year_rec = funds.ChainedWithdraw(60, fund_chain,
-                                                       proportions,
-                                                       utils.YearRecord())
+    ledger, fund_chain = self.Ledger(20, 50, 20, nonreg_unrealized_gains=10)
+    withdrawn, gains, year_rec = ledger.ChainedWithdraw(60, fund_chain, (0.1, 0.5, 1), utils.YearRecord())
     self.assertEqual(withdrawn, 53)
     self.assertEqual(gains, 10)
     self.assertSequenceEqual(
-        year_rec.withdrawals, 
+        year_rec.withdrawals,
         [funds.WithdrawReceipt(6, 0, funds.FUND_TYPE_RRSP),
          funds.WithdrawReceipt(27, 0, funds.FUND_TYPE_TFSA),
          funds.WithdrawReceipt(20, 10, funds.FUND_TYPE_NONREG)])
-    self.assertEqual(rrsp.amount, 14)
-    self.assertEqual(tfsa.amount, 23)
-    self.assertEqual(nonreg.amount, 0)
+    self.assertEqual(ledger.amount[funds.WP_RRSP], 14)
+    self.assertEqual(ledger.amount[funds.WP_TFSA], 23)
+    self.assertEqual(ledger.amount[funds.WP_NONREG], 0)
 
   def testChainedWithdrawPartialInsufficientFunds(self):
-    rrsp = funds.RRSP()
-    rrsp.amount = 20
-    tfsa = funds.TFSA()
-    tfsa.amount = 20
-    nonreg = funds.NonRegistered()
-    nonreg.amount = 40
-    nonreg.unrealized_gains = 20
-    fund_chain = (rrsp, tfsa, nonreg)
-    proportions = (0.1, 0.5, 1)
-    withdrawn, gains, year_rec = funds.ChainedWithdraw(60, fund_chain,
-                                                       proportions,
-                                                       utils.YearRecord())
+    ledger, fund_chain = self.Ledger(20, 20, 40, nonreg_unrealized_gains=20)
+    withdrawn, gains, year_rec = ledger.ChainedWithdraw(60, fund_chain, (0.1, 0.5, 1), utils.YearRecord())
     self.assertEqual(withdrawn, 60)
     self.assertEqual(gains, 17)
     self.assertSequenceEqual(
-        year_rec.withdrawals, 
+        year_rec.withdrawals,
         [funds.WithdrawReceipt(6, 0, funds.FUND_TYPE_RRSP),
          funds.WithdrawReceipt(20, 0, funds.FUND_TYPE_TFSA),
          funds.WithdrawReceipt(34, 17, funds.FUND_TYPE_NONREG)])
-    self.assertEqual(rrsp.amount, 14)
-    self.assertEqual(tfsa.amount, 0)
-    self.assertEqual(nonreg.amount, 6)
+    self.assertEqual(ledger.amount[funds.WP_RRSP], 14)
+    self.assertEqual(ledger.amount[funds.WP_TFSA], 0)
+    self.assertEqual(ledger.amount[funds.WP_NONREG], 6)
 
   def testChainedWithdrawForcedWithdraw(self):
-    rrsp = funds.RRSP()
-    rrsp.amount = 20
-    rrsp.forced_withdraw = 10
-    tfsa = funds.TFSA()
-    tfsa.amount = 50
-    nonreg = funds.NonRegistered()
-    nonreg.amount = 30
-    nonreg.unrealized_gains = 15
-    fund_chain = (rrsp, tfsa, nonreg)
-    proportions = (0.1, 0.5, 1)
-    withdrawn, gains, year_rec = funds.ChainedWithdraw(60, fund_chain,
-                                                       proportions,
-                                                       utils.YearRecord())
+    ledger, fund_chain = self.Ledger(20, 50, 30, nonreg_unrealized_gains=15, rrsp_forced_withdraw=10)
+    withdrawn, gains, year_rec = ledger.ChainedWithdraw(60, fund_chain, (0.1, 0.5, 1), utils.YearRecord())
     self.assertEqual(withdrawn, 60)
     self.assertEqual(gains, 12.5)
     self.assertSequenceEqual(
-        year_rec.withdrawals, 
+        year_rec.withdrawals,
         [funds.WithdrawReceipt(10, 0, funds.FUND_TYPE_RRSP),
          funds.WithdrawReceipt(25, 0, funds.FUND_TYPE_TFSA),
          funds.WithdrawReceipt(25, 12.5, funds.FUND_TYPE_NONREG)])
-    self.assertEqual(rrsp.amount, 10)
-    self.assertEqual(tfsa.amount, 25)
-    self.assertEqual(nonreg.amount, 5)
+    self.assertEqual(ledger.amount[funds.WP_RRSP], 10)
+    self.assertEqual(ledger.amount[funds.WP_TFSA], 25)
+    self.assertEqual(ledger.amount[funds.WP_NONREG], 5)
 
   def testChainedWithdrawForcedWithdrawPreferZero(self):
+    ledger, fund_chain = self.Ledger(50, 0, 0)
     year_rec = utils.YearRecord()
     year_rec.age = 94
-    year_rec.growth_rate=0
-    rrsp = funds.RRSP()
-    rrsp.amount = 50
-    rrsp.Update(year_rec)
-    tfsa = funds.TFSA()
-    tfsa.amount = 50
-    nonreg = funds.NonRegistered()
-    nonreg.amount = 30
-    nonreg.unrealized_gains = 15
-    fund_chain = (rrsp, tfsa, nonreg)
-    proportions = (0, 0.5, 1)
-    withdrawn, gains, year_rec = funds.ChainedWithdraw(60, fund_chain,
-                                                       proportions,
-                                                       utils.YearRecord())
+    year_rec.growth_rate = 0
+    ledger.Update(year_rec)
+    ledger.amount[funds.WP_TFSA] = 50
+    ledger.amount[funds.WP_NONREG] = 30
+    ledger.unrealized_gains[funds.WP_NONREG] = 15
+    withdrawn, gains, year_rec = ledger.ChainedWithdraw(60, fund_chain, (0, 0.5, 1), utils.YearRecord())
     self.assertEqual(withdrawn, 60)
     self.assertEqual(gains, 12.5)
     self.assertSequenceEqual(
-        year_rec.withdrawals, 
+        year_rec.withdrawals,
         [funds.WithdrawReceipt(10, 0, funds.FUND_TYPE_RRSP),
          funds.WithdrawReceipt(25, 0, funds.FUND_TYPE_TFSA),
          funds.WithdrawReceipt(25, 12.5, funds.FUND_TYPE_NONREG)])
-    self.assertEqual(rrsp.amount, 40)
-    self.assertEqual(tfsa.amount, 25)
-    self.assertEqual(nonreg.amount, 5)
+    self.assertEqual(ledger.amount[funds.WP_RRSP], 40)
+    self.assertEqual(ledger.amount[funds.WP_TFSA], 25)
+    self.assertEqual(ledger.amount[funds.WP_NONREG], 5)
 
   def testChainedWithdrawForcedWithdrawProportionalDeposit(self):
+    ledger, fund_chain = self.Ledger(100, 50, 50, nonreg_unrealized_gains=25, rrsp_forced_withdraw=80)
     year_rec = utils.YearRecord()
-    rrsp = funds.RRSP()
-    rrsp.amount = 100
-    rrsp.forced_withdraw = 80
-    tfsa = funds.TFSA()
-    tfsa.amount = 50
     year_rec.tfsa_room = 50
-    nonreg = funds.NonRegistered()
-    nonreg.amount = 50
-    nonreg.unrealized_gains = 25
-    fund_chain = (rrsp, tfsa, nonreg)
-    proportions = (0.1, 0.5, 1)
-    withdrawn, gains, year_rec = funds.ChainedWithdraw(60, fund_chain,
-                                                       proportions,
-                                                       year_rec)
+    withdrawn, gains, year_rec = ledger.ChainedWithdraw(60, fund_chain, (0.1, 0.5, 1), year_rec)
     self.assertEqual(withdrawn, 60)
     self.assertEqual(gains, 0)
     self.assertSequenceEqual(
-        year_rec.withdrawals, 
+        year_rec.withdrawals,
         [funds.WithdrawReceipt(80, 0, funds.FUND_TYPE_RRSP)])
     self.assertSequenceEqual(
         year_rec.deposits,
         [funds.DepositReceipt(10, funds.FUND_TYPE_TFSA),
          funds.DepositReceipt(10, funds.FUND_TYPE_NONREG)])
-    self.assertEqual(rrsp.amount, 20)
-    self.assertEqual(tfsa.amount, 60)
-    self.assertEqual(nonreg.amount, 60)
+    self.assertEqual(ledger.amount[funds.WP_RRSP], 20)
+    self.assertEqual(ledger.amount[funds.WP_TFSA], 60)
+    self.assertEqual(ledger.amount[funds.WP_NONREG], 60)
 
   def testChainedWithdrawForcedWithdrawOverflow(self):
-    rrsp = funds.RRSP()
-    rrsp.amount = 100
-    rrsp.forced_withdraw = 80
-    tfsa = funds.TFSA()
-    tfsa.amount = 50
-    tfsa.room = 0
-    fund_chain = (rrsp, tfsa)
-    proportions = (0.5, 1)
-    withdrawn, gains, year_rec = funds.ChainedWithdraw(60, fund_chain,
-                                                       proportions,
-                                                       utils.YearRecord())
+    ledger, _ = self.Ledger(100, 50, 0, rrsp_forced_withdraw=80)
+    year_rec = utils.YearRecord()
+    year_rec.tfsa_room = 0
+    withdrawn, gains, year_rec = ledger.ChainedWithdraw(60, (funds.WP_RRSP, funds.WP_TFSA), (0.5, 1), year_rec)
     self.assertEqual(withdrawn, 80)
     self.assertEqual(gains, 0)
     self.assertSequenceEqual(
@@ -671,19 +504,12 @@ class ChainingTest(unittest.TestCase):
         [funds.WithdrawReceipt(80, 0, funds.FUND_TYPE_RRSP)])
     self.assertSequenceEqual(
         year_rec.deposits, [funds.DepositReceipt(0, funds.FUND_TYPE_TFSA)])
-    self.assertEqual(rrsp.amount, 20)
-    self.assertEqual(tfsa.amount, 50)
+    self.assertEqual(ledger.amount[funds.WP_RRSP], 20)
+    self.assertEqual(ledger.amount[funds.WP_TFSA], 50)
 
   def testChainedWithdrawForcedWithdrawWantZero(self):
-    rrsp = funds.RRSP()
-    rrsp.amount = 100
-    rrsp.forced_withdraw = 20
-    nonreg = funds.NonRegistered()
-    fund_chain = (rrsp, nonreg)
-    proportions = (0, 1)
-    withdrawn, gains, year_rec = funds.ChainedWithdraw(0, fund_chain,
-                                                       proportions,
-                                                       utils.YearRecord())
+    ledger, _ = self.Ledger(100, 0, 0, rrsp_forced_withdraw=20)
+    withdrawn, gains, year_rec = ledger.ChainedWithdraw(0, (funds.WP_RRSP, funds.WP_NONREG), (0, 1), utils.YearRecord())
     self.assertEqual(withdrawn, 0)
     self.assertEqual(gains, 0)
     self.assertSequenceEqual(
@@ -691,24 +517,14 @@ class ChainingTest(unittest.TestCase):
         [funds.WithdrawReceipt(20, 0, funds.FUND_TYPE_RRSP)])
     self.assertSequenceEqual(
         year_rec.deposits, [funds.DepositReceipt(20, funds.FUND_TYPE_NONREG)])
-    self.assertEqual(rrsp.amount, 80)
-    self.assertEqual(nonreg.amount, 20)
+    self.assertEqual(ledger.amount[funds.WP_RRSP], 80)
+    self.assertEqual(ledger.amount[funds.WP_NONREG], 20)
 
   def testChainedTransactionDifferentProportion(self):
+    ledger, fund_chain = self.Ledger(100, 50, 0, rrsp_forced_withdraw=80)
     year_rec = utils.YearRecord()
-    rrsp = funds.RRSP()
-    rrsp.amount = 100
-    rrsp.forced_withdraw = 80
-    tfsa = funds.TFSA()
-    tfsa.amount = 50
     year_rec.tfsa_room = 100
-    nonreg = funds.NonRegistered()
-    fund_chain = (rrsp, tfsa, nonreg)
-    withdrawal_proportions = (0.5, 0.5, 1)
-    deposit_proportions = (0.5, 0.8, 1)
-    withdrawn, gains, year_rec = funds.ChainedTransaction(
-        60, fund_chain, withdrawal_proportions, deposit_proportions,
-        year_rec)
+    withdrawn, gains, year_rec = ledger.ChainedTransaction(60, fund_chain, (0.5, 0.5, 1), (0.5, 0.8, 1), year_rec)
     self.assertEqual(withdrawn, 60)
     self.assertEqual(gains, 0)
     self.assertSequenceEqual(
@@ -717,58 +533,98 @@ class ChainingTest(unittest.TestCase):
     self.assertSequenceEqual(
         year_rec.deposits, [funds.DepositReceipt(16, funds.FUND_TYPE_TFSA),
                             funds.DepositReceipt(4, funds.FUND_TYPE_NONREG)])
-    self.assertEqual(rrsp.amount, 20)
-    self.assertEqual(tfsa.amount, 66)
-    self.assertEqual(nonreg.amount, 4)
-
-
-class TestSplitFund(unittest.TestCase):
-
-  def testSplitFundSufficientFunds(self):
-    source = funds.Fund()
-    source.amount = 40
-    source.unrealized_gains = 20
-    sink = funds.Fund()
-    source, sink = funds.SplitFund(source, sink, 30)
-    self.assertEqual(source.amount, 10)
-    self.assertEqual(sink.amount, 30)
-    self.assertEqual(source.unrealized_gains, 5)
-    self.assertEqual(sink.unrealized_gains, 15)
-
-  def testSplitFundInsufficientFunds(self):
-    source = funds.Fund()
-    source.amount = 40
-    source.unrealized_gains = 20
-    sink = funds.Fund()
-    source, sink = funds.SplitFund(source, sink, 50)
-    self.assertEqual(source.amount, 0)
-    self.assertEqual(sink.amount, 40)
-    self.assertEqual(source.unrealized_gains, 0)
-    self.assertEqual(sink.unrealized_gains, 20)
-
-  def testSplitFundSinkHasMoney(self):
-    source = funds.Fund()
-    source.amount = 40
-    source.unrealized_gains = 20
-    sink = funds.Fund()
-    sink.amount = 20
-    sink.unrealized_gains = 10
-    source, sink = funds.SplitFund(source, sink, 30)
-    self.assertEqual(source.amount, 10)
-    self.assertEqual(sink.amount, 50)
-    self.assertEqual(source.unrealized_gains, 5)
-    self.assertEqual(sink.unrealized_gains, 25)
-
-  def testSplitFundSourceHasZeroFunds(self):
-    source = funds.Fund()
-    source.amount = 0
-    source.unrealized_gains = 0
-    sink = funds.Fund()
-    source, sink = funds.SplitFund(source, sink, 30)
-    self.assertEqual(source.amount, 0)
-    self.assertEqual(sink.amount, 0)
-    self.assertEqual(source.unrealized_gains, 0)
-    self.assertEqual(sink.unrealized_gains, 0)
+    self.assertEqual(ledger.amount[funds.WP_RRSP], 20)
+    self.assertEqual(ledger.amount[funds.WP_TFSA], 66)
+    self.assertEqual(ledger.amount[funds.WP_NONREG], 4)
+
+
+class SplitTest(unittest.TestCase):
+
+  def Split(self, source_amount, source_gains, amount, sink_amount=0, sink_gains=0):
+    ledger = LedgerWith(funds.WP_NONREG, source_amount, unrealized_gains=source_gains)
+    ledger.Open(funds.CED_NONREG)
+    ledger.amount[funds.CED_NONREG] = sink_amount
+    ledger.unrealized_gains[funds.CED_NONREG] = sink_gains
+    ledger.Split(funds.WP_NONREG, funds.CED_NONREG, amount)
+    return [(ledger.amount[slot], ledger.unrealized_gains[slot]) for slot in (funds.WP_NONREG, funds.CED_NONREG)]
+
+  def testSplitSufficientFunds(self):
+    self.assertEqual(self.Split(40, 20, 30), [(10, 5), (30, 15)])
+
+  def testSplitInsufficientFunds(self):
+    self.assertEqual(self.Split(40, 20, 50), [(0, 0), (40, 20)])
+
+  def testSplitSinkHasMoney(self):
+    self.assertEqual(self.Split(40, 20, 30, sink_amount=20, sink_gains=10), [(10, 5), (50, 25)])
+
+  def testSplitSourceHasZeroFunds(self):
+    self.assertEqual(self.Split(0, 0, 30), [(0, 0), (0, 0)])
+
+
+class FundLedgerTest(unittest.TestCase):
+
+  def testSlotsStartOpen(self):
+    ledger = funds.FundLedger()
+    self.assertEqual(ledger.open_slots, [funds.WP_TFSA, funds.WP_RRSP, funds.WP_NONREG])
+    self.assertEqual(ledger.amount, [0] * len(funds.SLOT_FUND_TYPES))
+
+  def testOpenAndClose(self):
+    ledger = funds.FundLedger()
+    ledger.Open(funds.CD_RRSP)
+    ledger.Open(funds.BRIDGING)
+    ledger.Open(funds.BRIDGING)
+    self.assertEqual(ledger.open_slots, [funds.WP_TFSA, funds.WP_RRSP, funds.WP_NONREG, funds.BRIDGING, funds.CD_RRSP])
+    ledger.amount[funds.BRIDGING] = 10
+    ledger.forced_withdraw[funds.BRIDGING] = 5
+    ledger.Close(funds.BRIDGING)
+    self.assertNotIn(funds.BRIDGING, ledger.open_slots)
+    self.assertEqual((ledger.amount[funds.BRIDGING], ledger.forced_withdraw[funds.BRIDGING]), (0, 0))
+
+  def testMove(self):
+    ledger = funds.FundLedger()
+    ledger.amount[funds.WP_NONREG] = 40
+    ledger.unrealized_gains[funds.WP_NONREG] = 20
+    ledger.Open(funds.CED_NONREG)
+    ledger.Split(funds.WP_NONREG, funds.CED_NONREG, 30)
+    ledger.Move(funds.WP_NONREG, funds.CD_NONREG)
+    self.assertEqual(ledger.open_slots, [funds.WP_TFSA, funds.WP_RRSP, funds.CD_NONREG, funds.CED_NONREG])
+    self.assertEqual(ledger.amount[funds.CD_NONREG], 10)
+    self.assertEqual(ledger.unrealized_gains[funds.CD_NONREG], 5)
+    self.assertEqual(ledger.amount[funds.CED_NONREG], 30)
+    self.assertEqual(ledger.unrealized_gains[funds.CED_NONREG], 15)
+    self.assertEqual(ledger.amount[funds.WP_NONREG], 0)
+
+  def testTotal(self):
+    ledger = funds.FundLedger()
+    ledger.amount[funds.WP_TFSA] = 10
+    ledger.amount[funds.WP_NONREG] = 40
+    # Closed slots don't count
+    ledger.amount[funds.CD_TFSA] = 100
+    self.assertEqual(ledger.Total(), 50)
+    self.assertEqual(ledger.Total(funds.FUND_TYPE_NONREG), 40)
+    self.assertEqual(ledger.Total(funds.FUND_TYPE_RRSP), 0)
+
+  def testUpdateOnlyOpenSlots(self):
+    ledger = funds.FundLedger()
+    ledger.amount[funds.WP_RRSP] = 100
+    ledger.amount[funds.CD_RRSP] = 100
+    year_rec = utils.YearRecord()
+    year_rec.growth_rate = 0.1
+    year_rec.age = 70
+    ledger.Update(year_rec)
+    self.assertAlmostEqual(ledger.amount[funds.WP_RRSP], 110)
+    self.assertAlmostEqual(ledger.forced_withdraw[funds.WP_RRSP], 110 * world.MINIMUM_WITHDRAWAL_FRACTION[71])
+    self.assertEqual(ledger.amount[funds.CD_RRSP], 100)
+    self.assertEqual([record.fund_type for record in year_rec.growth_records],
+                     [funds.FUND_TYPE_TFSA, funds.FUND_TYPE_RRSP, funds.FUND_TYPE_NONREG])
+
+  def testCopy(self):
+    ledger = funds.FundLedger()
+    copied = ledger.Copy()
+    copied.amount[funds.WP_TFSA] = 10
+    copied.Open(funds.BRIDGING)
+    self.assertEqual(ledger.amount[funds.WP_TFSA], 0)
+    self.assertNotIn(funds.BRIDGING, ledger.open_slots)
 
 
 if __name__ == '__main__':
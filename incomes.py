@@ -45,14 +45,20 @@ class Income(object):
 
 class Earnings(Income):
   
-  def __init__(self):
+  def __init__(self, rng=random, timeline=None):
     self.taxable = True
+    self.rng = rng
+    self.timeline = timeline  # If given, a person.LifeTimeline whose earnings shocks are used instead of drawing from rng
     self.income_type = INCOME_TYPE_EARNINGS
 
   def CalcAmount(self, year_rec):
     if year_rec.is_employed:
       current_ympe = utils.Indexed(world.YMPE, year_rec.year, 1 + world.PARGE) * year_rec.cpi
-      earnings = max(random.normalvariate(current_ympe * world.EARNINGS_YMPE_FRACTION, world.YMPE_STDDEV * current_ympe), 0)
+      if self.timeline is None:
+        earnings = max(self.rng.normalvariate(current_ympe * world.EARNINGS_YMPE_FRACTION, world.YMPE_STDDEV * current_ympe), 0)
+      else:
+        shock = self.timeline.earnings_shocks[year_rec.age - world.START_AGE]
+        earnings = max(current_ympe * world.EARNINGS_YMPE_FRACTION + world.YMPE_STDDEV * current_ympe * shock, 0)
       return earnings
     else:
       return 0
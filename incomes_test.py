@@ -39,6 +39,16 @@ class IncomeTest(unittest.TestCase):
       self.assertIn(incomes.IncomeReceipt(0, incomes.INCOME_TYPE_EARNINGS),
                     year_rec.incomes)
 
+  def testEarningsEmployedTimeline(self):
+    timeline = unittest.mock.Mock(earnings_shocks=[0, 1])
+    income = incomes.Earnings(timeline=timeline)
+    year_rec = utils.YearRecord()
+    year_rec.is_employed = True
+    year_rec.age = world.START_AGE + 1
+    year_rec.year = world.BASE_YEAR
+    amount, taxable, year_rec = income.GiveMeMoney(year_rec)
+    self.assertAlmostEqual(amount, world.YMPE * (world.EARNINGS_YMPE_FRACTION + world.YMPE_STDDEV))
+
   def testEarningsUnemployed(self):
     income = incomes.Earnings()
     amount, taxable, year_rec = income.GiveMeMoney(utils.YearRecord())
@@ -2,13 +2,14 @@
 import argparse
 import collections
 import csv
-import multiprocessing
+import hashlib
+import itertools
 import os
+import resource
 import sys
 import random
 import math
-
-from pyeasyga.pyeasyga import pyeasyga
+import time
 
 import person
 import utils
@@ -61,37 +62,361 @@ DEFAULT_STRATEGY_BOUNDS = StrategyBounds(
     0, 1,  # reinvestment_preference_tfsa_fraction
     )
 
-def RunPopulationWorker(strategy, gender, n, basic, real_values):
+WorkerTiming = collections.namedtuple("WorkerTiming", ["n", "simulation_seconds", "peak_rss_kb"])
+PopulationTiming = collections.namedtuple("PopulationTiming", ["workers", "wall_seconds", "pool_startup_seconds", "merge_seconds", "worker_timings"])
+
+# Lives are simulated and merged in blocks of this size, in order, so that a seeded run gives identical results however many workers it uses
+LIVES_PER_BLOCK = 100
+
+SamplingOptions = collections.namedtuple("SamplingOptions", ["antithetic", "qmc_replicates", "mortality_strata", "survival_weighting", "control_variates",
+                                                             "retirement_snapshots", "life_timelines", "scenario_model", "cohort_size"],
+                                         defaults=[False, 0, 0, False, False, False, False, None, 0])
+
+DEFAULT_SAMPLING = SamplingOptions()
+
+def SamplingHash(sampling):
+  """Returns a short hex digest that tells SamplingOptions apart, without comparing them field by field"""
+  return hashlib.sha256(repr(sampling).encode()).hexdigest()[:16]
+
+# The most lives whose RetirementSnapshots each process keeps, least recently used first out. Each takes about 10 kB.
+RETIREMENT_SNAPSHOT_CACHE_LIVES = 5000
+
+_retirement_snapshots = collections.OrderedDict()
+
+# Enough quasi-random dimensions for inflation, investment return and earnings shocks in every year of the longest life
+QMC_DIMENSIONS = 3 * (max(max(world.MALE_MORTALITY), max(world.FEMALE_MORTALITY)) - world.START_AGE + 1)
+
+_sobol_sequence = None
+
+def QMCLifeRandom(seed, life, replicates):
+  """Returns a quasi-random stream for one life of a randomized quasi-Monte Carlo run.
+
+  Life i is point i // replicates of a Sobol sequence, with the random
+  digital shift of replicate i % replicates. Its normal shocks come from the
+  point and its uniform draws from LifeRandom.
+  """
+  global _sobol_sequence
+  import qmc
+  if _sobol_sequence is None:
+    _sobol_sequence = qmc.SobolSequence(QMC_DIMENSIONS)
+  shift = _sobol_sequence.RandomShift(random.Random("%d/shift/%d" % (seed, life % replicates)))
+  return qmc.QuasiRandomStream(_sobol_sequence.Point(life // replicates, shift), LifeRandom(seed, life))
+
+def LifeRandom(seed, life):
+  """Returns the random stream for one life of a run with the given root seed"""
+  return random.Random("%d/%d" % (seed, life))
+
+class BlockWorkers:
+  """Worker processes that keep running between populations, each always simulating the same blocks of lives.
+
+  Block i goes to worker i % processes every time, so a block's lives meet
+  the retirement snapshots that worker kept from earlier populations. A
+  multiprocessing.Pool hands work to whichever worker is free, and a new one
+  starts with empty snapshot caches, so neither would ever resume a life.
+  """
+
+  def __init__(self, processes=None):
+    import multiprocessing
+    self.pools = [multiprocessing.Pool(1) for _ in range(processes or os.cpu_count())]
+
+  def Map(self, function, blocks):
+    """Returns an iterator over function(arg) for each (block, arg) pair in blocks, in order"""
+    results = [self.pools[block % len(self.pools)].apply_async(function, (arg,)) for block, arg in blocks]
+    return (result.get() for result in results)
+
+  def Close(self):
+    for pool in self.pools:
+      pool.close()
+    for pool in self.pools:
+      pool.join()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.Close()
+
+def SplitBlocks(n):
+  """Returns (first_life, size) pairs covering n lives in blocks of LIVES_PER_BLOCK"""
+  return [(first_life, min(LIVES_PER_BLOCK, n - first_life)) for first_life in range(0, n, LIVES_PER_BLOCK)]
+
+def RunPopulationWorker(strategy, gender, n, basic, real_values, seed=None, trace_options=None, plan=None, first_life=0, sampling=DEFAULT_SAMPLING):
+  """Simulates lives first_life to first_life + n - 1.
+
+  If seed is given, each life draws from its own LifeRandom stream, so a
+  life's draws don't depend on which worker simulates it or what else that
+  worker does. Otherwise all lives draw from the random module.
+
+  If sampling.antithetic is set, lives 2k and 2k + 1 are an antithetic pair:
+  the second replays the first's random stream with its market shocks
+  mirrored.
+
+  If sampling.mortality_strata is set, lives are taken in rounds of that many,
+  one from each equal-probability stratum of the distribution of age at
+  death. Every stratum gets the same number of lives, so they need no
+  reweighting.
+
+  Each antithetic pair or mortality round is merged as one cluster so that
+  the standard errors account for the lives in it not being independent. A
+  pair or round split between workers is completed when their accumulators
+  are merged.
+
+  If sampling.qmc_replicates is set, lives draw their shocks from
+  QMCLifeRandom streams instead, into a person.LifeTimeline so that each
+  year's shocks are always at the same coordinates of the Sobol point. Each
+  replicate is merged as one cluster, so that the standard errors come from
+  the spread between replicates.
+
+  If sampling.survival_weighting is set, no deaths are drawn: each life's
+  economic path runs to the end of the mortality table with its values
+  weighted by survival probability, and is merged as one cluster. It can't
+  be combined with sampling.mortality_strata.
+
+  If sampling.control_variates is set, every life, or group of lives, is
+  merged as a cluster along with its control variates, so that the fitness
+  components can be adjusted by them.
+
+  If sampling.retirement_snapshots is set, each life's state at retirement
+  is kept as a person.RetirementSnapshot, for the seed and the strategy's
+  working phase. A later run of the same life for a strategy that differs
+  only after retirement resumes from the snapshot instead of living through
+  the working years again. Snapshots are kept per process, so parallel runs
+  only reuse them when each block of lives goes back to the same worker, as
+  BlockWorkers arranges. Traced and survival weighted lives aren't
+  snapshotted.
+
+  If sampling.life_timelines is set, each life's random events are drawn
+  at birth into a person.LifeTimeline, from the same stream it would
+  otherwise draw from year by year. The results are different draws from
+  the same distribution.
+
+  If sampling.scenario_model is set, the lives' inflation and investment
+  returns are instead taken from paths generated by that scenarios model for
+  the whole block at once, and everything else is drawn into a LifeTimeline.
+  If sampling.cohort_size is also set, lives in the same cohort of that many
+  share one market path, and each cohort is merged as one cluster. It must
+  be a multiple of sampling.mortality_strata, and can't be combined with the
+  other sampling options, which assume independent normal market shocks.
+
+  All of these need a seed, so one is drawn if not given.
+  """
+  if sampling != DEFAULT_SAMPLING and seed is None:
+    seed = random.randrange(2**32)
+
   # Initialize accumulators
-  accumulators = utils.AccumulatorBundle(basic_only=basic)
+  accumulators = utils.AccumulatorBundle(basic_only=basic, plan=plan)
+  tracer = None
+  if trace_options:
+    import tracing
+    tracer = tracing.TraceWriter(trace_options)
+
+  snapshotting = sampling.retirement_snapshots and not tracer and not sampling.survival_weighting
+  if snapshotting:
+    # Everything but the life that picks out a snapshot, with the sampling options hashed once rather than for every life
+    snapshot_key = (seed, gender, basic, real_values, plan, SamplingHash(sampling), person.WorkingPhase(strategy))
+  market_paths = None
+  if sampling.scenario_model is not None:
+    import scenarios
+    market_paths = scenarios.GeneratePaths(sampling.scenario_model, seed, first_life, n, sampling.cohort_size)
 
-  # Run n Person instantiations
-  for i in range(n):
-    p = person.Person(strategy, gender, basic, real_values)
-    p.LiveLife()
+  def LiveLife(life):
+    if snapshotting:
+      key = (life, snapshot_key)
+      snapshot = _retirement_snapshots.get(key)
+      if snapshot is not None:
+        _retirement_snapshots.move_to_end(key)
+        return snapshot.Resume(strategy)
 
-    # Merge in the results to our accumulators
-    accumulators.Merge(p.accumulators)
+    rng = random if seed is None else LifeRandom(seed, life)
+    antithetic = False
+    death_uniform = None
+    if sampling.qmc_replicates:
+      rng = QMCLifeRandom(seed, life, sampling.qmc_replicates)
+    elif sampling.antithetic:
+      rng = LifeRandom(seed, life - life % 2)
+      antithetic = life % 2 == 1
+    elif sampling.mortality_strata:
+      death_uniform = (life % sampling.mortality_strata + rng.random()) / sampling.mortality_strata
+    timeline = None
+    if market_paths is not None:
+      timeline = person.LifeTimeline(gender, rng, death_uniform, market=market_paths[life - first_life])
+    elif sampling.life_timelines or sampling.qmc_replicates:
+      # Quasi-random streams need each shock at a fixed coordinate, whatever else the life draws
+      timeline = person.LifeTimeline(gender, rng, death_uniform, antithetic, survival_weighted=sampling.survival_weighting)
+    p = person.Person(strategy, gender, basic, real_values, tracer.ForLife(life) if tracer else None, plan, rng, antithetic, death_uniform,
+                      sampling.survival_weighting, timeline)
+    if not snapshotting:
+      p.LiveLife()
+      return p.accumulators
+    year_rec = p.LiveWorkingLife()
+    _retirement_snapshots[key] = person.RetirementSnapshot(p, year_rec)
+    if len(_retirement_snapshots) > RETIREMENT_SNAPSHOT_CACHE_LIVES:
+      _retirement_snapshots.popitem(last=False)
+    if year_rec is not None:
+      p.LiveRetiredLife(year_rec)
+    return p.accumulators
 
+  # Run n Person instantiations, merging in the results to our accumulators
+  group_size = sampling.cohort_size or (2 if sampling.antithetic else sampling.mortality_strata)
+  last_life = first_life + n
+  life = first_life
+  while life < last_life:
+    if sampling.qmc_replicates:
+      accumulators.MergeCluster(LiveLife(life), life % sampling.qmc_replicates, sampling.control_variates)
+      life += 1
+    elif group_size:
+      group_start = life - life % group_size
+      group_end = min(group_start + group_size, last_life)
+      group = LiveLife(life)
+      for member in range(life + 1, group_end):
+        group.Merge(LiveLife(member))
+      complete = group_start >= first_life and group_start + group_size <= last_life
+      accumulators.MergeCluster(group, None if complete else ("group", group_start), sampling.control_variates)
+      life = group_end
+    elif sampling.survival_weighting or sampling.control_variates:
+      accumulators.MergeCluster(LiveLife(life), controlled=sampling.control_variates)
+      life += 1
+    else:
+      accumulators.Merge(LiveLife(life))
+      life += 1
+
+  if tracer:
+    tracer.Close()
   return accumulators
 
-def RunPopulation(strategy, gender, n, basic, real_values, use_multiprocessing):
-  """Runs population multithreaded"""
-  if not use_multiprocessing:
-    return RunPopulationWorker(strategy, gender, n, basic, real_values)
+def TimedRunPopulationWorker(strategy, gender, n, basic, real_values, seed=None, trace_options=None, plan=None, first_life=0, sampling=DEFAULT_SAMPLING):
+  """Runs RunPopulationWorker, also returning the time spent simulating and the peak RSS of the worker"""
+  start = time.perf_counter()
+  accumulators = RunPopulationWorker(strategy, gender, n, basic, real_values, seed, trace_options, plan, first_life, sampling)
+  simulation_seconds = time.perf_counter() - start
+  return accumulators, WorkerTiming(n, simulation_seconds, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+def TimedRunPopulationBlock(args):
+  return TimedRunPopulationWorker(*args)
+
+def TimedRunPopulation(strategy, gender, n, basic, real_values, use_multiprocessing, processes=None, trace_options=None, plan=None, seed=None, sampling=DEFAULT_SAMPLING,
+                       workers=None):
+  """Runs population multithreaded, returning the accumulators and a PopulationTiming.
+
+  Lives are simulated in blocks of LIVES_PER_BLOCK, each life with its own
+  random stream derived from seed, and the blocks are merged in order. The
+  accumulators are therefore bit-identical for a given seed however many
+  processes are used. seed is drawn from the random module if not given.
+
+  processes defaults to the number of CPUs. Pool startup and merge times are
+  measured in the parent, and each block's simulation time in its worker.
+  Whatever is left of the wall time after those and the workers' share of the
+  simulation time is IPC and scheduling overhead. If
+  trace_options is a tracing.TraceOptions, each block writes its own trace
+  files, tagged with its block number. plan is as for utils.AccumulatorBundle.
+  sampling is a SamplingOptions, as for RunPopulationWorker. If workers is a
+  BlockWorkers, the blocks are run on it instead of on a new pool, and
+  processes is ignored.
+  """
+  start = time.perf_counter()
+  if seed is None:
+    seed = random.randrange(2**32)
 
   # Initialize accumulators for calculation of fitness function
-  accumulators = utils.AccumulatorBundle(basic_only=basic)
+  accumulators = utils.AccumulatorBundle(basic_only=basic, plan=plan)
+  merge_seconds = 0
+  worker_timings = []
 
-  # Farm work out to worker process pool
-  args = [(strategy, gender, n//os.cpu_count(), basic, real_values) for _ in range(os.cpu_count()-1)]
-  args.append((strategy, gender, n - n//os.cpu_count() * (os.cpu_count()-1), basic, real_values))
-  with multiprocessing.Pool() as pool:
-    for result in [pool.apply_async(RunPopulationWorker, arg) for arg in args]:
-      accumulators.Merge(result.get())
+  args = [(strategy, gender, size, basic, real_values, seed, trace_options._replace(worker=i) if trace_options else None, plan, first_life, sampling)
+          for i, (first_life, size) in enumerate(SplitBlocks(n))]
 
+  def MergeBlocks(results):
+    nonlocal merge_seconds
+    for block_accumulators, worker_timing in results:
+      merge_start = time.perf_counter()
+      accumulators.Merge(block_accumulators)
+      merge_seconds += time.perf_counter() - merge_start
+      worker_timings.append(worker_timing)
+
+  if not use_multiprocessing:
+    MergeBlocks(TimedRunPopulationBlock(arg) for arg in args)
+    return accumulators, PopulationTiming(1, time.perf_counter() - start, 0, merge_seconds, worker_timings)
+
+  if workers:
+    MergeBlocks(workers.Map(TimedRunPopulationBlock, enumerate(args)))
+    return accumulators, PopulationTiming(len(workers.pools), time.perf_counter() - start, 0, merge_seconds, worker_timings)
+
+  # Farm blocks out to worker process pool, merging them in order as they finish
+  import multiprocessing
+  processes = processes or os.cpu_count()
+  with multiprocessing.Pool(processes) as pool:
+    pool_startup_seconds = time.perf_counter() - start
+    MergeBlocks(pool.imap(TimedRunPopulationBlock, args))
+
+  return accumulators, PopulationTiming(processes, time.perf_counter() - start, pool_startup_seconds, merge_seconds, worker_timings)
+
+def RunPopulation(strategy, gender, n, basic, real_values, use_multiprocessing, trace_options=None, seed=None, sampling=DEFAULT_SAMPLING):
+  """Runs population multithreaded"""
+  accumulators, _ = TimedRunPopulation(strategy, gender, n, basic, real_values, use_multiprocessing, trace_options=trace_options, seed=seed, sampling=sampling)
   return accumulators
 
+def SplitPopulation(n, chunks):
+  """Returns chunk sizes adding up to n, with the remainder going to the last chunk"""
+  return [n//chunks] * (chunks-1) + [n - n//chunks * (chunks-1)]
+
+def StrategyChunkWorker(task):
+  key, args = task
+  return key, RunPopulationWorker(*args)
+
+def EvaluateStrategyChunks(strategies, gender, n, real_values, use_multiprocessing, chunks, processes=None, seed=None, sampling=DEFAULT_SAMPLING):
+  """Runs a basic population for each strategy in chunks, sharing one worker pool between them.
+
+  Yields (index, chunk, accumulators) triples as each chunk of each strategy
+  finishes, in no particular order. Every strategy's lives draw from the same
+  per-life random streams, derived from seed, so that all strategies see the
+  same random draws as far as their lives allow. seed is drawn from the
+  random module if not given. sampling is as for RunPopulationWorker. If
+  sampling.retirement_snapshots is set, chunk i of every strategy runs on
+  the same one of a set of BlockWorkers, so that later strategies can resume
+  the lives of earlier ones; chunks then finish in the order they were given.
+  """
+  if seed is None:
+    seed = random.randrange(2**32)
+  sizes = SplitPopulation(n, chunks)
+  tasks = [((index, i), (strategy, gender, size, True, real_values, seed, None, None, sum(sizes[:i]), sampling))
+           for index, strategy in enumerate(strategies)
+           for i, size in enumerate(sizes)]
+  if not use_multiprocessing:
+    for task in tasks:
+      (index, i), accumulators = StrategyChunkWorker(task)
+      yield index, i, accumulators
+    return
+
+  if sampling.retirement_snapshots:
+    with BlockWorkers(processes) as workers:
+      for (index, i), accumulators in workers.Map(StrategyChunkWorker, [(task[0][1], task) for task in tasks]):
+        yield index, i, accumulators
+    return
+
+  import multiprocessing
+  with multiprocessing.Pool(processes or os.cpu_count()) as pool:
+    for (index, i), accumulators in pool.imap_unordered(StrategyChunkWorker, tasks):
+      yield index, i, accumulators
+
+def EvaluateStrategies(strategies, gender, n, real_values, use_multiprocessing, processes=None, seed=None, sampling=DEFAULT_SAMPLING):
+  """Runs a basic population for each strategy, sharing one worker pool between them.
+
+  Yields (index, accumulators) pairs as each strategy finishes, which is not
+  necessarily the order the strategies were given in. Seeding is as for
+  EvaluateStrategyChunks. Each strategy's lives are split into blocks of about
+  LIVES_PER_BLOCK that are merged in order, so results for a given seed don't
+  depend on the number of processes.
+  """
+  chunks = max(1, len(SplitBlocks(n)))
+  partial_accumulators = collections.defaultdict(dict)
+  for index, i, accumulators in EvaluateStrategyChunks(strategies, gender, n, real_values, use_multiprocessing, chunks, processes, seed, sampling):
+    partial_accumulators[index][i] = accumulators
+    if len(partial_accumulators[index]) == chunks:
+      chunk_accumulators = partial_accumulators.pop(index)
+      for i in range(1, chunks):
+        chunk_accumulators[0].Merge(chunk_accumulators[i])
+      yield index, chunk_accumulators[0]
+
 
 def ValidateStrategy(strategy, bounds=DEFAULT_STRATEGY_BOUNDS):
   """Do bounds checking on a strategy and clip anything outside the valid range"""
@@ -112,32 +437,124 @@ def ValidateStrategy(strategy, bounds=DEFAULT_STRATEGY_BOUNDS):
       reinvestment_preference_tfsa_fraction=min(max(bounds.reinvestment_preference_tfsa_fraction_min, strategy.reinvestment_preference_tfsa_fraction), bounds.reinvestment_preference_tfsa_fraction_max),
   )
 
-def Optimize(gender, n, weights, population_size, max_generations, use_multiprocessing, bounds):
-  """Run a genetic algorithm to optimize a strategy based on fitness function weights"""
-
-  def individual_to_strategy(individual):
-    return ValidateStrategy(person.Strategy(
-        planned_retirement_age=bounds.planned_retirement_age_min + (bounds.planned_retirement_age_max - bounds.planned_retirement_age_min)*individual[0],
-        savings_threshold=bounds.savings_threshold_min + (bounds.savings_threshold_max - bounds.savings_threshold_min)*individual[1],
-        savings_rate=bounds.savings_rate_min + (bounds.savings_rate_max - bounds.savings_rate_min)*individual[2],
-        savings_rrsp_fraction=bounds.savings_rrsp_fraction_min + (bounds.savings_rrsp_fraction_max - bounds.savings_rrsp_fraction_min)*individual[3],
-        savings_tfsa_fraction=bounds.savings_tfsa_fraction_min + (bounds.savings_tfsa_fraction_max - bounds.savings_tfsa_fraction_min)*individual[4],
-        lico_target_fraction=bounds.lico_target_fraction_min + (bounds.lico_target_fraction_max - bounds.lico_target_fraction_min)*individual[5],
-        working_period_drawdown_tfsa_fraction=bounds.working_period_drawdown_tfsa_fraction_min + (bounds.working_period_drawdown_tfsa_fraction_max - bounds.working_period_drawdown_tfsa_fraction_min)*individual[6],
-        working_period_drawdown_nonreg_fraction=bounds.working_period_drawdown_nonreg_fraction_min + (bounds.working_period_drawdown_nonreg_fraction_max - bounds.working_period_drawdown_nonreg_fraction_min)*individual[7],
-        oas_bridging_fraction=bounds.oas_bridging_fraction_min + (bounds.oas_bridging_fraction_max - bounds.oas_bridging_fraction_min)*individual[8],
-        drawdown_ced_fraction=bounds.drawdown_ced_fraction_min + (bounds.drawdown_ced_fraction_max - bounds.drawdown_ced_fraction_min)*individual[9],
-        initial_cd_fraction=bounds.initial_cd_fraction_min + (bounds.initial_cd_fraction_max - bounds.initial_cd_fraction_min)*individual[10],
-        drawdown_preferred_rrsp_fraction=bounds.drawdown_preferred_rrsp_fraction_min + (bounds.drawdown_preferred_rrsp_fraction_max - bounds.drawdown_preferred_rrsp_fraction_min)*individual[11],
-        drawdown_preferred_tfsa_fraction=bounds.drawdown_preferred_tfsa_fraction_min + (bounds.drawdown_preferred_tfsa_fraction_max - bounds.drawdown_preferred_tfsa_fraction_min)*individual[12],
-        reinvestment_preference_tfsa_fraction=bounds.reinvestment_preference_tfsa_fraction_min + (bounds.reinvestment_preference_tfsa_fraction_max - bounds.reinvestment_preference_tfsa_fraction_min)*individual[13],
-        ),
-        bounds)
- 
+def ReadStrategies(path, default_strategy, bounds=DEFAULT_STRATEGY_BOUNDS):
+  """Reads strategies from a CSV file with a header row, or a JSON-lines file if the name ends in .jsonl.
+
+  Columns (or keys) are person.Strategy fields; any a row leaves out are taken
+  from default_strategy. Every strategy is passed through ValidateStrategy.
+  """
+  with open(path) as f:
+    if path.endswith('.jsonl'):
+      import json
+      rows = [json.loads(line) for line in f if line.strip()]
+    else:
+      rows = list(csv.DictReader(f))
+
+  strategies = []
+  for row in rows:
+    unknown_fields = set(row) - set(person.Strategy._fields)
+    if unknown_fields:
+      raise ValueError("%s: unknown strategy fields %s" % (path, ", ".join(sorted(unknown_fields))))
+    values = {field: float(value) for field, value in row.items() if value not in ("", None)}
+    strategies.append(ValidateStrategy(default_strategy._replace(**values), bounds))
+  return strategies
+
+def ParseSweepAxis(spec):
+  """Parses a "field:start:stop:points" sweep axis into (field, [values])"""
+  try:
+    field, start, stop, points = spec.split(":")
+    start, stop, points = float(start), float(stop), int(points)
+  except ValueError:
+    raise argparse.ArgumentTypeError("sweep axis should look like field:start:stop:points, got %r" % spec)
+  if field not in person.Strategy._fields:
+    raise argparse.ArgumentTypeError("%r is not a strategy parameter" % field)
+  if points < 1:
+    raise argparse.ArgumentTypeError("a sweep axis needs at least one point")
+  if points == 1:
+    return field, [start]
+  return field, [start + (stop - start) * i / (points - 1) for i in range(points)]
+
+def SweepStrategies(strategy, axes, bounds=DEFAULT_STRATEGY_BOUNDS):
+  """Returns the validated strategies for every point of the grid spanned by axes"""
+  fields = [field for field, _ in axes]
+  return [ValidateStrategy(strategy._replace(**dict(zip(fields, point))), bounds)
+          for point in itertools.product(*(values for _, values in axes))]
+
+def UnitToStrategy(unit, bounds=DEFAULT_STRATEGY_BOUNDS):
+  """Maps a point in the unit hypercube, one coordinate per strategy parameter, to a strategy within bounds"""
+  return ValidateStrategy(person.Strategy(
+      planned_retirement_age=bounds.planned_retirement_age_min + (bounds.planned_retirement_age_max - bounds.planned_retirement_age_min)*unit[0],
+      savings_threshold=bounds.savings_threshold_min + (bounds.savings_threshold_max - bounds.savings_threshold_min)*unit[1],
+      savings_rate=bounds.savings_rate_min + (bounds.savings_rate_max - bounds.savings_rate_min)*unit[2],
+      savings_rrsp_fraction=bounds.savings_rrsp_fraction_min + (bounds.savings_rrsp_fraction_max - bounds.savings_rrsp_fraction_min)*unit[3],
+      savings_tfsa_fraction=bounds.savings_tfsa_fraction_min + (bounds.savings_tfsa_fraction_max - bounds.savings_tfsa_fraction_min)*unit[4],
+      lico_target_fraction=bounds.lico_target_fraction_min + (bounds.lico_target_fraction_max - bounds.lico_target_fraction_min)*unit[5],
+      working_period_drawdown_tfsa_fraction=bounds.working_period_drawdown_tfsa_fraction_min + (bounds.working_period_drawdown_tfsa_fraction_max - bounds.working_period_drawdown_tfsa_fraction_min)*unit[6],
+      working_period_drawdown_nonreg_fraction=bounds.working_period_drawdown_nonreg_fraction_min + (bounds.working_period_drawdown_nonreg_fraction_max - bounds.working_period_drawdown_nonreg_fraction_min)*unit[7],
+      oas_bridging_fraction=bounds.oas_bridging_fraction_min + (bounds.oas_bridging_fraction_max - bounds.oas_bridging_fraction_min)*unit[8],
+      drawdown_ced_fraction=bounds.drawdown_ced_fraction_min + (bounds.drawdown_ced_fraction_max - bounds.drawdown_ced_fraction_min)*unit[9],
+      initial_cd_fraction=bounds.initial_cd_fraction_min + (bounds.initial_cd_fraction_max - bounds.initial_cd_fraction_min)*unit[10],
+      drawdown_preferred_rrsp_fraction=bounds.drawdown_preferred_rrsp_fraction_min + (bounds.drawdown_preferred_rrsp_fraction_max - bounds.drawdown_preferred_rrsp_fraction_min)*unit[11],
+      drawdown_preferred_tfsa_fraction=bounds.drawdown_preferred_tfsa_fraction_min + (bounds.drawdown_preferred_tfsa_fraction_max - bounds.drawdown_preferred_tfsa_fraction_min)*unit[12],
+      reinvestment_preference_tfsa_fraction=bounds.reinvestment_preference_tfsa_fraction_min + (bounds.reinvestment_preference_tfsa_fraction_max - bounds.reinvestment_preference_tfsa_fraction_min)*unit[13],
+      ),
+      bounds)
+
+SensitivityRow = collections.namedtuple("SensitivityRow", ["output", "parameter", "first_order", "first_order_low", "first_order_high", "total_order", "total_order_low", "total_order_high"])
+
+def StrategySensitivity(samples, gender, n, weights, real_values, use_multiprocessing, bounds, chunks, resamples, seed, sampling=DEFAULT_SAMPLING):
+  """Estimates how much of the variance of each fitness component, and of the fitness, comes from each strategy parameter.
+
+  Strategies are spread over bounds with a Saltelli design of the given number
+  of base samples, and every strategy is run in chunks of the same seeded
+  lives. Confidence intervals come from resampling those chunks. Returns a
+  list of SensitivityRow.
+  """
+  import sensitivity
+  dimensions = len(person.Strategy._fields)
+  strategies = [UnitToStrategy(point, bounds) for point in sensitivity.SaltelliDesign(samples, dimensions)]
+
+  # Reduce each chunk to its outputs straight away so that bundles don't pile up
+  outputs = [[None] * chunks for _ in strategies]
+  components = None
+  for index, chunk, accumulators in EvaluateStrategyChunks(strategies, gender, n, real_values, use_multiprocessing, chunks, seed=seed, sampling=sampling):
+    rows = GetFitnessFunctionCompositionTableRows(accumulators, weights)
+    components = [row.component for row in rows]
+    outputs[index][chunk] = [row.value for row in rows] + [sum(row.contribution for row in rows)]
+
+  sensitivity_rows = []
+  for k, output in enumerate(components + ["Fitness"]):
+    chunk_values = [[chunk_outputs[k] for chunk_outputs in point_outputs] for point_outputs in outputs]
+    first_order, total_order = sensitivity.BootstrapSobolIndices(chunk_values, samples, dimensions, resamples, rng=random.Random(seed))
+    for parameter, first, total in zip(person.Strategy._fields, first_order, total_order):
+      sensitivity_rows.append(SensitivityRow(output, parameter, *(first + total)))
+  return sensitivity_rows
+
+def Optimize(gender, n, weights, population_size, max_generations, use_multiprocessing, bounds, telemetry=None, use_fitness_cache=False, recorder=None, sampling=DEFAULT_SAMPLING):
+  """Run a genetic algorithm to optimize a strategy based on fitness function weights
+
+  If telemetry is a telemetry.TelemetryWriter, one record is written for every
+  fitness evaluation and one for every generation. If use_fitness_cache is set,
+  strategies that have already been evaluated during this run are not
+  simulated again. If recorder is an EvaluationRecorder, the components of
+  every evaluated strategy are recorded with it, so every component is
+  accumulated rather than only the weighted ones. Lives are sampled according
+  to the SamplingOptions sampling. Every evaluation draws its own seed, unless
+  sampling.retirement_snapshots is set: then the evaluations of a generation
+  share one, drawn afresh for each generation, so that strategies with the
+  same working phase can resume each other's lives without the whole run
+  being fitted to one sample of lives. The worker processes then stay up for
+  the whole run as BlockWorkers, so that they keep their snapshots.
+  """
+  # The optimizer isn't needed for validation runs, so it is only imported here
+  from pyeasyga.pyeasyga import pyeasyga
+  import telemetry as telemetry_lib
+
   class MyGeneticAlgorithm(pyeasyga.GeneticAlgorithm):
 
     def run(self):
       """Run (solve) the Genetic Algorithm. Also a hack to output a csv table of generation fitness values as it goes."""
+      NewGenerationSeed()
       self.create_first_generation()
 
       def OutputRow(i):
@@ -152,11 +569,22 @@ def Optimize(gender, n, weights, population_size, max_generations, use_multiproc
           ]
         return ",".join(str(e) for e in row)
 
+      def WriteGenerationTelemetry(i):
+        nonlocal generation_stats
+        if telemetry:
+          mean = sum(individual.fitness for individual in self.current_generation)/len(self.current_generation)
+          telemetry.Write("generation", generation=i, best_fitness=self.best_individual()[0], fitness_mean=mean,
+                          evaluations_skipped=evaluations_skipped, **generation_stats.Fields())
+        generation_stats = telemetry_lib.GenerationStats()
+
       print("Generation,Best Fitness,Fitness Mean,Fitness Stddev,Best Individual ID")
       for i in range(0, self.generations):
         print("%s" % OutputRow(i))
+        WriteGenerationTelemetry(i)
+        NewGenerationSeed()
         self.create_next_generation()
       print("%s\n" % OutputRow(self.generations))
+      WriteGenerationTelemetry(self.generations)
       
   ga = MyGeneticAlgorithm(weights, population_size=population_size, generations=max_generations, elitism=True, maximise_fitness=True)
 
@@ -180,54 +608,139 @@ def Optimize(gender, n, weights, population_size, max_generations, use_multiproc
     return child1, child2
   ga.crossover = crossover
 
+  plan = None if recorder else FitnessAccumulatorPlan(weights)
+  fitness_cache = {}
+  generation_stats = telemetry_lib.GenerationStats()
+  evaluations_skipped = 0
+  generation_seed = None
+
+  def NewGenerationSeed():
+    nonlocal generation_seed
+    if sampling.retirement_snapshots:
+      generation_seed = random.randrange(2**32)
+
   def fitness_function(individual, weights):
-    strategy = individual_to_strategy(individual)
-    accumulators = RunPopulation(strategy, gender, n, True, True, use_multiprocessing)
-    return sum(component.contribution for component in GetFitnessFunctionCompositionTableRows(accumulators, weights))
+    nonlocal evaluations_skipped
+    strategy = UnitToStrategy(individual, bounds)
+    if use_fitness_cache and strategy in fitness_cache:
+      generation_stats.AddCacheHit()
+      evaluations_skipped += 1
+      return fitness_cache[strategy]
+
+    seed = random.randrange(2**32) if generation_seed is None else generation_seed
+    accumulators, timing = TimedRunPopulation(strategy, gender, n, True, True, use_multiprocessing, plan=plan, seed=seed, sampling=sampling, workers=workers)
+    rows = GetFitnessFunctionCompositionTableRows(accumulators, weights)
+    fitness = sum(row.contribution for row in rows)
+    person_years = accumulators.lifetime_consumption_summary.n
+    if recorder:
+      recorder.Record(strategy, n, True, rows, seed, timing.wall_seconds, sampling)
+    generation_stats.AddEvaluation(timing, person_years)
+    if use_fitness_cache:
+      fitness_cache[strategy] = fitness
+    if telemetry:
+      telemetry.Write("evaluation", fitness=fitness, strategy=strategy._asdict(),
+                      **telemetry_lib.EvaluationFields(timing, person_years))
+    return fitness
   ga.fitness_function = fitness_function
 
-  ga.run()
+  workers = BlockWorkers() if use_multiprocessing and sampling.retirement_snapshots else None
+  try:
+    ga.run()
+  finally:
+    if workers:
+      workers.Close()
 
   fitness, best_individual = ga.best_individual()
-  return individual_to_strategy(best_individual)
+  return UnitToStrategy(best_individual, bounds)
 
 
+# The fitness function accumulators that each component is computed from
+COMPONENT_ACCUMULATORS = {
+    "ConsumptionAvgLifetime": ["lifetime_consumption_summary"],
+    "ConsumptionAvgWorking": ["working_consumption_summary"],
+    "ConsumptionAvgRetired": ["retired_consumption_summary"],
+    "ConsumptionAvgRetiredPreDisability": ["pre_disability_retired_consumption_summary"],
+    "ConsumptionDiscountedLifetime": ["discounted_lifetime_consumption_summary"],
+    "Consumption10PctLifetime": ["lifetime_consumption_hist"],
+    "Consumption20PctLifetime": ["lifetime_consumption_hist"],
+    "ConsumptionMedianLifetime": ["lifetime_consumption_hist"],
+    "Consumption10PctRetired": ["retired_consumption_hist"],
+    "Consumption20PctRetired": ["retired_consumption_hist"],
+    "ConsumptionMedianRetired": ["retired_consumption_hist"],
+    "StdConsumptionLifetime": ["lifetime_consumption_summary"],
+    "StdConsumptionWorking": ["working_consumption_summary"],
+    "StdConsumptionRetired": ["retired_consumption_summary"],
+    "EarningsAvgLateWorking": ["earnings_late_working_summary"],
+    "FractionPersonsRuined": ["fraction_persons_ruined"],
+    "FractionRetirementYearsRuined": ["fraction_retirement_years_ruined"],
+    "FractionRetirementYearsBelowYMPE": ["fraction_retirement_years_below_ympe"],
+    "FractionRetirementYearsBelowTwiceYMPE": ["fraction_retirement_years_below_twice_ympe"],
+    "FractionRetireesReceivingGIS": ["fraction_retirees_receiving_gis"],
+    "FractionRetirementYearsReceivingGIS": ["fraction_retirement_years_receiving_gis"],
+    "AverageBenefitsGIS": ["benefits_gis"],
+    "FractionRetireesEverBelowLICO": ["fraction_retirees_ever_below_lico"],
+    "FractionRetirementYearsBelowLICO": ["fraction_retirement_years_below_lico"],
+    "AverageLICOGapWorking": ["lico_gap_working"],
+    "AverageLICOGapRetired": ["lico_gap_retired"],
+    "FractionPersonsWithWithdrawalsBelowRetirementAssets": ["fraction_persons_with_withdrawals_below_retirement_assets"],
+    "FractionRetireesWithWithdrawalsBelowRetirementAssets": ["fraction_retirees_with_withdrawals_below_retirement_assets"],
+    "AverageLifetimeWithdrawalsLessSavings": ["lifetime_withdrawals_less_savings"],
+    "ConsumptionAvgRetirementBelowFractionAvgWorking": ["retirement_consumption_less_working_consumption", "retired_consumption_summary", "working_consumption_summary"],
+    "AverageDistributableEstate": ["distributable_estate"],
+}
+
+def FitnessAccumulatorPlan(weights):
+  """Returns the names of the accumulators needed for the fitness components with non-zero weights.
+
+  The lifetime consumption summary is always included, since its count of
+  person-years is used for reporting.
+  """
+  return frozenset(["lifetime_consumption_summary"] +
+                   [name for component, weight in weights.items() if weight for name in COMPONENT_ACCUMULATORS[component]])
+
 FitnessFunctionCompositionRow = collections.namedtuple("FitnessFunctionCompositionRow", ["component", "value", "stderr", "weight", "contribution"])
 
 def GetFitnessFunctionCompositionTableRows(accumulators, weights):
-  return [
-    FitnessFunctionCompositionRow("ConsumptionAvgLifetime", accumulators.lifetime_consumption_summary.mean, accumulators.lifetime_consumption_summary.stderr, weights["ConsumptionAvgLifetime"], weights["ConsumptionAvgLifetime"] * accumulators.lifetime_consumption_summary.mean),
-    FitnessFunctionCompositionRow("ConsumptionAvgWorking", accumulators.working_consumption_summary.mean, accumulators.working_consumption_summary.stderr, weights["ConsumptionAvgWorking"], weights["ConsumptionAvgWorking"] * accumulators.working_consumption_summary.mean),
-    FitnessFunctionCompositionRow("ConsumptionAvgRetired", accumulators.retired_consumption_summary.mean, accumulators.retired_consumption_summary.stderr, weights["ConsumptionAvgRetired"], weights["ConsumptionAvgRetired"] * accumulators.retired_consumption_summary.mean),
-    FitnessFunctionCompositionRow("ConsumptionAvgRetiredPreDisability", accumulators.pre_disability_retired_consumption_summary.mean, accumulators.pre_disability_retired_consumption_summary.stderr, weights["ConsumptionAvgRetiredPreDisability"], weights["ConsumptionAvgRetiredPreDisability"] * accumulators.pre_disability_retired_consumption_summary.mean),
-    FitnessFunctionCompositionRow("ConsumptionDiscountedLifetime", accumulators.discounted_lifetime_consumption_summary.mean, accumulators.discounted_lifetime_consumption_summary.stderr, weights["ConsumptionDiscountedLifetime"], weights["ConsumptionDiscountedLifetime"] * accumulators.discounted_lifetime_consumption_summary.mean),
-    FitnessFunctionCompositionRow("Consumption10PctLifetime", accumulators.lifetime_consumption_hist.Quantile(0.1), None, weights["Consumption10PctLifetime"], weights["Consumption10PctLifetime"] * accumulators.lifetime_consumption_hist.Quantile(0.1)),
-    FitnessFunctionCompositionRow("Consumption20PctLifetime", accumulators.lifetime_consumption_hist.Quantile(0.2), None, weights["Consumption20PctLifetime"], weights["Consumption20PctLifetime"] * accumulators.lifetime_consumption_hist.Quantile(0.2)),
-    FitnessFunctionCompositionRow("ConsumptionMedianLifetime", accumulators.lifetime_consumption_hist.Quantile(0.5), None, weights["ConsumptionMedianLifetime"], weights["ConsumptionMedianLifetime"] * accumulators.lifetime_consumption_hist.Quantile(0.5)),
-    FitnessFunctionCompositionRow("Consumption10PctRetired", accumulators.retired_consumption_hist.Quantile(0.1), None, weights["Consumption10PctRetired"], weights["Consumption10PctRetired"] * accumulators.retired_consumption_hist.Quantile(0.1)),
-    FitnessFunctionCompositionRow("Consumption20PctRetired", accumulators.retired_consumption_hist.Quantile(0.2), None, weights["Consumption20PctRetired"], weights["Consumption20PctRetired"] * accumulators.retired_consumption_hist.Quantile(0.2)),
-    FitnessFunctionCompositionRow("ConsumptionMedianRetired", accumulators.retired_consumption_hist.Quantile(0.5), None, weights["ConsumptionMedianRetired"], weights["ConsumptionMedianRetired"] * accumulators.retired_consumption_hist.Quantile(0.5)),
+  """Returns a FitnessFunctionCompositionRow per component. Means are adjusted by control variates if the lives were merged with them."""
+  lifetime_consumption_10pct, lifetime_consumption_20pct, lifetime_consumption_median = \
+      accumulators.lifetime_consumption_hist.Finalize().Quantiles([0.1, 0.2, 0.5])
+  retired_consumption_10pct, retired_consumption_20pct, retired_consumption_median = \
+      accumulators.retired_consumption_hist.Finalize().Quantiles([0.1, 0.2, 0.5])
+  rows = [
+    FitnessFunctionCompositionRow("ConsumptionAvgLifetime", accumulators.lifetime_consumption_summary.adjusted_mean, accumulators.lifetime_consumption_summary.adjusted_stderr, weights["ConsumptionAvgLifetime"], weights["ConsumptionAvgLifetime"] * accumulators.lifetime_consumption_summary.adjusted_mean),
+    FitnessFunctionCompositionRow("ConsumptionAvgWorking", accumulators.working_consumption_summary.adjusted_mean, accumulators.working_consumption_summary.adjusted_stderr, weights["ConsumptionAvgWorking"], weights["ConsumptionAvgWorking"] * accumulators.working_consumption_summary.adjusted_mean),
+    FitnessFunctionCompositionRow("ConsumptionAvgRetired", accumulators.retired_consumption_summary.adjusted_mean, accumulators.retired_consumption_summary.adjusted_stderr, weights["ConsumptionAvgRetired"], weights["ConsumptionAvgRetired"] * accumulators.retired_consumption_summary.adjusted_mean),
+    FitnessFunctionCompositionRow("ConsumptionAvgRetiredPreDisability", accumulators.pre_disability_retired_consumption_summary.adjusted_mean, accumulators.pre_disability_retired_consumption_summary.adjusted_stderr, weights["ConsumptionAvgRetiredPreDisability"], weights["ConsumptionAvgRetiredPreDisability"] * accumulators.pre_disability_retired_consumption_summary.adjusted_mean),
+    FitnessFunctionCompositionRow("ConsumptionDiscountedLifetime", accumulators.discounted_lifetime_consumption_summary.adjusted_mean, accumulators.discounted_lifetime_consumption_summary.adjusted_stderr, weights["ConsumptionDiscountedLifetime"], weights["ConsumptionDiscountedLifetime"] * accumulators.discounted_lifetime_consumption_summary.adjusted_mean),
+    FitnessFunctionCompositionRow("Consumption10PctLifetime", lifetime_consumption_10pct, None, weights["Consumption10PctLifetime"], weights["Consumption10PctLifetime"] * lifetime_consumption_10pct),
+    FitnessFunctionCompositionRow("Consumption20PctLifetime", lifetime_consumption_20pct, None, weights["Consumption20PctLifetime"], weights["Consumption20PctLifetime"] * lifetime_consumption_20pct),
+    FitnessFunctionCompositionRow("ConsumptionMedianLifetime", lifetime_consumption_median, None, weights["ConsumptionMedianLifetime"], weights["ConsumptionMedianLifetime"] * lifetime_consumption_median),
+    FitnessFunctionCompositionRow("Consumption10PctRetired", retired_consumption_10pct, None, weights["Consumption10PctRetired"], weights["Consumption10PctRetired"] * retired_consumption_10pct),
+    FitnessFunctionCompositionRow("Consumption20PctRetired", retired_consumption_20pct, None, weights["Consumption20PctRetired"], weights["Consumption20PctRetired"] * retired_consumption_20pct),
+    FitnessFunctionCompositionRow("ConsumptionMedianRetired", retired_consumption_median, None, weights["ConsumptionMedianRetired"], weights["ConsumptionMedianRetired"] * retired_consumption_median),
     FitnessFunctionCompositionRow("StdConsumptionLifetime", accumulators.lifetime_consumption_summary.stddev, None, weights["StdConsumptionLifetime"], weights["StdConsumptionLifetime"] * accumulators.lifetime_consumption_summary.stddev),
     FitnessFunctionCompositionRow("StdConsumptionWorking", accumulators.working_consumption_summary.stddev, None, weights["StdConsumptionWorking"], weights["StdConsumptionWorking"] * accumulators.working_consumption_summary.stddev),
     FitnessFunctionCompositionRow("StdConsumptionRetired", accumulators.retired_consumption_summary.stddev, None, weights["StdConsumptionRetired"], weights["StdConsumptionRetired"] * accumulators.retired_consumption_summary.stddev),
-    FitnessFunctionCompositionRow("EarningsAvgLateWorking", accumulators.earnings_late_working_summary.mean, accumulators.earnings_late_working_summary.stderr, weights["EarningsAvgLateWorking"], weights["EarningsAvgLateWorking"] * accumulators.earnings_late_working_summary.mean),
-    FitnessFunctionCompositionRow("FractionPersonsRuined", accumulators.fraction_persons_ruined.mean, accumulators.fraction_persons_ruined.stderr, weights["FractionPersonsRuined"], weights["FractionPersonsRuined"] * accumulators.fraction_persons_ruined.mean),
-    FitnessFunctionCompositionRow("FractionRetirementYearsRuined", accumulators.fraction_retirement_years_ruined.mean, accumulators.fraction_retirement_years_ruined.stderr, weights["FractionRetirementYearsRuined"], weights["FractionRetirementYearsRuined"] * accumulators.fraction_retirement_years_ruined.mean),
-    FitnessFunctionCompositionRow("FractionRetirementYearsBelowYMPE", accumulators.fraction_retirement_years_below_ympe.mean, accumulators.fraction_retirement_years_below_ympe.stderr, weights["FractionRetirementYearsBelowYMPE"], weights["FractionRetirementYearsBelowYMPE"] * accumulators.fraction_retirement_years_below_ympe.mean),
-    FitnessFunctionCompositionRow("FractionRetirementYearsBelowTwiceYMPE", accumulators.fraction_retirement_years_below_twice_ympe.mean, accumulators.fraction_retirement_years_below_twice_ympe.stderr, weights["FractionRetirementYearsBelowTwiceYMPE"], weights["FractionRetirementYearsBelowTwiceYMPE"] * accumulators.fraction_retirement_years_below_twice_ympe.mean),
-    FitnessFunctionCompositionRow("FractionRetireesReceivingGIS", accumulators.fraction_retirees_receiving_gis.mean, accumulators.fraction_retirees_receiving_gis.stderr, weights["FractionRetireesReceivingGIS"], weights["FractionRetireesReceivingGIS"] * accumulators.fraction_retirees_receiving_gis.mean),
-    FitnessFunctionCompositionRow("FractionRetirementYearsReceivingGIS", accumulators.fraction_retirement_years_receiving_gis.mean, accumulators.fraction_retirement_years_receiving_gis.stderr, weights["FractionRetirementYearsReceivingGIS"], weights["FractionRetirementYearsReceivingGIS"] * accumulators.fraction_retirement_years_receiving_gis.mean),
-    FitnessFunctionCompositionRow("AverageBenefitsGIS", accumulators.benefits_gis.mean, accumulators.benefits_gis.stderr, weights["AverageBenefitsGIS"], weights["AverageBenefitsGIS"] * accumulators.benefits_gis.mean),
-    FitnessFunctionCompositionRow("FractionRetireesEverBelowLICO", accumulators.fraction_retirees_ever_below_lico.mean, accumulators.fraction_retirees_ever_below_lico.stderr, weights["FractionRetireesEverBelowLICO"], weights["FractionRetireesEverBelowLICO"] * accumulators.fraction_retirees_ever_below_lico.mean),
-    FitnessFunctionCompositionRow("FractionRetirementYearsBelowLICO", accumulators.fraction_retirement_years_below_lico.mean, accumulators.fraction_retirement_years_below_lico.stderr, weights["FractionRetirementYearsBelowLICO"], weights["FractionRetirementYearsBelowLICO"] * accumulators.fraction_retirement_years_below_lico.mean),
-    FitnessFunctionCompositionRow("AverageLICOGapWorking", accumulators.lico_gap_working.mean, accumulators.lico_gap_working.stderr, weights["AverageLICOGapWorking"], weights["AverageLICOGapWorking"] * accumulators.lico_gap_working.mean),
-    FitnessFunctionCompositionRow("AverageLICOGapRetired", accumulators.lico_gap_retired.mean, accumulators.lico_gap_retired.stderr, weights["AverageLICOGapRetired"], weights["AverageLICOGapRetired"] * accumulators.lico_gap_retired.mean),
-    FitnessFunctionCompositionRow("FractionPersonsWithWithdrawalsBelowRetirementAssets", accumulators.fraction_persons_with_withdrawals_below_retirement_assets.mean, accumulators.fraction_persons_with_withdrawals_below_retirement_assets.stderr, weights["FractionPersonsWithWithdrawalsBelowRetirementAssets"], weights["FractionPersonsWithWithdrawalsBelowRetirementAssets"] * accumulators.fraction_persons_with_withdrawals_below_retirement_assets.mean),
-    FitnessFunctionCompositionRow("FractionRetireesWithWithdrawalsBelowRetirementAssets", accumulators.fraction_retirees_with_withdrawals_below_retirement_assets.mean, accumulators.fraction_retirees_with_withdrawals_below_retirement_assets.stderr, weights["FractionRetireesWithWithdrawalsBelowRetirementAssets"], weights["FractionRetireesWithWithdrawalsBelowRetirementAssets"] * accumulators.fraction_retirees_with_withdrawals_below_retirement_assets.mean),
-    FitnessFunctionCompositionRow("AverageLifetimeWithdrawalsLessSavings", accumulators.lifetime_withdrawals_less_savings.mean, accumulators.lifetime_withdrawals_less_savings.stderr, weights["AverageLifetimeWithdrawalsLessSavings"], weights["AverageLifetimeWithdrawalsLessSavings"] * accumulators.lifetime_withdrawals_less_savings.mean),
-    FitnessFunctionCompositionRow("ConsumptionAvgRetirementBelowFractionAvgWorking", accumulators.retirement_consumption_less_working_consumption.mean, accumulators.retirement_consumption_less_working_consumption.stderr, weights["ConsumptionAvgRetirementBelowFractionAvgWorking"], weights["ConsumptionAvgRetirementBelowFractionAvgWorking"] * accumulators.retirement_consumption_less_working_consumption.mean),
-    FitnessFunctionCompositionRow("AverageDistributableEstate", accumulators.distributable_estate.mean, accumulators.distributable_estate.stderr, weights["AverageDistributableEstate"], weights["AverageDistributableEstate"] * accumulators.distributable_estate.mean),
+    FitnessFunctionCompositionRow("EarningsAvgLateWorking", accumulators.earnings_late_working_summary.adjusted_mean, accumulators.earnings_late_working_summary.adjusted_stderr, weights["EarningsAvgLateWorking"], weights["EarningsAvgLateWorking"] * accumulators.earnings_late_working_summary.adjusted_mean),
+    FitnessFunctionCompositionRow("FractionPersonsRuined", accumulators.fraction_persons_ruined.adjusted_mean, accumulators.fraction_persons_ruined.adjusted_stderr, weights["FractionPersonsRuined"], weights["FractionPersonsRuined"] * accumulators.fraction_persons_ruined.adjusted_mean),
+    FitnessFunctionCompositionRow("FractionRetirementYearsRuined", accumulators.fraction_retirement_years_ruined.adjusted_mean, accumulators.fraction_retirement_years_ruined.adjusted_stderr, weights["FractionRetirementYearsRuined"], weights["FractionRetirementYearsRuined"] * accumulators.fraction_retirement_years_ruined.adjusted_mean),
+    FitnessFunctionCompositionRow("FractionRetirementYearsBelowYMPE", accumulators.fraction_retirement_years_below_ympe.adjusted_mean, accumulators.fraction_retirement_years_below_ympe.adjusted_stderr, weights["FractionRetirementYearsBelowYMPE"], weights["FractionRetirementYearsBelowYMPE"] * accumulators.fraction_retirement_years_below_ympe.adjusted_mean),
+    FitnessFunctionCompositionRow("FractionRetirementYearsBelowTwiceYMPE", accumulators.fraction_retirement_years_below_twice_ympe.adjusted_mean, accumulators.fraction_retirement_years_below_twice_ympe.adjusted_stderr, weights["FractionRetirementYearsBelowTwiceYMPE"], weights["FractionRetirementYearsBelowTwiceYMPE"] * accumulators.fraction_retirement_years_below_twice_ympe.adjusted_mean),
+    FitnessFunctionCompositionRow("FractionRetireesReceivingGIS", accumulators.fraction_retirees_receiving_gis.adjusted_mean, accumulators.fraction_retirees_receiving_gis.adjusted_stderr, weights["FractionRetireesReceivingGIS"], weights["FractionRetireesReceivingGIS"] * accumulators.fraction_retirees_receiving_gis.adjusted_mean),
+    FitnessFunctionCompositionRow("FractionRetirementYearsReceivingGIS", accumulators.fraction_retirement_years_receiving_gis.adjusted_mean, accumulators.fraction_retirement_years_receiving_gis.adjusted_stderr, weights["FractionRetirementYearsReceivingGIS"], weights["FractionRetirementYearsReceivingGIS"] * accumulators.fraction_retirement_years_receiving_gis.adjusted_mean),
+    FitnessFunctionCompositionRow("AverageBenefitsGIS", accumulators.benefits_gis.adjusted_mean, accumulators.benefits_gis.adjusted_stderr, weights["AverageBenefitsGIS"], weights["AverageBenefitsGIS"] * accumulators.benefits_gis.adjusted_mean),
+    FitnessFunctionCompositionRow("FractionRetireesEverBelowLICO", accumulators.fraction_retirees_ever_below_lico.adjusted_mean, accumulators.fraction_retirees_ever_below_lico.adjusted_stderr, weights["FractionRetireesEverBelowLICO"], weights["FractionRetireesEverBelowLICO"] * accumulators.fraction_retirees_ever_below_lico.adjusted_mean),
+    FitnessFunctionCompositionRow("FractionRetirementYearsBelowLICO", accumulators.fraction_retirement_years_below_lico.adjusted_mean, accumulators.fraction_retirement_years_below_lico.adjusted_stderr, weights["FractionRetirementYearsBelowLICO"], weights["FractionRetirementYearsBelowLICO"] * accumulators.fraction_retirement_years_below_lico.adjusted_mean),
+    FitnessFunctionCompositionRow("AverageLICOGapWorking", accumulators.lico_gap_working.adjusted_mean, accumulators.lico_gap_working.adjusted_stderr, weights["AverageLICOGapWorking"], weights["AverageLICOGapWorking"] * accumulators.lico_gap_working.adjusted_mean),
+    FitnessFunctionCompositionRow("AverageLICOGapRetired", accumulators.lico_gap_retired.adjusted_mean, accumulators.lico_gap_retired.adjusted_stderr, weights["AverageLICOGapRetired"], weights["AverageLICOGapRetired"] * accumulators.lico_gap_retired.adjusted_mean),
+    FitnessFunctionCompositionRow("FractionPersonsWithWithdrawalsBelowRetirementAssets", accumulators.fraction_persons_with_withdrawals_below_retirement_assets.adjusted_mean, accumulators.fraction_persons_with_withdrawals_below_retirement_assets.adjusted_stderr, weights["FractionPersonsWithWithdrawalsBelowRetirementAssets"], weights["FractionPersonsWithWithdrawalsBelowRetirementAssets"] * accumulators.fraction_persons_with_withdrawals_below_retirement_assets.adjusted_mean),
+    FitnessFunctionCompositionRow("FractionRetireesWithWithdrawalsBelowRetirementAssets", accumulators.fraction_retirees_with_withdrawals_below_retirement_assets.adjusted_mean, accumulators.fraction_retirees_with_withdrawals_below_retirement_assets.adjusted_stderr, weights["FractionRetireesWithWithdrawalsBelowRetirementAssets"], weights["FractionRetireesWithWithdrawalsBelowRetirementAssets"] * accumulators.fraction_retirees_with_withdrawals_below_retirement_assets.adjusted_mean),
+    FitnessFunctionCompositionRow("AverageLifetimeWithdrawalsLessSavings", accumulators.lifetime_withdrawals_less_savings.adjusted_mean, accumulators.lifetime_withdrawals_less_savings.adjusted_stderr, weights["AverageLifetimeWithdrawalsLessSavings"], weights["AverageLifetimeWithdrawalsLessSavings"] * accumulators.lifetime_withdrawals_less_savings.adjusted_mean),
+    FitnessFunctionCompositionRow("ConsumptionAvgRetirementBelowFractionAvgWorking", accumulators.retirement_consumption_less_working_consumption.adjusted_mean, accumulators.retirement_consumption_less_working_consumption.adjusted_stderr, weights["ConsumptionAvgRetirementBelowFractionAvgWorking"], weights["ConsumptionAvgRetirementBelowFractionAvgWorking"] * accumulators.retirement_consumption_less_working_consumption.adjusted_mean),
+    FitnessFunctionCompositionRow("AverageDistributableEstate", accumulators.distributable_estate.adjusted_mean, accumulators.distributable_estate.adjusted_stderr, weights["AverageDistributableEstate"], weights["AverageDistributableEstate"] * accumulators.distributable_estate.adjusted_mean),
   ]
+  # Components left out of the accumulator plan are NaN, but with zero weight they contribute nothing
+  return [row if row.weight else row._replace(contribution=0) for row in rows]
 
 def WriteFitnessFunctionCompositionTable(rows, out):
   writer = csv.writer(out, lineterminator='\n')
@@ -235,6 +748,87 @@ def WriteFitnessFunctionCompositionTable(rows, out):
   for row in rows:
     writer.writerow(row)
 
+def WriteStrategyEvaluations(results, strategies, weights, out):
+  """Writes one row per (index, accumulators) result as soon as it arrives"""
+  writer = csv.writer(out, lineterminator='\n')
+  wrote_header = False
+  for index, accumulators in results:
+    rows = GetFitnessFunctionCompositionTableRows(accumulators, weights)
+    if not wrote_header:
+      writer.writerow(["index"] + list(person.Strategy._fields) +
+                      [column for row in rows for column in (row.component, row.component + " stderr")] + ["fitness"])
+      wrote_header = True
+    writer.writerow([index] + list(strategies[index]) +
+                    [value for row in rows for value in (row.value, row.stderr)] +
+                    [sum(row.contribution for row in rows)])
+    out.flush()
+
+def WriteSweepTable(results, strategies, fields, weights, out):
+  """Writes a long format table with one row per grid point and fitness component.
+
+  The total fitness of each grid point is written as the "Fitness" component.
+  """
+  writer = csv.writer(out, lineterminator='\n')
+  writer.writerow(fields + ["component", "value", "stderr", "weight", "contribution"])
+  for index, accumulators in results:
+    point = [getattr(strategies[index], field) for field in fields]
+    rows = GetFitnessFunctionCompositionTableRows(accumulators, weights)
+    for row in rows:
+      writer.writerow(point + list(row))
+    writer.writerow(point + ["Fitness", sum(row.contribution for row in rows), None, None, None])
+    out.flush()
+
+def WriteSensitivityTable(rows, out):
+  writer = csv.writer(out, lineterminator='\n')
+  writer.writerow(SensitivityRow._fields)
+  for row in rows:
+    writer.writerow(row)
+
+# Groups of periods that the report tables show statistics for
+PERIOD_GROUPS = {
+    "lifetime": [person.EMPLOYED, person.UNEMPLOYED, person.RETIRED, person.INVOLUNTARILY_RETIRED],
+    "working": [person.EMPLOYED, person.UNEMPLOYED],
+    "retired": [person.RETIRED, person.INVOLUNTARILY_RETIRED],
+}
+
+class EvaluationRecorder(object):
+  """Records the fitness components of evaluated strategies to a components file and/or a results store"""
+
+  def __init__(self, gender, components_writer=None, results_store=None):
+    self.gender = gender
+    self.components_writer = components_writer
+    self.results_store = results_store
+
+  def Record(self, strategy, n, real_values, rows, seed=None, wall_seconds=None, sampling=DEFAULT_SAMPLING):
+    if self.components_writer:
+      self.components_writer.Write(strategy, n, rows, self.gender, real_values, SamplingHash(sampling))
+    if self.results_store:
+      self.results_store.Record(strategy, self.gender, n, real_values, rows, seed, wall_seconds, SamplingHash(sampling))
+
+  def Close(self):
+    if self.components_writer:
+      self.components_writer.Close()
+    if self.results_store:
+      self.results_store.Close()
+
+def RecordComponents(results, strategies, n, real_values, weights, recorder, seed=None, sampling=DEFAULT_SAMPLING):
+  """Passes (index, accumulators) results through, recording the components of each strategy as it arrives"""
+  for index, accumulators in results:
+    recorder.Record(strategies[index], n, real_values, GetFitnessFunctionCompositionTableRows(accumulators, weights), seed, sampling=sampling)
+    yield index, accumulators
+
+def GetStoredCompositionTableRows(components, weights):
+  """Returns FitnessFunctionCompositionRows for stored (value, stderr) components under the given weights"""
+  return [FitnessFunctionCompositionRow(component, value, stderr, weights[component], weights[component] * value if weights[component] else 0)
+          for component, (value, stderr) in components.items()]
+
+def WriteRescoreTable(rescored, out):
+  """Writes one row per components.RescoredStrategy, in the given order"""
+  writer = csv.writer(out, lineterminator='\n')
+  writer.writerow(["rank", "fitness", "n"] + list(person.Strategy._fields))
+  for rank, (fitness, record) in enumerate(rescored, 1):
+    writer.writerow([rank, fitness, record.n] + list(record.strategy))
+
 def WriteSummaryTable(gender, group_size, accumulators, weights, population_size, max_generations, accumulate_nominal, out):
   writer = csv.writer(out, lineterminator='\n')
   writer.writerow(("measure", "value"))
@@ -264,18 +858,20 @@ def WriteSummaryTable(gender, group_size, accumulators, weights, population_size
   writer.writerow(("Average Positive CPP Benefits Level", accumulators.positive_cpp_benefits.mean))
   writer.writerow(("Average Years Gross Income Below LICO", accumulators.years_income_below_lico.mean))
   writer.writerow(("Average Years with No Financial Assets at BoY", accumulators.years_with_no_assets.mean))
-  writer.writerow(("Replacement Rate (Consumption Basis)", accumulators.period_consumption.Query([person.RETIRED, person.INVOLUNTARILY_RETIRED]).mean / accumulators.period_consumption.Query([person.EMPLOYED, person.UNEMPLOYED]).mean))
-  writer.writerow(("Distributable Estate", accumulators.period_distributable_estate.Query([person.EMPLOYED, person.UNEMPLOYED, person.RETIRED, person.INVOLUNTARILY_RETIRED]).mean))
+  period_consumption = accumulators.period_consumption.Finalize(PERIOD_GROUPS)
+  writer.writerow(("Replacement Rate (Consumption Basis)", period_consumption.Group("retired").mean / period_consumption.Group("working").mean))
+  writer.writerow(("Distributable Estate", accumulators.period_distributable_estate.Finalize(PERIOD_GROUPS).Group("lifetime").mean))
   writer.writerow(("Average Years With Negative Consumption", accumulators.years_with_negative_consumption.mean))
 
 def WritePeriodSpecificTable(accumulators, out):
   def GetRow(name, accumulator):
+    snapshot = accumulator.Finalize(PERIOD_GROUPS)
     return [name,
-            accumulator.Query([person.EMPLOYED, person.UNEMPLOYED, person.RETIRED, person.INVOLUNTARILY_RETIRED]).mean,
-            accumulator.Query([person.EMPLOYED]).mean,
-            accumulator.Query([person.UNEMPLOYED]).mean,
-            accumulator.Query([person.RETIRED]).mean,
-            accumulator.Query([person.INVOLUNTARILY_RETIRED]).mean]
+            snapshot.Group("lifetime").mean,
+            snapshot[person.EMPLOYED].mean,
+            snapshot[person.UNEMPLOYED].mean,
+            snapshot[person.RETIRED].mean,
+            snapshot[person.INVOLUNTARILY_RETIRED].mean]
 
   writer = csv.writer(out, lineterminator='\n')
   writer.writerow(("measure", "lifetime", "employed", "unemployed", "planned retirement", "unplanned retirement"))
@@ -307,27 +903,52 @@ def WritePeriodSpecificTable(accumulators, out):
   writer.writerow(GetRow("Distributable Estate", accumulators.period_distributable_estate))
 
 def WriteAgeSpecificTable(accumulators, group_size, out):
+  # Finalize each accumulator once for all ages
+  persons_alive, gross_earnings, income_tax, ei_premium, cpp_contributions, sales_tax, ei_benefits, cpp_benefits, \
+      oas_benefits, gis_benefits, savings, rrsp_withdrawals, rrsp_assets, bridging_assets, tfsa_withdrawals, \
+      tfsa_assets, nonreg_withdrawals, nonreg_assets, consumption = [
+          accumulator.Finalize() for accumulator in (
+              accumulators.persons_alive_by_age,
+              accumulators.gross_earnings_by_age,
+              accumulators.income_tax_by_age,
+              accumulators.ei_premium_by_age,
+              accumulators.cpp_contributions_by_age,
+              accumulators.sales_tax_by_age,
+              accumulators.ei_benefits_by_age,
+              accumulators.cpp_benefits_by_age,
+              accumulators.oas_benefits_by_age,
+              accumulators.gis_benefits_by_age,
+              accumulators.savings_by_age,
+              accumulators.rrsp_withdrawals_by_age,
+              accumulators.rrsp_assets_by_age,
+              accumulators.bridging_assets_by_age,
+              accumulators.tfsa_withdrawals_by_age,
+              accumulators.tfsa_assets_by_age,
+              accumulators.nonreg_withdrawals_by_age,
+              accumulators.nonreg_assets_by_age,
+              accumulators.consumption_by_age)]
+
   def GetRow(age):
     return [age,
-            accumulators.persons_alive_by_age.Query([age]).n,
-            accumulators.gross_earnings_by_age.Query([age]).mean,
-            accumulators.income_tax_by_age.Query([age]).mean,
-            accumulators.ei_premium_by_age.Query([age]).mean,
-            accumulators.cpp_contributions_by_age.Query([age]).mean,
-            accumulators.sales_tax_by_age.Query([age]).mean,
-            accumulators.ei_benefits_by_age.Query([age]).mean,
-            accumulators.cpp_benefits_by_age.Query([age]).mean,
-            accumulators.oas_benefits_by_age.Query([age]).mean,
-            accumulators.gis_benefits_by_age.Query([age]).mean,
-            accumulators.savings_by_age.Query([age]).mean,
-            accumulators.rrsp_withdrawals_by_age.Query([age]).mean,
-            accumulators.rrsp_assets_by_age.Query([age]).mean,
-            accumulators.bridging_assets_by_age.Query([age]).mean,
-            accumulators.tfsa_withdrawals_by_age.Query([age]).mean,
-            accumulators.tfsa_assets_by_age.Query([age]).mean,
-            accumulators.nonreg_withdrawals_by_age.Query([age]).mean,
-            accumulators.nonreg_assets_by_age.Query([age]).mean,
-            accumulators.consumption_by_age.Query([age]).mean,
+            persons_alive[age].n,
+            gross_earnings[age].mean,
+            income_tax[age].mean,
+            ei_premium[age].mean,
+            cpp_contributions[age].mean,
+            sales_tax[age].mean,
+            ei_benefits[age].mean,
+            cpp_benefits[age].mean,
+            oas_benefits[age].mean,
+            gis_benefits[age].mean,
+            savings[age].mean,
+            rrsp_withdrawals[age].mean,
+            rrsp_assets[age].mean,
+            bridging_assets[age].mean,
+            tfsa_withdrawals[age].mean,
+            tfsa_assets[age].mean,
+            nonreg_withdrawals[age].mean,
+            nonreg_assets[age].mean,
+            consumption[age].mean,
             ]
 
   writer = csv.writer(out, lineterminator='\n')
@@ -363,6 +984,45 @@ if __name__ == '__main__':
   parser.add_argument('--disable_multiprocessing', help='Only run on a single process', action='store_true', default=False)
   parser.add_argument('--basic_run', help='Only output the fitness function component and strategy tables', action='store_true', default=False)
   parser.add_argument('--accumulate_nominal_values', help='Store nominal dollar amounts in accumulators. Ignored for optimization runs.', action='store_true', default=False)
+  parser.add_argument('--strategies_file', help='Evaluate every strategy in this CSV or JSON-lines (.jsonl) file and output one row of fitness components per strategy. '
+                      'Strategy parameters missing from the file are taken from the flags below.', default=None)
+  parser.add_argument('--sweep', help='Evaluate a grid of strategies, varying a strategy parameter given as field:start:stop:points. '
+                      'Give this flag twice for a two dimensional grid. Other parameters are taken from the flags below.',
+                      type=ParseSweepAxis, action='append', default=[])
+  parser.add_argument('--components_file', help='Append the fitness components of every evaluated strategy to this JSON-lines file, for --rescore', default=None)
+  parser.add_argument('--results_db', help='Record every evaluation in this SQLite database. --basic_run runs without --optimize reuse a stored evaluation of the same strategy, '
+                      'sampling options and --seed, if given, with at least as many lives.', default=None)
+  parser.add_argument('--rescore', help='Rank the strategies in a --components_file file by their fitness under the given weights, without simulating. '
+                      'Only strategies evaluated with the same --gender, --accumulate_nominal_values and sampling options are ranked.', default=None)
+  parser.add_argument('--seed', help='Root random seed. Each simulated life draws from its own stream derived from this seed, so results are identical however many processes are used. '
+                      'Every grid point of a sweep or sensitivity analysis shares the seed. Chosen at random if not given.', type=int, default=None)
+  parser.add_argument('--antithetic', help='Simulate lives in antithetic pairs, the second with mirrored investment return and inflation shocks', action='store_true', default=False)
+  parser.add_argument('--qmc_replicates', help='Draw investment return, inflation and earnings shocks from this many randomly shifted replicates of a Sobol sequence, '
+                      'with standard errors from the spread between replicates. 0 uses pseudo-random draws.', type=int, default=0)
+  parser.add_argument('--mortality_strata', help='Sample ages at death in rounds of lives, one life from each of this many equal-probability strata of the lifetime distribution. '
+                      'Must divide --number. 0 samples ages at death independently.', type=int, default=0)
+  parser.add_argument('--control_variates', help='Adjust the fitness components by regressing them on each life\'s average real investment return, average inflation '
+                      'and years lived, whose expectations are known', action='store_true', default=False)
+  parser.add_argument('--survival_weighting', help='Instead of drawing ages at death, simulate every life to the end of the mortality table, weighting each year by the probability '
+                      'of living it and settling the estate at every age, weighted by the probability of dying then. Can be combined with --antithetic or --qmc_replicates.',
+                      action='store_true', default=False)
+  parser.add_argument('--life_timelines', help='Draw each life\'s age at death, employment and market and earnings shocks all at once when it is born, '
+                      'instead of year by year', action='store_true', default=False)
+  parser.add_argument('--scenario_model', help='Generate each block of lives\' inflation and investment return paths from this economic scenario model: '
+                      'independent normals as usual, AR(1) inflation, switching between calm and bear market regimes, or a block bootstrap of --scenario_history',
+                      choices=["normal", "ar1_inflation", "regime_switching", "block_bootstrap"], default=None)
+  parser.add_argument('--scenario_history', help='CSV file of historical annual inflation and investment returns, as fractions in "inflation" and "return" columns, '
+                      'for --scenario_model block_bootstrap', default=None)
+  parser.add_argument('--cohort_size', help='Lives are born in cohorts of this many, which all live through the same market path. Implies --scenario_model normal '
+                      'if none is given. 0 gives every life its own path.', type=int, default=0)
+  parser.add_argument('--retirement_snapshots', help='Keep each life\'s state at retirement and resume it, instead of simulating the working years again, '
+                      'for strategies that only differ after retirement. Optimization then uses the same random draws for every evaluation in a generation, '
+                      'and each block of lives always goes to the same worker process, which keeps its snapshots.',
+                      action='store_true', default=False)
+  parser.add_argument('--sensitivity_samples', help='Run a sensitivity analysis of the fitness to the strategy parameters over their bounds, with this many base samples. '
+                      'Each sample costs 16 populations of --number lives.', type=int, default=0)
+  parser.add_argument('--sensitivity_chunks', help='Chunks each sensitivity analysis population is split into; the confidence intervals resample them', type=int, default=10)
+  parser.add_argument('--bootstrap_resamples', help='Bootstrap resamples for the sensitivity analysis confidence intervals', type=int, default=200)
 
   # Strategy parameters (validation runs only)
   parser.add_argument("--planned_retirement_age", help="strategy parameter", type=int, default=65)
@@ -444,9 +1104,15 @@ if __name__ == '__main__':
   parser.add_argument("--average_distributable_estate", help="fitness component weight", type=float, default=0)
 
   # Genetic algorithm parameters
+  parser.add_argument('--trace_dir', help='Write sampled traces of the lives simulated for the output tables to compressed .npz files in this directory', default=None)
+  parser.add_argument('--trace_sample', help='Trace one in this many lives', type=int, default=1)
+  parser.add_argument('--trace_years', help='Also trace every year of each traced life, not just a summary of it', action='store_true', default=False)
+
   parser.add_argument("--optimize", help="Run the optimizer", action='store_true', default=False)
   parser.add_argument("--max_generations", help="Maximum genetic algorithm generations", type=int, default=10)
   parser.add_argument("--population_size", help="Individuals in the genetic algorithm's population", type=int, default=150)
+  parser.add_argument("--fitness_cache", help="Reuse the fitness of strategies already evaluated during the optimization instead of simulating them again", action='store_true', default=False)
+  parser.add_argument("--telemetry_file", help="Append JSON-lines run statistics to this file, one record per fitness evaluation and per generation", default=None)
 
   args = parser.parse_args()
 
@@ -531,11 +1197,120 @@ if __name__ == '__main__':
     "AverageDistributableEstate": args.average_distributable_estate,
   }
 
+  if len(args.sweep) > 2:
+    parser.error("--sweep can be given at most twice")
+
+  if sum(1 for option in (args.antithetic, args.qmc_replicates, args.mortality_strata) if option) > 1:
+    parser.error("only one of --antithetic, --qmc_replicates and --mortality_strata can be given")
+  if args.mortality_strata and args.number % args.mortality_strata:
+    parser.error("--mortality_strata must divide --number")
+  if args.qmc_replicates == 1:
+    parser.error("--qmc_replicates needs at least 2 replicates to estimate standard errors")
+  if args.survival_weighting and args.mortality_strata:
+    parser.error("--survival_weighting draws no ages at death, so it can't be combined with --mortality_strata")
+  if args.survival_weighting and args.trace_dir:
+    parser.error("--survival_weighting lives have no single age at death to trace")
+  if args.cohort_size and not args.scenario_model:
+    args.scenario_model = "normal"
+  if args.scenario_model and (args.antithetic or args.qmc_replicates or args.survival_weighting or args.control_variates):
+    parser.error("--scenario_model and --cohort_size can only be combined with --mortality_strata of the sampling options")
+  if args.cohort_size and args.mortality_strata and args.cohort_size % args.mortality_strata:
+    parser.error("--cohort_size must be a multiple of --mortality_strata")
+  if (args.scenario_model == "block_bootstrap") != bool(args.scenario_history):
+    parser.error("--scenario_history is needed for, and only used by, --scenario_model block_bootstrap")
+  scenario_model = None
+  if args.scenario_model:
+    import scenarios
+    if args.scenario_model == "block_bootstrap":
+      try:
+        scenario_model = scenarios.BlockBootstrap(scenarios.ReadHistory(args.scenario_history))
+      except (OSError, ValueError) as e:
+        parser.error("--scenario_history could not be read: %s" % e)
+    else:
+      scenario_model = {"normal": scenarios.IIDNormal, "ar1_inflation": scenarios.AR1Inflation, "regime_switching": scenarios.RegimeSwitching}[args.scenario_model]()
+  sampling = SamplingOptions(antithetic=args.antithetic, qmc_replicates=args.qmc_replicates, mortality_strata=args.mortality_strata,
+                             survival_weighting=args.survival_weighting, control_variates=args.control_variates,
+                             retirement_snapshots=args.retirement_snapshots,
+                             life_timelines=args.life_timelines, scenario_model=scenario_model, cohort_size=args.cohort_size)
+
+  if args.rescore:
+    import components
+    records = components.Matching(components.ReadRecords(args.rescore), args.gender, not args.accumulate_nominal_values, SamplingHash(sampling))
+    WriteRescoreTable(components.Rescore(records, weights), sys.stdout)
+    sys.exit(0)
+
+  components_writer = None
+  if args.components_file:
+    import components
+    components_writer = components.ComponentsWriter(args.components_file)
+  results_store = None
+  if args.results_db:
+    import results_store as results_store_lib
+    results_store = results_store_lib.ResultsStore(args.results_db)
+  recorder = EvaluationRecorder(args.gender, components_writer, results_store) if components_writer or results_store else None
+
+  # Seeding the random module makes the optimizer, and the seeds it draws for each evaluation, reproducible too
+  if args.seed is not None:
+    random.seed(args.seed)
+
+  if args.sweep:
+    seed = args.seed if args.seed is not None else random.randrange(2**32)
+    strategies = SweepStrategies(strategy, args.sweep, bounds)
+    results = EvaluateStrategies(strategies, args.gender, args.number, not args.accumulate_nominal_values, not args.disable_multiprocessing, seed=seed, sampling=sampling)
+    if recorder:
+      results = RecordComponents(results, strategies, args.number, not args.accumulate_nominal_values, weights, recorder, seed, sampling)
+    WriteSweepTable(results, strategies, [field for field, _ in args.sweep], weights, sys.stdout)
+    if recorder:
+      recorder.Close()
+    sys.exit(0)
+
+  if args.sensitivity_samples:
+    seed = args.seed if args.seed is not None else random.randrange(2**32)
+    rows = StrategySensitivity(args.sensitivity_samples, args.gender, args.number, weights, not args.accumulate_nominal_values, not args.disable_multiprocessing,
+                               bounds, args.sensitivity_chunks, args.bootstrap_resamples, seed, sampling)
+    WriteSensitivityTable(rows, sys.stdout)
+    if recorder:
+      recorder.Close()
+    sys.exit(0)
+
+  if args.strategies_file:
+    strategies = ReadStrategies(args.strategies_file, strategy, bounds)
+    results = EvaluateStrategies(strategies, args.gender, args.number, not args.accumulate_nominal_values, not args.disable_multiprocessing, sampling=sampling)
+    if recorder:
+      results = RecordComponents(results, strategies, args.number, not args.accumulate_nominal_values, weights, recorder, sampling=sampling)
+    WriteStrategyEvaluations(results, strategies, weights, sys.stdout)
+    if recorder:
+      recorder.Close()
+    sys.exit(0)
+
   if args.optimize:
-    strategy = Optimize(args.gender, args.number, weights, args.population_size, args.max_generations, not args.disable_multiprocessing, bounds)
+    import telemetry as telemetry_lib
+    telemetry = telemetry_lib.TelemetryWriter(args.telemetry_file) if args.telemetry_file else None
+    strategy = Optimize(args.gender, args.number, weights, args.population_size, args.max_generations, not args.disable_multiprocessing, bounds, telemetry, args.fitness_cache, recorder, sampling)
+    if telemetry:
+      telemetry.Close()
+
+  # A basic validation run only reports the fitness components, so a stored evaluation with enough lives will do
+  # The run after an optimization validates its winner on fresh lives, so it is never looked up
+  if args.basic_run and results_store and not args.trace_dir and not args.optimize:
+    stored = results_store.Lookup(strategy, args.gender, not args.accumulate_nominal_values, args.number, SamplingHash(sampling), args.seed)
+    if stored:
+      WriteStrategyTable(strategy, sys.stdout)
+      sys.stdout.write('\n')
+      WriteFitnessFunctionCompositionTable(GetStoredCompositionTableRows(stored.components, weights), sys.stdout)
+      if recorder:
+        recorder.Close()
+      sys.exit(0)
 
   # Run lives
-  accumulators = RunPopulation(strategy, args.gender, args.number, args.basic_run, not args.accumulate_nominal_values, not args.disable_multiprocessing)
+  trace_options = None
+  if args.trace_dir:
+    import tracing
+    trace_options = tracing.TraceOptions(args.trace_dir, args.trace_sample, args.trace_years)
+  seed = args.seed if args.seed is not None else random.randrange(2**32)
+  start = time.perf_counter()
+  accumulators = RunPopulation(strategy, args.gender, args.number, args.basic_run, not args.accumulate_nominal_values, not args.disable_multiprocessing, trace_options, seed, sampling)
+  wall_seconds = time.perf_counter() - start
 
   # Output reports
   if not args.basic_run:
@@ -544,9 +1319,13 @@ if __name__ == '__main__':
   WriteStrategyTable(strategy, sys.stdout)
   sys.stdout.write('\n')
   fitness_fcn_comp_rows = GetFitnessFunctionCompositionTableRows(accumulators, weights)
+  if recorder:
+    recorder.Record(strategy, args.number, not args.accumulate_nominal_values, fitness_fcn_comp_rows, seed, wall_seconds, sampling)
   WriteFitnessFunctionCompositionTable(fitness_fcn_comp_rows, sys.stdout)
   if not args.basic_run:
     sys.stdout.write('\n')
     WritePeriodSpecificTable(accumulators, sys.stdout)
     sys.stdout.write('\n')
     WriteAgeSpecificTable(accumulators, args.number, sys.stdout)
+  if recorder:
+    recorder.Close()
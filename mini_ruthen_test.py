@@ -0,0 +1,68 @@
+import unittest
+import mini_ruthen
+import person
+
+class MiniRuthenTest(unittest.TestCase):
+
+  def setUp(self):
+    self.default_strategy = person.Strategy(
+        planned_retirement_age=65,
+        savings_threshold=0,
+        savings_rate=0.1,
+        savings_rrsp_fraction=0.1,
+        savings_tfsa_fraction=0.2,
+        lico_target_fraction=1.0,
+        working_period_drawdown_tfsa_fraction=0.5,
+        working_period_drawdown_nonreg_fraction=0.5,
+        oas_bridging_fraction=1.0,
+        drawdown_ced_fraction=0.8,
+        initial_cd_fraction=0.04,
+        drawdown_preferred_rrsp_fraction=0.35,
+        drawdown_preferred_tfsa_fraction=0.5,
+        reinvestment_preference_tfsa_fraction=0.8)
+    self.weights = {component: 1 for component in mini_ruthen.COMPONENT_ACCUMULATORS}
+
+  def Rows(self, use_multiprocessing, sampling=mini_ruthen.DEFAULT_SAMPLING):
+    # Two blocks of lives, the last one short, over two workers
+    accumulators, _ = mini_ruthen.TimedRunPopulation(self.default_strategy, person.FEMALE, mini_ruthen.LIVES_PER_BLOCK + 20, True, True,
+                                                     use_multiprocessing, processes=2, seed=1, sampling=sampling)
+    # repr compares NaN components too, and every float to the last bit
+    return [repr(row) for row in mini_ruthen.GetFitnessFunctionCompositionTableRows(accumulators, self.weights)]
+
+  def testSeededRunIndependentOfMultiprocessing(self):
+    self.assertEqual(self.Rows(False), self.Rows(True))
+
+  def testSeededSampledRunIndependentOfMultiprocessing(self):
+    sampling = mini_ruthen.SamplingOptions(antithetic=True, control_variates=True)
+    self.assertEqual(self.Rows(False, sampling), self.Rows(True, sampling))
+
+  def testSnapshotsResumedOnBlockWorkers(self):
+    sampling = mini_ruthen.SamplingOptions(retirement_snapshots=True)
+    later_strategy = self.default_strategy._replace(drawdown_ced_fraction=0.6)
+    expected = mini_ruthen.RunPopulation(later_strategy, person.FEMALE, mini_ruthen.LIVES_PER_BLOCK + 20, True, True, False, seed=1, sampling=sampling)
+    with mini_ruthen.BlockWorkers(2) as workers:
+      for strategy in (self.default_strategy, later_strategy):
+        accumulators, timing = mini_ruthen.TimedRunPopulation(strategy, person.FEMALE, mini_ruthen.LIVES_PER_BLOCK + 20, True, True, True,
+                                                              seed=1, sampling=sampling, workers=workers)
+    self.assertEqual(timing.workers, 2)
+    self.assertEqual([repr(row) for row in mini_ruthen.GetFitnessFunctionCompositionTableRows(accumulators, self.weights)],
+                     [repr(row) for row in mini_ruthen.GetFitnessFunctionCompositionTableRows(expected, self.weights)])
+
+  def testSnapshottedStrategiesIndependentOfMultiprocessing(self):
+    sampling = mini_ruthen.SamplingOptions(retirement_snapshots=True)
+    strategies = [self.default_strategy, self.default_strategy._replace(drawdown_ced_fraction=0.6)]
+    results = [sorted((index, [repr(row) for row in mini_ruthen.GetFitnessFunctionCompositionTableRows(accumulators, self.weights)])
+                      for index, accumulators in mini_ruthen.EvaluateStrategies(strategies, person.FEMALE, mini_ruthen.LIVES_PER_BLOCK + 20, True,
+                                                                                use_multiprocessing, processes=2, seed=1, sampling=sampling))
+               for use_multiprocessing in (False, True)]
+    self.assertEqual(results[0], results[1])
+
+  def testSeedChangesRows(self):
+    rows = self.Rows(False)
+    accumulators, _ = mini_ruthen.TimedRunPopulation(self.default_strategy, person.FEMALE, mini_ruthen.LIVES_PER_BLOCK + 20, True, True,
+                                                     False, seed=2)
+    self.assertNotEqual(rows, [repr(row) for row in mini_ruthen.GetFitnessFunctionCompositionTableRows(accumulators, self.weights)])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -1,4 +1,7 @@
+import bisect
 import collections
+import itertools
+import pickle
 import random
 import incomes
 import funds
@@ -24,14 +27,109 @@ Strategy = collections.namedtuple("Strategy",
                                    "drawdown_preferred_tfsa_fraction",
                                    "reinvestment_preference_tfsa_fraction",])
 
+# The strategy fields used before retirement. The others are only used from OnRetirement on.
+WORKING_PHASE_FIELDS = ("planned_retirement_age",
+                        "savings_threshold",
+                        "savings_rate",
+                        "savings_rrsp_fraction",
+                        "savings_tfsa_fraction",
+                        "lico_target_fraction",
+                        "working_period_drawdown_tfsa_fraction",
+                        "working_period_drawdown_nonreg_fraction")
+
 EMPLOYED = 0
 UNEMPLOYED = 1
 RETIRED = 2
 INVOLUNTARILY_RETIRED = 3
 
+# Bump whenever a change to the simulation changes its results, so stored results from older code are not reused.
+# 2: each life draws from its own random stream, and control variate adjustments count lives without values.
+ENGINE_VERSION = 2
+
+_expected_years_lived = {}
+_death_cdfs = {}
+
+def ExpectedYearsLived(gender):
+  """Returns the expected number of years lived from world.START_AGE, according to the mortality tables"""
+  if gender not in _expected_years_lived:
+    mortality = world.MALE_MORTALITY if gender == MALE else world.FEMALE_MORTALITY
+    survival = 1
+    expected_age_at_death = 0
+    for age in range(world.START_AGE, max(mortality) + 1):
+      p_mortality = min(mortality[age] * world.MORTALITY_MULTIPLIER, 1)
+      expected_age_at_death += survival * p_mortality * age
+      survival *= 1 - p_mortality
+    _expected_years_lived[gender] = expected_age_at_death - world.START_AGE
+  return _expected_years_lived[gender]
+
+def DeathCDF(gender):
+  """Returns the probabilities of dying by the start of each age from world.START_AGE on, according to the mortality tables"""
+  if gender not in _death_cdfs:
+    mortality = world.MALE_MORTALITY if gender == MALE else world.FEMALE_MORTALITY
+    survival = 1
+    cdf = []
+    for age in range(world.START_AGE, max(mortality) + 1):
+      survival *= 1 - min(mortality[age] * world.MORTALITY_MULTIPLIER, 1)
+      cdf.append(1 - survival)
+    cdf[-1] = 1
+    _death_cdfs[gender] = cdf
+  return _death_cdfs[gender]
+
+def DeathAge(gender, uniform):
+  """Returns the age at death at the given quantile, between 0 and 1, of the lifetime distribution, by inverse CDF"""
+  return world.START_AGE + bisect.bisect_right(DeathCDF(gender), uniform)
+
+
+class LifeTimeline(object):
+  """All of one life's random events, drawn at once when it is born.
+
+  The age at death comes from one uniform draw, or death_uniform if given,
+  through DeathAge. Each year up to death then gets an employment draw,
+  and normal inflation, investment return and earnings shocks. The normal
+  shocks are drawn a year at a time so each one is at the same position in
+  the stream in every life, as quasi-random streams need. With antithetic
+  set, the market shocks are mirrored about their means. With
+  survival_weighted set, no death is drawn and the timeline runs to the end
+  of the mortality table, for Person's survival weighting.
+
+  If market, a scenarios.MarketPath, is given, inflation and investment
+  returns are taken from it as they are, and only the rest is drawn.
+  """
+  def __init__(self, gender, rng=random, death_uniform=None, antithetic=False, market=None, survival_weighted=False):
+    if survival_weighted:
+      self.death_age = max(world.MALE_MORTALITY if gender == MALE else world.FEMALE_MORTALITY)
+    else:
+      self.death_age = DeathAge(gender, rng.random() if death_uniform is None else death_uniform)
+    self.involuntary_retirement_random = rng.random()
+    years = self.death_age - world.START_AGE
+    self.inflation = []
+    self.growth_rate = []
+    self.earnings_shocks = []
+    for _ in range(years):
+      if market is None:
+        self.inflation.append(rng.normalvariate(world.INFLATION_MEAN, world.INFLATION_STDDEV))
+        self.growth_rate.append(rng.normalvariate(world.MEAN_INVESTMENT_RETURN, world.STD_INVESTMENT_RETURN))
+      self.earnings_shocks.append(rng.normalvariate(0, 1))
+    # The year of death has inflation too, for the final accounts
+    if market is None:
+      self.inflation.append(rng.normalvariate(world.INFLATION_MEAN, world.INFLATION_STDDEV))
+    else:
+      self.inflation = market.inflation[:years + 1]
+      self.growth_rate = market.growth_rate[:years]
+    self.employed = [rng.random() > world.UNEMPLOYMENT_PROBABILITY for _ in range(years)]
+    if antithetic and market is None:
+      self.inflation = [2 * world.INFLATION_MEAN - inflation for inflation in self.inflation]
+      self.growth_rate = [2 * world.MEAN_INVESTMENT_RETURN - growth_rate for growth_rate in self.growth_rate]
+
+
+def WorkingPhase(strategy):
+  """Returns the values of the strategy's WORKING_PHASE_FIELDS"""
+  return tuple(getattr(strategy, field) for field in WORKING_PHASE_FIELDS)
+
 class Person(object):
   
-  def __init__(self, strategy, gender=FEMALE, basic_only=False, real_values=True):
+  def __init__(self, strategy, gender=FEMALE, basic_only=False, real_values=True, trace=None, plan=None, rng=random, antithetic=False, death_uniform=None, survival_weighted=False,
+               timeline=None):
     self.year = world.BASE_YEAR
     self.age = world.START_AGE
     self.gender = gender
@@ -40,17 +138,44 @@ class Person(object):
     self.cpi_history = []
     self.basic_only=basic_only
     self.real_values=real_values
+    self.trace = trace  # A tracing.LifeTrace, or None if this life isn't traced
+    self.rng = rng  # Source of all of this life's random draws: a random.Random, or the random module itself
+    self.antithetic = antithetic  # Whether market shocks are mirrored, for the second life of an antithetic pair
+    # If given, a uniform draw that fixes the age at death through the lifetime distribution, instead of drawing each year
+    self.death_uniform = death_uniform
+    # If set, no death is drawn. The life runs to the end of the mortality table, each year weighted by the
+    # probability of living it, and the estate is settled at every age, weighted by the probability of dying then.
+    self.survival_weighted = survival_weighted
+    self.survival_weight = 1  # The probability of being alive at the start of this year
+    # If given, a LifeTimeline holding all of this life's random events, which are then not drawn year by year.
+    # It takes the place of rng, antithetic and death_uniform. With survival_weighted, it must run to the end of the mortality table.
+    self.timeline = timeline
     self.employed_last_year = True
     self.retired = False
     # CAUTION: GIS must be the last income in the list.
-    self.incomes = [incomes.Earnings(), incomes.EI(), incomes.CPP(), incomes.OAS(), incomes.GIS()]
-    self.funds = {"wp_tfsa": funds.TFSA(), "wp_rrsp": funds.RRSP(), "wp_nonreg": funds.NonRegistered()}
-    self.involuntary_retirement_random = random.random()
+    self.incomes = [incomes.Earnings(rng, timeline), incomes.EI(), incomes.CPP(), incomes.OAS(), incomes.GIS()]
+    self.funds = funds.FundLedger()
+    if timeline is None:
+      self.involuntary_retirement_random = self.rng.random()
+      self.retirement_age = None
+    else:
+      self.involuntary_retirement_random = timeline.involuntary_retirement_random
+      # The age at which the person retires if still alive, which only depends on the strategy and the draw above
+      self.retirement_age = next(age for age in itertools.count(world.START_AGE) if self.RetiresAt(age))
     self.tfsa_room = world.TFSA_INITIAL_CONTRIBUTION_LIMIT
     self.rrsp_room = world.RRSP_INITIAL_LIMIT
     self.capital_loss_carry_forward = 0
-
-    self.accumulators = utils.AccumulatorBundle()
+    # Sums of the market shocks, for the control variates
+    self.total_inflation = 0
+    self.total_real_return = 0
+
+    self.plan = plan
+    self.accumulators = utils.AccumulatorBundle(basic_only, plan)
+    if survival_weighted:
+      self.weighted_accumulators = utils.AccumulatorBundle(basic_only, plan)
+      # The unweighted consumption of the years lived so far, which the end of life calculations compare
+      self.lived_retired_consumption = utils.SummaryStatsAccumulator()
+      self.lived_working_consumption = utils.SummaryStatsAccumulator()
     self.has_been_ruined = False
     self.has_received_gis = False
     self.has_experienced_income_under_lico = False
@@ -80,44 +205,60 @@ class Person(object):
     # Create RRSP bridging fund if needed
     if self.age < world.CPP_EXPECTED_RETIREMENT_AGE:
       requested = (world.CPP_EXPECTED_RETIREMENT_AGE - self.age) * world.OAS_BENEFIT * self.strategy.oas_bridging_fraction
-      self.funds["wp_rrsp"], self.funds["bridging"] = funds.SplitFund(self.funds["wp_rrsp"], funds.RRSPBridging(), requested)
-      if self.funds["bridging"].amount < requested:
-        top_up_amount = min(self.rrsp_room, requested - self.funds["bridging"].amount)
-        fund_chain = [self.funds["wp_nonreg"], self.funds["wp_tfsa"]]
-        withdrawn, _, year_rec = funds.ChainedWithdraw(top_up_amount, fund_chain, (1, 1), year_rec)
-        self.funds["bridging"].amount += withdrawn
+      self.funds.Open(funds.BRIDGING)
+      self.funds.Split(funds.WP_RRSP, funds.BRIDGING, requested)
+      if self.funds.amount[funds.BRIDGING] < requested:
+        top_up_amount = min(self.rrsp_room, requested - self.funds.amount[funds.BRIDGING])
+        withdrawn, _, year_rec = self.funds.ChainedWithdraw(top_up_amount, (funds.WP_NONREG, funds.WP_TFSA), (1, 1), year_rec)
+        self.funds.amount[funds.BRIDGING] += withdrawn
         year_rec.deposits.append(funds.DepositReceipt(withdrawn, funds.FUND_TYPE_RRSP))
         self.rrsp_room -= withdrawn
 
-      self.bridging_annual_withdrawal = self.funds["bridging"].amount / (world.CPP_EXPECTED_RETIREMENT_AGE - self.age)
+      self.bridging_annual_withdrawal = self.funds.amount[funds.BRIDGING] / (world.CPP_EXPECTED_RETIREMENT_AGE - self.age)
 
     # Split each fund into a CED and a CD fund
-    self.funds["cd_rrsp"], self.funds["ced_rrsp"] = funds.SplitFund(self.funds["wp_rrsp"], funds.RRSP(), self.strategy.drawdown_ced_fraction * self.funds["wp_rrsp"].amount)
-    del self.funds["wp_rrsp"]
-    
-    self.funds["cd_tfsa"], self.funds["ced_tfsa"] = funds.SplitFund(self.funds["wp_tfsa"], funds.TFSA(), self.strategy.drawdown_ced_fraction * self.funds["wp_tfsa"].amount)
-    del self.funds["wp_tfsa"]
-    
-    self.funds["cd_nonreg"], self.funds["ced_nonreg"] = funds.SplitFund(self.funds["wp_nonreg"], funds.NonRegistered(), self.strategy.drawdown_ced_fraction * self.funds["wp_nonreg"].amount)
-    del self.funds["wp_nonreg"]
+    for working, cd, ced in ((funds.WP_RRSP, funds.CD_RRSP, funds.CED_RRSP), (funds.WP_TFSA, funds.CD_TFSA, funds.CED_TFSA),
+                             (funds.WP_NONREG, funds.CD_NONREG, funds.CED_NONREG)):
+      self.funds.Open(ced)
+      self.funds.Split(working, ced, self.strategy.drawdown_ced_fraction * self.funds.amount[working])
+      self.funds.Move(working, cd)
 
-    self.cd_drawdown_amount = sum(fund.amount for fund in (self.funds["cd_rrsp"], self.funds["cd_tfsa"], self.funds["cd_nonreg"])) * self.strategy.initial_cd_fraction
+    self.cd_drawdown_amount = sum(self.funds.amount[slot] for slot in (funds.CD_RRSP, funds.CD_TFSA, funds.CD_NONREG)) * self.strategy.initial_cd_fraction
 
-    self.assets_at_retirement = sum(fund.amount for fund in self.funds.values()) / year_rec.cpi
+    self.assets_at_retirement = self.funds.Total() / year_rec.cpi
 
     if not self.basic_only:
       self.accumulators.fraction_persons_involuntarily_retired.UpdateOneValue(1 if self.age < self.strategy.planned_retirement_age else 0)
 
 
+  def MarketShock(self, mean, stddev):
+    """Draws a normally distributed inflation or investment return, reflected about the mean for an antithetic life"""
+    shock = self.rng.normalvariate(mean, stddev)
+    return 2 * mean - shock if self.antithetic else shock
+
   def AnnualSetup(self):
     """This is responsible for beginning of year operations.
 
     Returns a partially initialized year record.
     """
+    year_rec = self.StartYear()
+    if year_rec.is_dead:
+      return year_rec
+    return self.FinishAnnualSetup(year_rec)
+
+  def StartYear(self):
+    """The beginning of year operations up to retirement: inflation and mortality.
+
+    Returns a year record for FinishAnnualSetup, unless the person died.
+    """
     year_rec = utils.YearRecord()
     year_rec.age = self.age
     year_rec.year = self.year
-    year_rec.inflation = random.normalvariate(world.INFLATION_MEAN, world.INFLATION_STDDEV)
+    if self.timeline is None:
+      year_rec.inflation = self.MarketShock(world.INFLATION_MEAN, world.INFLATION_STDDEV)
+    else:
+      year_rec.inflation = self.timeline.inflation[self.age - world.START_AGE]
+    self.total_inflation += year_rec.inflation
     if self.year == world.BASE_YEAR:
       self.cpi = 1
     else:
@@ -127,31 +268,62 @@ class Person(object):
 
 
     # Reap souls
+    if self.timeline is not None and not self.survival_weighted:
+      year_rec.is_dead = self.age == self.timeline.death_age
+      return year_rec
+
     if self.gender == MALE:
       p_mortality = world.MALE_MORTALITY[self.age] * world.MORTALITY_MULTIPLIER
     elif self.gender == FEMALE:
       p_mortality = world.FEMALE_MORTALITY[self.age] * world.MORTALITY_MULTIPLIER
 
-    if random.random() < p_mortality:
+    if self.survival_weighted:
+      death_weight = self.survival_weight * min(p_mortality, 1)
+      if death_weight:
+        self.SettleWouldBeEstate(year_rec, death_weight)
+      self.survival_weight -= death_weight
+      year_rec.is_dead = self.survival_weight <= 0
+    elif self.death_uniform is None:
+      year_rec.is_dead = self.rng.random() < p_mortality
+    elif self.death_uniform < p_mortality:
       year_rec.is_dead = True
-      return year_rec
     else:
+      # Conditional on surviving this year, the rescaled draw is uniform again
       year_rec.is_dead = False
+      self.death_uniform = (self.death_uniform - p_mortality) / (1 - p_mortality)
+    return year_rec
 
+  def RetiresThisYear(self):
+    """Returns whether a person still working retires this year, voluntarily or not"""
+    if self.retirement_age is not None:
+      return self.age == self.retirement_age
+    return self.RetiresAt(self.age)
+
+  def RetiresAt(self, age):
+    """Returns whether a person still working at the given age retires then"""
+    return ((age == self.strategy.planned_retirement_age and age >= world.MINIMUM_RETIREMENT_AGE) or
+            self.involuntary_retirement_random < (age - world.MINIMUM_RETIREMENT_AGE + 1) * world.INVOLUNTARY_RETIREMENT_INCREMENT or
+            age == world.MAXIMUM_RETIREMENT_AGE)
+
+  def FinishAnnualSetup(self, year_rec):
+    """The rest of the beginning of year operations, from retirement on, for a person alive this year"""
     # Retirement
-    if not self.retired:
-      if ((self.age == self.strategy.planned_retirement_age and self.age >= world.MINIMUM_RETIREMENT_AGE) or
-          self.involuntary_retirement_random < (self.age - world.MINIMUM_RETIREMENT_AGE + 1) * world.INVOLUNTARY_RETIREMENT_INCREMENT or
-          self.age == world.MAXIMUM_RETIREMENT_AGE):
-        self.retired = True
-        self.OnRetirement(year_rec)
+    if not self.retired and self.RetiresThisYear():
+      self.retired = True
+      self.OnRetirement(year_rec)
     year_rec.is_retired = self.retired
 
-    # Employment
-    year_rec.is_employed = not self.retired and random.random() > world.UNEMPLOYMENT_PROBABILITY
+    if self.timeline is None:
+      # Employment
+      year_rec.is_employed = not self.retired and self.rng.random() > world.UNEMPLOYMENT_PROBABILITY
 
-    # Growth
-    year_rec.growth_rate = random.normalvariate(world.MEAN_INVESTMENT_RETURN, world.STD_INVESTMENT_RETURN)
+      # Growth
+      year_rec.growth_rate = self.MarketShock(world.MEAN_INVESTMENT_RETURN, world.STD_INVESTMENT_RETURN)
+    else:
+      year = self.age - world.START_AGE
+      year_rec.is_employed = not self.retired and self.timeline.employed[year]
+      year_rec.growth_rate = self.timeline.growth_rate[year]
+    self.total_real_return += year_rec.growth_rate - year_rec.inflation
 
     # Fund room
     self.tfsa_room += world.TFSA_ANNUAL_CONTRIBUTION_LIMIT * self.cpi
@@ -160,6 +332,23 @@ class Person(object):
 
     return year_rec
 
+  def SettleWouldBeEstate(self, year_rec, weight):
+    """Does the end of life calculations as if death came at the start of this year, adding their values
+    to the weighted accumulators with the given weight. The person lives on unchanged."""
+    dead_rec = utils.YearRecord()
+    dead_rec.age = year_rec.age
+    dead_rec.year = year_rec.year
+    dead_rec.inflation = year_rec.inflation
+    dead_rec.cpi = year_rec.cpi
+    dead_rec.is_dead = True
+
+    live_funds, live_accumulators, capital_loss_carry_forward = self.funds, self.accumulators, self.capital_loss_carry_forward
+    self.funds = live_funds.Copy()
+    self.accumulators = utils.AccumulatorBundle(self.basic_only, self.plan)
+    self.EndOfLifeCalcs(dead_rec)
+    self.weighted_accumulators.Merge(self.accumulators, weight)
+    self.funds, self.accumulators, self.capital_loss_carry_forward = live_funds, live_accumulators, capital_loss_carry_forward
+
   def CalcPayrollDeductions(self, year_rec):
     """Calculates and stores EI premium and CPP employee controbutions"""
     # CPP employee contribution
@@ -256,8 +445,8 @@ class Person(object):
   def CalcEndOfLifeEstate(self, year_rec):
     # Withdraw all money from all funds to generate the relevant receipts
     total_funds_amount = 0
-    for fund in self.funds.values():
-      withdrawn, gains, year_rec = fund.Withdraw(fund.amount, year_rec)
+    for slot in self.funds.open_slots:
+      withdrawn, gains, year_rec = self.funds.Withdraw(slot, self.funds.amount[slot], year_rec)
       total_funds_amount += withdrawn
 
     # Gross estate at death
@@ -300,24 +489,24 @@ class Person(object):
     # Do withdrawals
     if self.retired:
       # Bridging 
-      if "bridging" in self.funds and self.age < world.CPP_EXPECTED_RETIREMENT_AGE:
-        withdrawn, gains, year_rec = self.funds["bridging"].Withdraw(self.bridging_annual_withdrawal, year_rec)
+      if funds.BRIDGING in self.funds.open_slots and self.age < world.CPP_EXPECTED_RETIREMENT_AGE:
+        withdrawn, gains, year_rec = self.funds.Withdraw(funds.BRIDGING, self.bridging_annual_withdrawal, year_rec)
         cash += withdrawn
         self.total_retirement_withdrawals += withdrawn / year_rec.cpi
         self.total_lifetime_withdrawals += withdrawn / year_rec.cpi
 
       # CD drawdown strategy
       proportions = (self.strategy.drawdown_preferred_rrsp_fraction, self.strategy.drawdown_preferred_tfsa_fraction, 1)
-      fund_chain = [self.funds["cd_rrsp"], self.funds["cd_tfsa"], self.funds["cd_nonreg"]]
-      withdrawn, gains, year_rec = funds.ChainedWithdraw(self.cd_drawdown_amount, fund_chain, proportions, year_rec)
+      fund_chain = (funds.CD_RRSP, funds.CD_TFSA, funds.CD_NONREG)
+      withdrawn, gains, year_rec = self.funds.ChainedWithdraw(self.cd_drawdown_amount, fund_chain, proportions, year_rec)
       cash += withdrawn
       self.total_retirement_withdrawals += withdrawn / year_rec.cpi
       self.total_lifetime_withdrawals += withdrawn / year_rec.cpi
 
       # CED drawdown_strategy
-      fund_chain = [self.funds["ced_rrsp"], self.funds["ced_tfsa"], self.funds["ced_nonreg"]]
-      ced_drawdown_amount = sum(f.amount for f in fund_chain) * world.CED_PROPORTION[self.age]
-      withdrawn, gains, year_rec = funds.ChainedWithdraw(ced_drawdown_amount, fund_chain, proportions, year_rec)
+      fund_chain = (funds.CED_RRSP, funds.CED_TFSA, funds.CED_NONREG)
+      ced_drawdown_amount = sum(self.funds.amount[slot] for slot in fund_chain) * world.CED_PROPORTION[self.age]
+      withdrawn, gains, year_rec = self.funds.ChainedWithdraw(ced_drawdown_amount, fund_chain, proportions, year_rec)
       cash += withdrawn
       self.total_retirement_withdrawals += withdrawn / year_rec.cpi
       self.total_lifetime_withdrawals += withdrawn / year_rec.cpi
@@ -326,8 +515,8 @@ class Person(object):
         # Attempt to withdraw difference from savings
         amount_to_withdraw = world.LICO_SINGLE_CITY_WP * year_rec.cpi * self.strategy.lico_target_fraction - cash
         proportions = (self.strategy.working_period_drawdown_tfsa_fraction, self.strategy.working_period_drawdown_nonreg_fraction, 1)
-        fund_chain = [self.funds["wp_tfsa"], self.funds["wp_nonreg"], self.funds["wp_rrsp"]]
-        withdrawn, gains, year_rec = funds.ChainedWithdraw(amount_to_withdraw, fund_chain, proportions, year_rec)
+        fund_chain = (funds.WP_TFSA, funds.WP_NONREG, funds.WP_RRSP)
+        withdrawn, gains, year_rec = self.funds.ChainedWithdraw(amount_to_withdraw, fund_chain, proportions, year_rec)
         cash += withdrawn
         self.total_lifetime_withdrawals += withdrawn / year_rec.cpi
 
@@ -335,16 +524,15 @@ class Person(object):
     if not self.retired:
       earnings_to_save = max(earnings-self.strategy.savings_threshold, 0) * self.strategy.savings_rate
       proportions = (self.strategy.savings_rrsp_fraction, self.strategy.savings_tfsa_fraction, 1)
-      fund_chain = [self.funds["wp_rrsp"], self.funds["wp_tfsa"], self.funds["wp_nonreg"]]
-      deposited, year_rec = funds.ChainedDeposit(earnings_to_save, fund_chain, proportions, year_rec)
+      fund_chain = (funds.WP_RRSP, funds.WP_TFSA, funds.WP_NONREG)
+      deposited, year_rec = self.funds.ChainedDeposit(earnings_to_save, fund_chain, proportions, year_rec)
       cash -= deposited
       self.total_working_savings += deposited / year_rec.cpi
       if deposited > 0:
         self.positive_savings_years += 1
 
     # Update funds
-    for fund in self.funds.values():
-      fund.Update(year_rec)
+    self.funds.Update(year_rec)
 
     # update the Person's view of RRSP and TFSA room
     self.tfsa_room = year_rec.tfsa_room
@@ -387,85 +575,117 @@ class Person(object):
 
 
   def AnnualReview(self, year_rec):
-    """End of year calculations for a live person"""
+    """End of year calculations for a live person.
+
+    Only the sums and counters that a tracked accumulator or the trace will
+    look at are worked out.
+    """
     period = self.Period(year_rec)
-    self.period_years[period] += 1
     cpi = year_rec.cpi if self.real_values else 1
 
     self.accumulators.UpdateConsumption(year_rec.consumption/cpi, self.year, self.retired, period)
-    earnings = sum(receipt.amount for receipt in year_rec.incomes
-                   if receipt.income_type == incomes.INCOME_TYPE_EARNINGS)
-    cpp = sum(receipt.amount for receipt in year_rec.incomes
-              if receipt.income_type == incomes.INCOME_TYPE_CPP)
-    ei_benefits =  sum(receipt.amount for receipt in year_rec.incomes
-                       if receipt.income_type == incomes.INCOME_TYPE_EI)
-    gis = sum(receipt.amount for receipt in year_rec.incomes
-              if receipt.income_type == incomes.INCOME_TYPE_GIS)
-    oas = sum(receipt.amount for receipt in year_rec.incomes
-              if receipt.income_type == incomes.INCOME_TYPE_OAS)
-    assets = sum(fund.amount for fund in self.funds.values())
-    gross_income = sum(receipt.amount for receipt in year_rec.incomes) + sum(receipt.amount for receipt in year_rec.withdrawals)
-    rrsp_withdrawals = sum(receipt.amount for receipt in year_rec.withdrawals
-                           if receipt.fund_type in (funds.FUND_TYPE_RRSP, funds.FUND_TYPE_BRIDGING))
-    tfsa_withdrawals = sum(receipt.amount for receipt in year_rec.withdrawals
-                           if receipt.fund_type == funds.FUND_TYPE_TFSA)
-    nonreg_withdrawals = sum(receipt.amount for receipt in year_rec.withdrawals
-                             if receipt.fund_type == funds.FUND_TYPE_NONREG)
-    total_withdrawals = rrsp_withdrawals + tfsa_withdrawals + nonreg_withdrawals
-    rrsp_deposits = sum(receipt.amount for receipt in year_rec.deposits
-                        if receipt.fund_type in (funds.FUND_TYPE_RRSP, funds.FUND_TYPE_BRIDGING))
-    tfsa_deposits = sum(receipt.amount for receipt in year_rec.deposits
-                        if receipt.fund_type == funds.FUND_TYPE_TFSA)
-    nonreg_deposits = sum(receipt.amount for receipt in year_rec.deposits
-                          if receipt.fund_type == funds.FUND_TYPE_NONREG)
-    savings = rrsp_deposits + tfsa_deposits + nonreg_deposits
-    ympe = utils.Indexed(world.YMPE, year_rec.year, 1 + world.PARGE)
-
-    if gross_income < world.LICO_SINGLE_CITY_WP * year_rec.cpi:
-      self.gross_income_below_lico_years += 1
-
-    if assets <= 0:
-      self.no_assets_years += 1
-
-    if self.age >= world.MINIMUM_RETIREMENT_AGE and not self.retired:
+
+    # The trace and the full run's accumulators read every counter below, the fitness components only some of them
+    detailed = not self.basic_only or self.trace
+    tracks = self.accumulators.Tracks
+    track_lico = (detailed or tracks("lico_gap_working") or tracks("lico_gap_retired") or tracks("fraction_retirement_years_below_lico") or
+                  tracks("fraction_retirees_ever_below_lico"))
+    track_ruin = detailed or tracks("fraction_persons_ruined") or tracks("fraction_retirement_years_ruined")
+    track_ympe = detailed or tracks("fraction_retirement_years_below_ympe") or tracks("fraction_retirement_years_below_twice_ympe")
+    track_gis = (detailed or tracks("fraction_retirees_receiving_gis") or tracks("fraction_retirement_years_receiving_gis") or
+                 tracks("benefits_gis"))
+    track_late_earnings = detailed or tracks("earnings_late_working_summary")
+
+    if track_late_earnings:
+      earnings = sum(receipt.amount for receipt in year_rec.incomes
+                     if receipt.income_type == incomes.INCOME_TYPE_EARNINGS)
+    if track_gis:
+      gis = sum(receipt.amount for receipt in year_rec.incomes
+                if receipt.income_type == incomes.INCOME_TYPE_GIS)
+    if track_ruin or track_ympe:
+      assets = self.funds.Total()
+    if track_lico:
+      gross_income = sum(receipt.amount for receipt in year_rec.incomes) + sum(receipt.amount for receipt in year_rec.withdrawals)
+    if track_ympe:
+      ympe = utils.Indexed(world.YMPE, year_rec.year, 1 + world.PARGE)
+    if detailed:
+      self.period_years[period] += 1
+      cpp = sum(receipt.amount for receipt in year_rec.incomes
+                if receipt.income_type == incomes.INCOME_TYPE_CPP)
+      ei_benefits =  sum(receipt.amount for receipt in year_rec.incomes
+                         if receipt.income_type == incomes.INCOME_TYPE_EI)
+      oas = sum(receipt.amount for receipt in year_rec.incomes
+                if receipt.income_type == incomes.INCOME_TYPE_OAS)
+      rrsp_withdrawals = sum(receipt.amount for receipt in year_rec.withdrawals
+                             if receipt.fund_type in (funds.FUND_TYPE_RRSP, funds.FUND_TYPE_BRIDGING))
+      tfsa_withdrawals = sum(receipt.amount for receipt in year_rec.withdrawals
+                             if receipt.fund_type == funds.FUND_TYPE_TFSA)
+      nonreg_withdrawals = sum(receipt.amount for receipt in year_rec.withdrawals
+                               if receipt.fund_type == funds.FUND_TYPE_NONREG)
+      rrsp_deposits = sum(receipt.amount for receipt in year_rec.deposits
+                          if receipt.fund_type in (funds.FUND_TYPE_RRSP, funds.FUND_TYPE_BRIDGING))
+      tfsa_deposits = sum(receipt.amount for receipt in year_rec.deposits
+                          if receipt.fund_type == funds.FUND_TYPE_TFSA)
+      nonreg_deposits = sum(receipt.amount for receipt in year_rec.deposits
+                            if receipt.fund_type == funds.FUND_TYPE_NONREG)
+      savings = rrsp_deposits + tfsa_deposits + nonreg_deposits
+
+      if gross_income < world.LICO_SINGLE_CITY_WP * year_rec.cpi:
+        self.gross_income_below_lico_years += 1
+
+      if assets <= 0:
+        self.no_assets_years += 1
+
+    if track_late_earnings and self.age >= world.MINIMUM_RETIREMENT_AGE and not self.retired:
       self.accumulators.earnings_late_working_summary.UpdateOneValue(earnings/cpi)
 
     if self.retired:
-      self.accumulators.lico_gap_retired.UpdateOneValue(max(0, world.LICO_SINGLE_CITY_WP*year_rec.cpi-gross_income)/cpi)
-      if assets <= 0:
-        self.has_been_ruined=True
-        self.accumulators.fraction_retirement_years_ruined.UpdateOneValue(1)
-      else:
-        self.accumulators.fraction_retirement_years_ruined.UpdateOneValue(0)
-      self.accumulators.fraction_retirement_years_below_ympe.UpdateOneValue(1 if assets < ympe else 0)
-      self.accumulators.fraction_retirement_years_below_twice_ympe.UpdateOneValue(1 if assets < 2*ympe else 0)
-      if gross_income < world.LICO_SINGLE_CITY_WP * year_rec.cpi:
-        self.has_experienced_income_under_lico = True
-        self.accumulators.fraction_retirement_years_below_lico.UpdateOneValue(1)
-      else:
-        self.accumulators.fraction_retirement_years_below_lico.UpdateOneValue(0)
-      self.accumulators.retirement_taxes.UpdateOneValue(year_rec.taxes_payable/cpi)
-      if cpp > 0:
-        self.accumulators.positive_cpp_benefits.UpdateOneValue(cpp/cpi)
+      if track_lico:
+        self.accumulators.lico_gap_retired.UpdateOneValue(max(0, world.LICO_SINGLE_CITY_WP*year_rec.cpi-gross_income)/cpi)
+      if track_ruin:
+        if assets <= 0:
+          self.has_been_ruined=True
+          self.accumulators.fraction_retirement_years_ruined.UpdateOneValue(1)
+        else:
+          self.accumulators.fraction_retirement_years_ruined.UpdateOneValue(0)
+      if track_ympe:
+        self.accumulators.fraction_retirement_years_below_ympe.UpdateOneValue(1 if assets < ympe else 0)
+        self.accumulators.fraction_retirement_years_below_twice_ympe.UpdateOneValue(1 if assets < 2*ympe else 0)
+      if track_lico:
+        if gross_income < world.LICO_SINGLE_CITY_WP * year_rec.cpi:
+          self.has_experienced_income_under_lico = True
+          self.accumulators.fraction_retirement_years_below_lico.UpdateOneValue(1)
+        else:
+          self.accumulators.fraction_retirement_years_below_lico.UpdateOneValue(0)
+      if not self.basic_only:
+        self.accumulators.retirement_taxes.UpdateOneValue(year_rec.taxes_payable/cpi)
+        if cpp > 0:
+          self.accumulators.positive_cpp_benefits.UpdateOneValue(cpp/cpi)
     else: # Working period
-      self.accumulators.lico_gap_working.UpdateOneValue(max(0, world.LICO_SINGLE_CITY_WP*year_rec.cpi-gross_income)/cpi)
-      self.accumulators.earnings_working.UpdateOneValue(earnings/cpi)
-      self.accumulators.working_annual_ei_cpp_deductions.UpdateOneValue(
-          (year_rec.cpp_contribution + year_rec.ei_premium)/cpi)
-      self.accumulators.working_taxes.UpdateOneValue(year_rec.taxes_payable/cpi)
-      if earnings > 0:
-        self.positive_earnings_years += 1
-        self.accumulators.fraction_earnings_saved.UpdateOneValue(savings/earnings)
-      if ei_benefits > 0:
-        self.ei_years += 1
-        self.accumulators.positive_ei_benefits.UpdateOneValue(ei_benefits/cpi)
-
-    if self.age >= world.MAXIMUM_RETIREMENT_AGE:
+      if track_lico:
+        self.accumulators.lico_gap_working.UpdateOneValue(max(0, world.LICO_SINGLE_CITY_WP*year_rec.cpi-gross_income)/cpi)
+      if not self.basic_only:
+        self.accumulators.earnings_working.UpdateOneValue(earnings/cpi)
+        self.accumulators.working_annual_ei_cpp_deductions.UpdateOneValue(
+            (year_rec.cpp_contribution + year_rec.ei_premium)/cpi)
+        self.accumulators.working_taxes.UpdateOneValue(year_rec.taxes_payable/cpi)
+      if detailed:
+        if earnings > 0:
+          self.positive_earnings_years += 1
+          if not self.basic_only:
+            self.accumulators.fraction_earnings_saved.UpdateOneValue(savings/earnings)
+        if ei_benefits > 0:
+          self.ei_years += 1
+          if not self.basic_only:
+            self.accumulators.positive_ei_benefits.UpdateOneValue(ei_benefits/cpi)
+
+    if track_gis and self.age >= world.MAXIMUM_RETIREMENT_AGE:
       if gis > 0:
         self.gis_years += 1
         self.has_received_gis = True
         self.accumulators.fraction_retirement_years_receiving_gis.UpdateOneValue(1)
-        self.accumulators.positive_gis_benefits.UpdateOneValue(gis/cpi)
+        if not self.basic_only:
+          self.accumulators.positive_gis_benefits.UpdateOneValue(gis/cpi)
       else:
         self.accumulators.fraction_retirement_years_receiving_gis.UpdateOneValue(0)
       self.accumulators.benefits_gis.UpdateOneValue(gis/cpi)
@@ -506,27 +726,48 @@ class Person(object):
       self.accumulators.tfsa_withdrawals_by_age.UpdateOneValue(tfsa_withdrawals/cpi, self.age)
       self.accumulators.nonreg_withdrawals_by_age.UpdateOneValue(nonreg_withdrawals/cpi, self.age)
       self.accumulators.rrsp_assets_by_age.UpdateOneValue(
-          sum(fund.amount for fund in self.funds.values() if fund.fund_type == funds.FUND_TYPE_RRSP)/cpi, self.age)
+          self.funds.Total(funds.FUND_TYPE_RRSP)/cpi, self.age)
       self.accumulators.bridging_assets_by_age.UpdateOneValue(
-          sum(fund.amount for fund in self.funds.values() if fund.fund_type == funds.FUND_TYPE_BRIDGING)/cpi, self.age)
+          self.funds.Total(funds.FUND_TYPE_BRIDGING)/cpi, self.age)
       self.accumulators.tfsa_assets_by_age.UpdateOneValue(
-          sum(fund.amount for fund in self.funds.values() if fund.fund_type == funds.FUND_TYPE_TFSA)/cpi, self.age)
+          self.funds.Total(funds.FUND_TYPE_TFSA)/cpi, self.age)
       self.accumulators.nonreg_assets_by_age.UpdateOneValue(
-          sum(fund.amount for fund in self.funds.values() if fund.fund_type == funds.FUND_TYPE_NONREG)/cpi, self.age)
+          self.funds.Total(funds.FUND_TYPE_NONREG)/cpi, self.age)
 
     self.age += 1
     self.year += 1
 
 
+  def ControlVariates(self):
+    """Returns this life's average real investment return, average inflation and years lived, each less its expectation.
+
+    The shocks are drawn independently of the age at death, so their averages
+    have the same expectations as the shocks themselves.
+    """
+    years_lived = self.age - world.START_AGE
+    if years_lived:
+      real_return = self.total_real_return / years_lived - (world.MEAN_INVESTMENT_RETURN - world.INFLATION_MEAN)
+    else:
+      real_return = 0
+    inflation = self.total_inflation / len(self.cpi_history) - world.INFLATION_MEAN
+    return (real_return, inflation, years_lived - ExpectedYearsLived(self.gender))
+
   def EndOfLifeCalcs(self, year_rec):
     """Calculations that happen upon death"""
     cpi = year_rec.cpi if self.real_values else 1
+    if self.survival_weighted:
+      retired_consumption, working_consumption = self.lived_retired_consumption, self.lived_working_consumption
+    else:
+      retired_consumption, working_consumption = self.accumulators.retired_consumption_summary, self.accumulators.working_consumption_summary
     if self.retired:
       asset_comparison_level = self.assets_at_retirement
     else:
-      asset_comparison_level = sum(fund.amount for fund in self.funds.values()) / year_rec.cpi
-    estate = self.CalcEndOfLifeEstate(year_rec)
-    self.accumulators.distributable_estate.UpdateOneValue(estate/cpi)
+      asset_comparison_level = self.funds.Total() / year_rec.cpi
+    # Settling the estate is only worth doing if something will look at it
+    if not self.basic_only or self.trace or self.accumulators.Tracks("distributable_estate"):
+      estate = self.CalcEndOfLifeEstate(year_rec)
+      self.accumulators.distributable_estate.UpdateOneValue(estate/cpi)
+    self.accumulators.control_variates.UpdateOneValue(self.ControlVariates())
     self.accumulators.fraction_persons_ruined.UpdateOneValue(1 if self.has_been_ruined else 0)
     self.accumulators.fraction_retirees_receiving_gis.UpdateOneValue(1 if self.has_received_gis else 0)
     self.accumulators.fraction_retirees_ever_below_lico.UpdateOneValue(1 if self.has_experienced_income_under_lico else 0)
@@ -539,7 +780,7 @@ class Person(object):
     self.accumulators.lifetime_withdrawals_less_savings.UpdateOneValue(
         (self.total_lifetime_withdrawals - self.total_working_savings)*(year_rec.cpi if not self.real_values else 1))
     self.accumulators.retirement_consumption_less_working_consumption.UpdateOneValue(
-        min(0, self.accumulators.retired_consumption_summary.mean - world.FRACTION_WORKING_CONSUMPTION*self.accumulators.working_consumption_summary.mean))
+        min(0, retired_consumption.mean - world.FRACTION_WORKING_CONSUMPTION*working_consumption.mean))
 
     if not self.basic_only:
       self.accumulators.age_at_death.UpdateOneValue(self.age)
@@ -561,13 +802,86 @@ class Person(object):
 
   def LiveLife(self):
     """Run through one lifetime"""
+    if self.survival_weighted:
+      self.LiveSurvivalWeightedLife()
+      return
+    year_rec = self.LiveWorkingLife()
+    if year_rec is not None:
+      self.LiveRetiredLife(year_rec)
+
+  def LiveWorkingLife(self):
+    """Run through the working years, stopping at the start of the year of retirement.
+
+    Returns that year's record, from StartYear, for LiveRetiredLife. Up to
+    then, only the working phase fields of the strategy have been used, so the
+    person can be copied and each copy retired under a different strategy.
+    Returns None if the person died before retiring, with the life complete.
+    """
+    while True:
+      year_rec = self.StartYear()
+      if year_rec.is_dead:
+        self.EndOfLife(year_rec)
+        return None
+      if not self.retired and self.RetiresThisYear():
+        return year_rec
+      self.LiveYear(self.FinishAnnualSetup(year_rec))
+
+  def LiveRetiredLife(self, year_rec):
+    """Run through the rest of a life from the year record returned by LiveWorkingLife"""
+    self.LiveYear(self.FinishAnnualSetup(year_rec))
     while True:
       year_rec = self.AnnualSetup()
-      if not year_rec.is_dead:
-        year_rec = self.MeddleWithCash(year_rec)
-        self.AnnualReview(year_rec)
-      else:
-        self.EndOfLifeCalcs(year_rec)
+      if year_rec.is_dead:
+        self.EndOfLife(year_rec)
+        return
+      self.LiveYear(year_rec)
+
+  def LiveYear(self, year_rec):
+    """The rest of a year that the person lives through, from the record returned by AnnualSetup"""
+    year_rec = self.MeddleWithCash(year_rec)
+    if self.trace:
+      self.trace.AddYear(self, year_rec)
+    self.AnnualReview(year_rec)
+
+  def EndOfLife(self, year_rec):
+    self.EndOfLifeCalcs(year_rec)
+    if self.trace:
+      self.trace.AddLife(self, year_rec)
+
+  def LiveSurvivalWeightedLife(self):
+    """Run through one economic path to the end of the mortality table, leaving its survival weighted values in self.accumulators"""
+    while True:
+      # Each year's values are weighted as a whole once the year is over
+      self.accumulators = utils.AccumulatorBundle(self.basic_only, self.plan)
+      year_rec = self.AnnualSetup()
+      if year_rec.is_dead:
         break
+      year_rec = self.MeddleWithCash(year_rec)
+      if self.trace:
+        self.trace.AddYear(self, year_rec)
+      self.AnnualReview(year_rec)
+      self.weighted_accumulators.Merge(self.accumulators, self.survival_weight)
+      self.lived_retired_consumption.UpdateAccumulator(self.accumulators.retired_consumption_summary)
+      self.lived_working_consumption.UpdateAccumulator(self.accumulators.working_consumption_summary)
+    self.accumulators = self.weighted_accumulators
+
 
+class RetirementSnapshot(object):
+  """A life paused by Person.LiveWorkingLife, which can be resumed any number of times, each under its own strategy.
 
+  The person is pickled, random stream included, so every resumption
+  continues from the same state and gets accumulators of its own.
+  """
+  def __init__(self, person, year_rec):
+    self.pickled = pickle.dumps((person, year_rec), pickle.HIGHEST_PROTOCOL)
+
+  def Resume(self, strategy):
+    """Returns the accumulators of the life lived out under strategy, which must have the same WorkingPhase as the paused one.
+
+    A life that ended before retirement is returned as it was.
+    """
+    person, year_rec = pickle.loads(self.pickled)
+    if year_rec is not None:
+      person.strategy = strategy
+      person.LiveRetiredLife(year_rec)
+    return person.accumulators
@@ -1,6 +1,9 @@
+import random
 import unittest
 import unittest.mock
 import person
+import qmc
+import scenarios
 import incomes
 import funds
 import world
@@ -38,12 +41,13 @@ class PersonTest(unittest.TestCase):
   def testCreatePersonHasFunds(self):
     j_canuck = person.Person(strategy=self.default_strategy)
 
-    self.assertEqual(j_canuck.funds["wp_tfsa"].fund_type, funds.FUND_TYPE_TFSA)
-    self.assertEqual(j_canuck.funds["wp_tfsa"].amount, 0)
-    self.assertEqual(j_canuck.funds["wp_rrsp"].fund_type, funds.FUND_TYPE_RRSP)
-    self.assertEqual(j_canuck.funds["wp_rrsp"].amount, 0)
-    self.assertEqual(j_canuck.funds["wp_nonreg"].fund_type, funds.FUND_TYPE_NONREG)
-    self.assertEqual(j_canuck.funds["wp_nonreg"].amount, 0)
+    self.assertEqual(j_canuck.funds.open_slots, [funds.WP_TFSA, funds.WP_RRSP, funds.WP_NONREG])
+    self.assertEqual(funds.SLOT_FUND_TYPES[funds.WP_TFSA], funds.FUND_TYPE_TFSA)
+    self.assertEqual(j_canuck.funds.amount[funds.WP_TFSA], 0)
+    self.assertEqual(funds.SLOT_FUND_TYPES[funds.WP_RRSP], funds.FUND_TYPE_RRSP)
+    self.assertEqual(j_canuck.funds.amount[funds.WP_RRSP], 0)
+    self.assertEqual(funds.SLOT_FUND_TYPES[funds.WP_NONREG], funds.FUND_TYPE_NONREG)
+    self.assertEqual(j_canuck.funds.amount[funds.WP_NONREG], 0)
 
   def testCreatePersonFundRoom(self):
     j_canuck = person.Person(strategy=self.default_strategy)
@@ -88,6 +92,141 @@ class PersonTest(unittest.TestCase):
     year_rec = j_canuck.AnnualSetup()
     self.assertFalse(year_rec.is_dead)
 
+  def testAnnualSetupReaperDeathUniform(self):
+    # Female mortality at age 30 is 0.00039
+    j_canuck = person.Person(strategy=self.default_strategy, gender=person.FEMALE, death_uniform=0.0003)
+    self.assertTrue(j_canuck.AnnualSetup().is_dead)
+
+    j_canuck = person.Person(strategy=self.default_strategy, gender=person.FEMALE, death_uniform=0.5)
+    self.assertFalse(j_canuck.AnnualSetup().is_dead)
+    self.assertAlmostEqual(j_canuck.death_uniform, (0.5 - 0.00039) / (1 - 0.00039))
+
+  def testDeathUniformFollowsLifeTable(self):
+    # The fraction dying by the end of age 31 is 1 - (1 - 0.00039) * (1 - 0.00042)
+    died_by_31 = 1 - (1 - 0.00039) * (1 - 0.00042)
+    for death_uniform, expected_age in [(died_by_31 - 1e-6, 31), (died_by_31 + 1e-6, 32)]:
+      j_canuck = person.Person(strategy=self.default_strategy, gender=person.FEMALE, death_uniform=death_uniform)
+      with unittest.mock.patch('random.random', return_value=0.5):
+        while not j_canuck.AnnualSetup().is_dead:
+          j_canuck.age += 1
+      self.assertEqual(j_canuck.age, expected_age)
+
+  def testDeathAgeMatchesDeathUniform(self):
+    for uniform in (0, 0.0003, 0.1, 0.5, 0.9, 0.999999):
+      j_canuck = person.Person(strategy=self.default_strategy, gender=person.MALE, rng=random.Random(1), death_uniform=uniform)
+      while not j_canuck.StartYear().is_dead:
+        j_canuck.age += 1
+      self.assertEqual(person.DeathAge(person.MALE, uniform), j_canuck.age)
+
+  def testLifeTimeline(self):
+    timeline = person.LifeTimeline(person.FEMALE, random.Random(1), death_uniform=0.5)
+    self.assertEqual(timeline.death_age, person.DeathAge(person.FEMALE, 0.5))
+    years = timeline.death_age - world.START_AGE
+    self.assertEqual(len(timeline.inflation), years + 1)
+    self.assertEqual(len(timeline.growth_rate), years)
+    self.assertEqual(len(timeline.employed), years)
+
+    mirrored = person.LifeTimeline(person.FEMALE, random.Random(1), death_uniform=0.5, antithetic=True)
+    self.assertAlmostEqual(mirrored.inflation[3] + timeline.inflation[3], 2 * world.INFLATION_MEAN)
+    self.assertAlmostEqual(mirrored.growth_rate[3] + timeline.growth_rate[3], 2 * world.MEAN_INVESTMENT_RETURN)
+    self.assertEqual(mirrored.earnings_shocks, timeline.earnings_shocks)
+    self.assertEqual(mirrored.employed, timeline.employed)
+
+  def testLifeTimelineMarketPath(self):
+    market = scenarios.IIDNormal().Generate([random.Random(2)])[0]
+    timeline = person.LifeTimeline(person.FEMALE, random.Random(1), death_uniform=0.5, market=market)
+    years = timeline.death_age - world.START_AGE
+    self.assertEqual(timeline.inflation, market.inflation[:years + 1])
+    self.assertEqual(timeline.growth_rate, market.growth_rate[:years])
+    self.assertEqual(len(timeline.earnings_shocks), years)
+    self.assertEqual(len(timeline.employed), years)
+
+  def testLifeTimelineQuasiRandomCoordinates(self):
+    sobol = qmc.SobolSequence(3 * (max(world.FEMALE_MORTALITY) - world.START_AGE + 1))
+    point = sobol.Point(5, sobol.RandomShift(random.Random(1)))
+    timelines = [person.LifeTimeline(person.FEMALE, qmc.QuasiRandomStream(point, random.Random(seed)), death_uniform=0.5) for seed in (1, 2)]
+    self.assertNotEqual(timelines[0].employed, timelines[1].employed)
+    # Each year's shocks are at fixed coordinates of the point, whatever the lives' other draws
+    for year in range(len(timelines[0].growth_rate)):
+      self.assertEqual(timelines[0].inflation[year], timelines[1].inflation[year])
+      self.assertEqual(timelines[0].growth_rate[year], timelines[1].growth_rate[year])
+      self.assertEqual(timelines[0].earnings_shocks[year], timelines[1].earnings_shocks[year])
+
+    lives = [person.Person(strategy=self.default_strategy, basic_only=False, rng=None, timeline=timeline) for timeline in timelines]
+    for life in lives:
+      life.LiveLife()
+    self.assertEqual(lives[0].cpi_history, lives[1].cpi_history)
+
+  def testLifeTimelineSurvivalWeighted(self):
+    timeline = person.LifeTimeline(person.MALE, random.Random(1), survival_weighted=True)
+    self.assertEqual(timeline.death_age, max(world.MALE_MORTALITY))
+    j_canuck = person.Person(strategy=self.default_strategy, gender=person.MALE, rng=None, survival_weighted=True, timeline=timeline)
+    j_canuck.LiveLife()
+    self.assertAlmostEqual(j_canuck.accumulators.age_at_death.n, 1)
+    self.assertAlmostEqual(j_canuck.accumulators.age_at_death.mean, world.START_AGE + person.ExpectedYearsLived(person.MALE))
+
+  def testLiveLifeFromTimeline(self):
+    timeline = person.LifeTimeline(person.FEMALE, random.Random(1), death_uniform=0.5)
+    timeline.involuntary_retirement_random = 1
+    j_canuck = person.Person(strategy=self.default_strategy, basic_only=False, rng=None, timeline=timeline)
+    self.assertEqual(j_canuck.retirement_age, 65)
+    j_canuck.LiveLife()
+
+    self.assertEqual(j_canuck.age, timeline.death_age)
+    self.assertEqual(j_canuck.cpi_history[1], 1 + timeline.inflation[1])
+    self.assertEqual(j_canuck.period_years[person.EMPLOYED], timeline.employed[:65 - world.START_AGE].count(True))
+    self.assertEqual(j_canuck.period_years[person.RETIRED], timeline.death_age - 65)
+
+  def testSurvivalWeightedAnnualSetup(self):
+    j_canuck = person.Person(strategy=self.default_strategy, gender=person.FEMALE, survival_weighted=True)
+    j_canuck.funds.amount[funds.WP_TFSA] = 1000
+    year_rec = j_canuck.AnnualSetup()
+    self.assertFalse(year_rec.is_dead)
+    self.assertAlmostEqual(j_canuck.survival_weight, 1 - 0.00039)
+    # The estate was settled as if death came now, without touching the living person's funds
+    self.assertAlmostEqual(j_canuck.weighted_accumulators.age_at_death.n, 0.00039)
+    self.assertAlmostEqual(j_canuck.weighted_accumulators.age_at_death.mean, 30)
+    self.assertEqual(j_canuck.funds.amount[funds.WP_TFSA], 1000)
+
+  def testSurvivalWeightedLifeExpectancy(self):
+    life_expectancy = 0
+    survival = 1
+    for age in range(world.START_AGE, max(world.MALE_MORTALITY) + 1):
+      life_expectancy += survival * min(world.MALE_MORTALITY[age] * world.MORTALITY_MULTIPLIER, 1) * age
+      survival *= 1 - min(world.MALE_MORTALITY[age] * world.MORTALITY_MULTIPLIER, 1)
+    j_canuck = person.Person(strategy=self.default_strategy, gender=person.MALE, rng=random.Random(1), survival_weighted=True)
+    j_canuck.LiveLife()
+    self.assertAlmostEqual(j_canuck.accumulators.age_at_death.n, 1)
+    self.assertAlmostEqual(j_canuck.accumulators.age_at_death.mean, life_expectancy)
+    self.assertAlmostEqual(person.ExpectedYearsLived(person.MALE), life_expectancy - world.START_AGE)
+    self.assertAlmostEqual(j_canuck.accumulators.persons_alive_by_age.Query([world.START_AGE]).n, 1 - world.MALE_MORTALITY[world.START_AGE] * world.MORTALITY_MULTIPLIER)
+
+  def testControlVariates(self):
+    j_canuck = person.Person(strategy=self.default_strategy, gender=person.FEMALE)
+    with unittest.mock.patch.object(j_canuck, 'MarketShock', side_effect=[0.02, 0.07, 0.03, 0.05, 0.04]):
+      with unittest.mock.patch('random.random', return_value=0.5):
+        for _ in range(2):
+          j_canuck.AnnualReview(j_canuck.MeddleWithCash(j_canuck.AnnualSetup()))
+      with unittest.mock.patch('random.random', return_value=0):
+        self.assertTrue(j_canuck.AnnualSetup().is_dead)
+    real_return, inflation, years_lived = j_canuck.ControlVariates()
+    self.assertAlmostEqual(real_return, (0.07 - 0.02 + 0.05 - 0.03) / 2 - (world.MEAN_INVESTMENT_RETURN - world.INFLATION_MEAN))
+    self.assertAlmostEqual(inflation, (0.02 + 0.03 + 0.04) / 3 - world.INFLATION_MEAN)
+    self.assertAlmostEqual(years_lived, 2 - person.ExpectedYearsLived(person.FEMALE))
+
+  def testAnnualReviewSkipsUntrackedSums(self):
+    plan = frozenset(["lifetime_consumption_summary", "lico_gap_working", "lico_gap_retired"])
+    planned = person.Person(strategy=self.default_strategy, basic_only=True, plan=plan, rng=random.Random(1))
+    planned.LiveLife()
+    full = person.Person(strategy=self.default_strategy, rng=random.Random(1))
+    full.LiveLife()
+    self.assertEqual(planned.accumulators.lico_gap_working.mean, full.accumulators.lico_gap_working.mean)
+    self.assertEqual(planned.accumulators.lico_gap_retired.mean, full.accumulators.lico_gap_retired.mean)
+    # Only the trace and the full run's accumulators read the counters
+    self.assertGreater(full.positive_earnings_years, 0)
+    self.assertEqual(planned.positive_earnings_years, 0)
+    self.assertEqual(sum(planned.period_years.values()), 0)
+
   # Make sure all incomes have GiveMeMoney called in a year (even if they don't return anything)
   @unittest.mock.patch('random.random')
   def testAllIncomesGetUsed(self, mock_random):
@@ -177,6 +316,15 @@ class PersonTest(unittest.TestCase):
     year_rec = j_canuck.AnnualSetup()
     self.assertEqual(year_rec.growth_rate, 0.05)
 
+  @unittest.mock.patch('random.random', return_value=0.5)
+  def testAnnualSetupAntitheticShocks(self, _):
+    j_canuck = person.Person(strategy=self.default_strategy, antithetic=True)
+    shock = 0.01
+    with unittest.mock.patch('random.normalvariate', side_effect=lambda mean, stddev: mean + shock):
+      year_rec = j_canuck.AnnualSetup()
+    self.assertAlmostEqual(year_rec.growth_rate, world.MEAN_INVESTMENT_RETURN - shock)
+    self.assertAlmostEqual(year_rec.inflation, world.INFLATION_MEAN - shock)
+
   @unittest.mock.patch('random.normalvariate', return_value=0.02)
   def testAnnualSetupInflationFirstYear(self, mock_random):
     j_canuck = person.Person(strategy=self.default_strategy)
@@ -198,6 +346,48 @@ class PersonTest(unittest.TestCase):
     _ = j_canuck.AnnualSetup()
     self.assertEqual(j_canuck.cpi_history, [1, 1.02])
 
+  def testSameRandomStreamSameLife(self):
+    lives = []
+    for _ in range(2):
+      j_canuck = person.Person(self.default_strategy, rng=random.Random(1))
+      j_canuck.LiveLife()
+      lives.append((j_canuck.age, j_canuck.accumulators.lifetime_consumption_summary.mean))
+
+    self.assertEqual(lives[0], lives[1])
+
+  def testRetirementSnapshotResume(self):
+    retiree = person.Person(self.default_strategy, basic_only=True, rng=random.Random(1))
+    year_rec = retiree.LiveWorkingLife()
+    self.assertIsNotNone(year_rec)
+    self.assertFalse(retiree.retired)
+    self.assertTrue(retiree.RetiresThisYear())
+    snapshot = person.RetirementSnapshot(retiree, year_rec)
+
+    for strategy in (self.default_strategy._replace(drawdown_ced_fraction=0.2), self.default_strategy._replace(initial_cd_fraction=0.1)):
+      self.assertEqual(person.WorkingPhase(strategy), person.WorkingPhase(self.default_strategy))
+      j_canuck = person.Person(strategy, basic_only=True, rng=random.Random(1))
+      j_canuck.LiveLife()
+      resumed = snapshot.Resume(strategy)
+      self.assertEqual(resumed.lifetime_consumption_summary.n, j_canuck.accumulators.lifetime_consumption_summary.n)
+      self.assertEqual(resumed.lifetime_consumption_summary.mean, j_canuck.accumulators.lifetime_consumption_summary.mean)
+      self.assertEqual(resumed.distributable_estate.mean, j_canuck.accumulators.distributable_estate.mean)
+
+  def testRetirementSnapshotDeathBeforeRetirement(self):
+    j_canuck = person.Person(self.default_strategy, basic_only=True, rng=random.Random(1), death_uniform=0)
+    self.assertIsNone(j_canuck.LiveWorkingLife())
+    snapshot = person.RetirementSnapshot(j_canuck, None)
+    accumulators = snapshot.Resume(self.default_strategy._replace(drawdown_ced_fraction=0.2))
+
+    self.assertEqual(accumulators.fraction_persons_ruined.n, 1)
+    # Each resumption gets its own copy
+    self.assertIsNot(snapshot.Resume(self.default_strategy), accumulators)
+
+  def testRandomStreamUsedForEarnings(self):
+    rng = random.Random(1)
+    j_canuck = person.Person(self.default_strategy, rng=rng)
+
+    self.assertIs(j_canuck.incomes[0].rng, rng)
+
   def testAnnualSetupRoomTransfer(self):
     j_canuck = person.Person(strategy=self.default_strategy)
     j_canuck.tfsa_room = 30
@@ -213,29 +403,29 @@ class PersonTest(unittest.TestCase):
     strategy = self.default_strategy._replace(planned_retirement_age=63)
     j_canuck = person.Person(strategy=strategy)
     j_canuck.age = 63
-    j_canuck.funds["wp_rrsp"].amount = 5 * world.OAS_BENEFIT
+    j_canuck.funds.amount[funds.WP_RRSP] = 5 * world.OAS_BENEFIT
     year_rec = utils.YearRecord()
 
     j_canuck.OnRetirement(year_rec)
 
-    self.assertIn("bridging", j_canuck.funds)
-    self.assertEqual(j_canuck.funds["bridging"].amount, 2 * world.OAS_BENEFIT)
+    self.assertIn(funds.BRIDGING, j_canuck.funds.open_slots)
+    self.assertEqual(j_canuck.funds.amount[funds.BRIDGING], 2 * world.OAS_BENEFIT)
 
   @unittest.mock.patch.object(incomes.CPP, 'OnRetirement')
   def testOnRetirementBridgingFundNoRRSP(self, _):
     strategy = self.default_strategy._replace(planned_retirement_age=60)
     j_canuck = person.Person(strategy=strategy)
     j_canuck.age = 60
-    j_canuck.funds["wp_rrsp"].amount = 0
-    j_canuck.funds["wp_nonreg"].amount = 2 * world.OAS_BENEFIT
-    j_canuck.funds["wp_tfsa"].amount = 4 * world.OAS_BENEFIT
+    j_canuck.funds.amount[funds.WP_RRSP] = 0
+    j_canuck.funds.amount[funds.WP_NONREG] = 2 * world.OAS_BENEFIT
+    j_canuck.funds.amount[funds.WP_TFSA] = 4 * world.OAS_BENEFIT
     j_canuck.rrsp_room = 6 * world.OAS_BENEFIT
     year_rec = utils.YearRecord()
 
     j_canuck.OnRetirement(year_rec)
 
-    self.assertIn("bridging", j_canuck.funds)
-    self.assertEqual(j_canuck.funds["bridging"].amount, 5 * world.OAS_BENEFIT)
+    self.assertIn(funds.BRIDGING, j_canuck.funds.open_slots)
+    self.assertEqual(j_canuck.funds.amount[funds.BRIDGING], 5 * world.OAS_BENEFIT)
     self.assertIn(funds.WithdrawReceipt(2 * world.OAS_BENEFIT, 0, funds.FUND_TYPE_NONREG), year_rec.withdrawals)
     self.assertIn(funds.WithdrawReceipt(3 * world.OAS_BENEFIT, 0, funds.FUND_TYPE_TFSA), year_rec.withdrawals)
     self.assertAlmostEqual(j_canuck.rrsp_room, world.OAS_BENEFIT)
@@ -245,15 +435,15 @@ class PersonTest(unittest.TestCase):
     strategy = self.default_strategy._replace(planned_retirement_age=60)
     j_canuck = person.Person(strategy=strategy)
     j_canuck.age = 60
-    j_canuck.funds["wp_rrsp"].amount = world.OAS_BENEFIT
-    j_canuck.funds["wp_nonreg"].amount = 2 * world.OAS_BENEFIT
+    j_canuck.funds.amount[funds.WP_RRSP] = world.OAS_BENEFIT
+    j_canuck.funds.amount[funds.WP_NONREG] = 2 * world.OAS_BENEFIT
     j_canuck.rrsp_room = 0.5 * world.OAS_BENEFIT
     year_rec = utils.YearRecord()
 
     j_canuck.OnRetirement(year_rec)
 
-    self.assertIn("bridging", j_canuck.funds)
-    self.assertEqual(j_canuck.funds["bridging"].amount, 1.5 * world.OAS_BENEFIT)
+    self.assertIn(funds.BRIDGING, j_canuck.funds.open_slots)
+    self.assertEqual(j_canuck.funds.amount[funds.BRIDGING], 1.5 * world.OAS_BENEFIT)
     self.assertIn(funds.WithdrawReceipt(0.5 * world.OAS_BENEFIT, 0, funds.FUND_TYPE_NONREG), year_rec.withdrawals)
     self.assertEqual(j_canuck.rrsp_room, 0)
 
@@ -263,21 +453,21 @@ class PersonTest(unittest.TestCase):
                                               initial_cd_fraction=0.05)
     j_canuck = person.Person(strategy=strategy)
     j_canuck.age = 65
-    j_canuck.funds["wp_rrsp"].amount = 1500
-    j_canuck.funds["wp_tfsa"].amount = 1000
-    j_canuck.funds["wp_nonreg"].amount = 500
+    j_canuck.funds.amount[funds.WP_RRSP] = 1500
+    j_canuck.funds.amount[funds.WP_TFSA] = 1000
+    j_canuck.funds.amount[funds.WP_NONREG] = 500
 
     j_canuck.OnRetirement(utils.YearRecord())
 
     self.assertCountEqual(
-        j_canuck.funds.keys(),
-        ("cd_rrsp", "ced_rrsp", "cd_tfsa", "ced_tfsa", "cd_nonreg", "ced_nonreg"))
-    self.assertEqual(j_canuck.funds["cd_rrsp"].amount, 300)
-    self.assertEqual(j_canuck.funds["ced_rrsp"].amount, 1200)
-    self.assertEqual(j_canuck.funds["cd_tfsa"].amount, 200)
-    self.assertEqual(j_canuck.funds["ced_tfsa"].amount, 800)
-    self.assertEqual(j_canuck.funds["cd_nonreg"].amount, 100)
-    self.assertEqual(j_canuck.funds["ced_nonreg"].amount, 400)
+        j_canuck.funds.open_slots,
+        (funds.CD_RRSP, funds.CED_RRSP, funds.CD_TFSA, funds.CED_TFSA, funds.CD_NONREG, funds.CED_NONREG))
+    self.assertEqual(j_canuck.funds.amount[funds.CD_RRSP], 300)
+    self.assertEqual(j_canuck.funds.amount[funds.CED_RRSP], 1200)
+    self.assertEqual(j_canuck.funds.amount[funds.CD_TFSA], 200)
+    self.assertEqual(j_canuck.funds.amount[funds.CED_TFSA], 800)
+    self.assertEqual(j_canuck.funds.amount[funds.CD_NONREG], 100)
+    self.assertEqual(j_canuck.funds.amount[funds.CED_NONREG], 400)
     self.assertEqual(j_canuck.cd_drawdown_amount, 30)
 
   def SetupYearRecForIncomeTax(
@@ -407,9 +597,9 @@ class PersonTest(unittest.TestCase):
     year_rec = utils.YearRecord()
 
     # Set working period fund amounts (these may be split later on)
-    j_canuck.funds["wp_rrsp"].amount = rrsp
-    j_canuck.funds["wp_tfsa"].amount = tfsa
-    j_canuck.funds["wp_nonreg"].amount = nonreg
+    j_canuck.funds.amount[funds.WP_RRSP] = rrsp
+    j_canuck.funds.amount[funds.WP_TFSA] = tfsa
+    j_canuck.funds.amount[funds.WP_NONREG] = nonreg
 
     # The following section roughly approximates Person.AnnualSetup()
     j_canuck.age = age
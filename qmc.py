@@ -0,0 +1,159 @@
+"""Low-discrepancy (quasi-Monte Carlo) point sets."""
+
+import random
+import statistics
+
+def _PolyMulMod(a, b, modulus, degree):
+  """Multiplies two polynomials over GF(2), represented as bit masks, modulo another of the given degree."""
+  result = 0
+  while b:
+    if b & 1:
+      result ^= a
+    b >>= 1
+    a <<= 1
+    if a >> degree & 1:
+      a ^= modulus
+  return result
+
+def _PolyPowMod(base, exponent, modulus, degree):
+  result = 1
+  while exponent:
+    if exponent & 1:
+      result = _PolyMulMod(result, base, modulus, degree)
+    base = _PolyMulMod(base, base, modulus, degree)
+    exponent >>= 1
+  return result
+
+def _PrimeFactors(n):
+  factors = []
+  p = 2
+  while p * p <= n:
+    if n % p == 0:
+      factors.append(p)
+      while n % p == 0:
+        n //= p
+    p += 1
+  if n > 1:
+    factors.append(n)
+  return factors
+
+def IsPrimitive(poly, degree):
+  """Returns whether the polynomial over GF(2) with bit mask poly is primitive.
+
+  A polynomial of degree s is primitive if x has order 2^s - 1 modulo it.
+  """
+  if not poly & 1 or poly >> degree != 1:
+    return False
+  order = 2**degree - 1
+  if degree == 1:
+    return True
+  if _PolyPowMod(2, order, poly, degree) != 1:
+    return False
+  return all(_PolyPowMod(2, order // q, poly, degree) != 1 for q in _PrimeFactors(order))
+
+def PrimitivePolynomials(count):
+  """Returns the first count primitive polynomials over GF(2) as (degree, mask) pairs, by increasing degree."""
+  polynomials = []
+  degree = 1
+  while len(polynomials) < count:
+    for poly in range(2**degree + 1, 2**(degree + 1), 2):
+      if IsPrimitive(poly, degree):
+        polynomials.append((degree, poly))
+        if len(polynomials) == count:
+          break
+    degree += 1
+  return polynomials
+
+
+class SobolSequence(object):
+  """Generates points of a Sobol sequence in [0, 1)^dimensions, in Gray code order.
+
+  The construction follows Joe and Kuo [1]. The first dimension is the van
+  der Corput sequence. Later dimensions use successive primitive polynomials.
+  Their initial direction numbers come from a fixed-seed generator, not
+  from Joe and Kuo's published table. Each dimension is the same every
+  time, whatever the total number of dimensions.
+
+  [1] https://web.maths.unsw.edu.au/~fkuo/sobol/
+  """
+  BITS = 32
+
+  def __init__(self, dimensions):
+    self.dimensions = dimensions
+    self.directions = [[1 << (self.BITS - k) for k in range(1, self.BITS + 1)]]
+    for dimension, (degree, poly) in enumerate(PrimitivePolynomials(dimensions - 1), 1):
+      init_random = random.Random(dimension)
+      m = [init_random.randrange(1, 2**k, 2) for k in range(1, degree + 1)]
+      for k in range(degree, self.BITS):
+        new_m = m[k - degree] ^ (m[k - degree] << degree)
+        for j in range(1, degree):
+          if poly >> (degree - j) & 1:
+            new_m ^= m[k - j] << j
+        m.append(new_m)
+      self.directions.append([m[k] << (self.BITS - k - 1) for k in range(self.BITS)])
+    self.index = 0
+    self.state = [0] * dimensions
+
+  def Next(self):
+    """Returns the next point as a list of coordinates."""
+    point = [x / 2**self.BITS for x in self.state]
+    # The next state differs from this one by the direction number of the lowest zero bit of the index
+    bit = (~self.index & (self.index + 1)).bit_length() - 1
+    self.state = [x ^ directions[bit] for x, directions in zip(self.state, self.directions)]
+    self.index += 1
+    return point
+
+  def Points(self, n):
+    """Returns the next n points."""
+    return [self.Next() for _ in range(n)]
+
+  def Point(self, index, shift=None):
+    """Returns the point at the given index directly, without generating the ones before it.
+
+    If shift is given, it is a list of BITS-bit integers, one per dimension,
+    that the point is XORed with. A random shift is a digital shift [1]: the
+    shifted points keep their stratification, and each is uniformly
+    distributed over the unit cube.
+
+    [1] https://artowen.su.domains/reports/rtms.pdf
+    """
+    state = shift[:] if shift else [0] * self.dimensions
+    gray = index ^ (index >> 1)
+    bit = 0
+    while gray:
+      if gray & 1:
+        state = [x ^ directions[bit] for x, directions in zip(state, self.directions)]
+      gray >>= 1
+      bit += 1
+    return [x / 2**self.BITS for x in state]
+
+  def RandomShift(self, rng=random):
+    """Returns a random digital shift for Point"""
+    return [rng.getrandbits(self.BITS) for _ in range(self.dimensions)]
+
+
+_STANDARD_NORMAL = statistics.NormalDist()
+
+class QuasiRandomStream(object):
+  """Stands in for a random.Random, taking normal draws from the coordinates of one quasi-random point.
+
+  Successive normalvariate calls use successive coordinates, through the
+  inverse normal CDF. Uniform draws, and normal draws beyond the point's
+  dimensions, come from rng.
+  """
+
+  def __init__(self, point, rng=random):
+    self.point = point
+    self.rng = rng
+    self.dimension = 0
+
+  def random(self):
+    return self.rng.random()
+
+  def normalvariate(self, mu=0, sigma=1):
+    if self.dimension >= len(self.point):
+      return self.rng.normalvariate(mu, sigma)
+    # Moving to the middle of the point's 2^-BITS cell keeps the inverse CDF finite
+    u = self.point[self.dimension] + 2**-(SobolSequence.BITS + 1)
+    self.dimension += 1
+    return mu + sigma * _STANDARD_NORMAL.inv_cdf(u)
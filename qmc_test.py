@@ -0,0 +1,54 @@
+import random
+import unittest
+import qmc
+
+class QMCTest(unittest.TestCase):
+
+  def testPrimitivePolynomials(self):
+    # x+1, x^2+x+1, x^3+x+1, x^3+x^2+1, x^4+x+1, x^4+x^3+1
+    self.assertEqual(qmc.PrimitivePolynomials(6), [(1, 3), (2, 7), (3, 11), (3, 13), (4, 19), (4, 25)])
+
+  def testIsPrimitive(self):
+    self.assertTrue(qmc.IsPrimitive(0b10011, 4))
+    # x^4+x^3+x^2+x+1 is irreducible, but x has order 5
+    self.assertFalse(qmc.IsPrimitive(0b11111, 4))
+    self.assertFalse(qmc.IsPrimitive(0b10010, 4))
+
+  def testSobolSequenceFirstDimensions(self):
+    points = qmc.SobolSequence(2).Points(8)
+    self.assertEqual([p[0] for p in points], [0, 0.5, 0.75, 0.25, 0.375, 0.875, 0.625, 0.125])
+    self.assertEqual([p[1] for p in points], [0, 0.5, 0.25, 0.75, 0.375, 0.875, 0.125, 0.625])
+
+  def testSobolSequenceStratification(self):
+    # Every coordinate of the first 2^k points falls in a different interval of width 2^-k
+    points = qmc.SobolSequence(40).Points(64)
+    for d in range(40):
+      self.assertEqual(sorted(p[d] for p in points), [i / 64 for i in range(64)])
+
+  def testSobolSequenceDimensionsIndependentOfCount(self):
+    small = qmc.SobolSequence(5).Points(16)
+    large = qmc.SobolSequence(12).Points(16)
+    self.assertEqual([p[:5] for p in large], small)
+
+  def testPointMatchesSequence(self):
+    sobol = qmc.SobolSequence(7)
+    points = sobol.Points(20)
+    self.assertEqual([sobol.Point(i) for i in range(20)], points)
+
+  def testShiftedPointsKeepStratification(self):
+    sobol = qmc.SobolSequence(3)
+    shift = sobol.RandomShift(random.Random(1))
+    points = [sobol.Point(i, shift) for i in range(16)]
+    for d in range(3):
+      self.assertEqual(sorted(int(p[d] * 16) for p in points), list(range(16)))
+
+  def testQuasiRandomStream(self):
+    stream = qmc.QuasiRandomStream([0.5, 0.975], random.Random(1))
+    self.assertAlmostEqual(stream.normalvariate(10, 2), 10)
+    self.assertAlmostEqual(stream.normalvariate(0, 1), 1.959964, places=5)
+    # Beyond the point's dimensions draws are pseudo-random
+    self.assertEqual(stream.normalvariate(0, 1), random.Random(1).normalvariate(0, 1))
+
+
+if __name__ == '__main__':
+  unittest.main()
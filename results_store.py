@@ -0,0 +1,116 @@
+"""A local SQLite database of every evaluated strategy and its fitness components.
+
+Each evaluation records the strategy, the population it was simulated for,
+the world parameter hash, engine version and sampling options it was
+simulated under, and the value and standard error of every fitness
+component. Sampling options are stored as a hash given by the caller. Weights are not stored;
+fitness is recomputed from the components under whatever weights apply.
+"""
+
+import collections
+import json
+import sqlite3
+import time
+import person
+import world
+
+StoredEvaluation = collections.namedtuple("StoredEvaluation", ["id", "n", "seed", "wall_seconds", "components"])
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS evaluations (
+  id INTEGER PRIMARY KEY,
+  strategy TEXT NOT NULL,
+  %s,
+  gender TEXT NOT NULL,
+  n INTEGER NOT NULL,
+  real_values INTEGER NOT NULL,
+  seed INTEGER,
+  sampling TEXT NOT NULL DEFAULT '',
+  parameter_hash TEXT NOT NULL,
+  engine_version INTEGER NOT NULL,
+  wall_seconds REAL,
+  created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS components (
+  evaluation_id INTEGER NOT NULL REFERENCES evaluations (id),
+  component TEXT NOT NULL,
+  value REAL,
+  stderr REAL,
+  PRIMARY KEY (evaluation_id, component)
+);
+CREATE INDEX IF NOT EXISTS evaluations_by_strategy ON evaluations (strategy, gender, real_values);
+CREATE INDEX IF NOT EXISTS evaluations_by_parameter_hash ON evaluations (parameter_hash, engine_version);
+""" % ",\n  ".join("%s REAL NOT NULL" % field for field in person.Strategy._fields)
+
+def StrategyKey(strategy):
+  """Returns the text that identifies a strategy in the store; floats round trip exactly through JSON"""
+  return json.dumps([float(value) for value in strategy])
+
+def _Float(value):
+  """SQLite stores NaN as NULL, so NULL reads back as NaN"""
+  return float('nan') if value is None else value
+
+
+class ResultsStore(object):
+  """Records and looks up evaluations in a SQLite database file, creating it if need be."""
+
+  def __init__(self, path):
+    self.connection = sqlite3.connect(path)
+    self.connection.executescript(_SCHEMA)
+    # Databases from before sampling options were stored get the column, and their evaluations never match
+    if "sampling" not in [column[1] for column in self.connection.execute("PRAGMA table_info(evaluations)")]:
+      with self.connection:
+        self.connection.execute("ALTER TABLE evaluations ADD COLUMN sampling TEXT NOT NULL DEFAULT ''")
+
+  def Record(self, strategy, gender, n, real_values, rows, seed=None, wall_seconds=None, sampling="",
+             parameter_hash=None, engine_version=person.ENGINE_VERSION):
+    """Stores one evaluation, with components taken from FitnessFunctionCompositionRows. Returns its id.
+
+    sampling is text identifying the sampling options, like
+    mini_ruthen.SamplingHash. parameter_hash defaults to that of the current
+    world parameters.
+    """
+    parameter_hash = parameter_hash or world.ParameterHash()
+    with self.connection:
+      cursor = self.connection.execute(
+          "INSERT INTO evaluations (strategy, %s, gender, n, real_values, seed, sampling, parameter_hash, engine_version, wall_seconds, created) "
+          "VALUES (%s)" % (", ".join(person.Strategy._fields), ", ".join("?" * (len(person.Strategy._fields) + 10))),
+          [StrategyKey(strategy)] + list(strategy) +
+          [gender, n, int(real_values), seed, sampling, parameter_hash, engine_version, wall_seconds, time.time()])
+      evaluation_id = cursor.lastrowid
+      self.connection.executemany(
+          "INSERT INTO components (evaluation_id, component, value, stderr) VALUES (?, ?, ?, ?)",
+          [(evaluation_id, row.component, row.value, row.stderr) for row in rows])
+    return evaluation_id
+
+  def Lookup(self, strategy, gender, real_values, min_n, sampling="", seed=None, parameter_hash=None, engine_version=person.ENGINE_VERSION):
+    """Returns the StoredEvaluation with the largest n of at least min_n matching the arguments, or None.
+
+    If seed is None, evaluations with any seed match. Component values come
+    back as (value, stderr). SQLite cannot tell a NaN stderr from a missing
+    one, so both read back as None.
+    """
+    parameter_hash = parameter_hash or world.ParameterHash()
+    row = self.connection.execute(
+        "SELECT id, n, seed, wall_seconds FROM evaluations "
+        "WHERE strategy = ? AND gender = ? AND real_values = ? AND n >= ? AND sampling = ? AND (? IS NULL OR seed = ?) "
+        "AND parameter_hash = ? AND engine_version = ? "
+        "ORDER BY n DESC, id DESC LIMIT 1",
+        (StrategyKey(strategy), gender, int(real_values), min_n, sampling, seed, seed, parameter_hash, engine_version)).fetchone()
+    if row is None:
+      return None
+    evaluation_id, n, seed, wall_seconds = row
+    components = collections.OrderedDict(
+        (component, (_Float(value), stderr))
+        for component, value, stderr in self.connection.execute(
+            "SELECT component, value, stderr FROM components WHERE evaluation_id = ? ORDER BY rowid", (evaluation_id,)))
+    return StoredEvaluation(evaluation_id, n, seed, wall_seconds, components)
+
+  def Close(self):
+    self.connection.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.Close()
@@ -0,0 +1,102 @@
+import collections
+import math
+import os
+import sqlite3
+import tempfile
+import unittest
+import person
+import results_store
+import world
+
+# Stand-in for mini_ruthen.FitnessFunctionCompositionRow
+Row = collections.namedtuple("Row", ["component", "value", "stderr", "weight", "contribution"])
+
+class ResultsStoreTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.TemporaryDirectory()
+    self.path = os.path.join(self.directory.name, "results.db")
+    self.strategy = person.Strategy(
+        planned_retirement_age=65,
+        savings_threshold=0,
+        savings_rate=0.1,
+        savings_rrsp_fraction=0.1,
+        savings_tfsa_fraction=0.2,
+        lico_target_fraction=1.0,
+        working_period_drawdown_tfsa_fraction=0.5,
+        working_period_drawdown_nonreg_fraction=0.5,
+        oas_bridging_fraction=1.0,
+        drawdown_ced_fraction=0.8,
+        initial_cd_fraction=0.04,
+        drawdown_preferred_rrsp_fraction=0.35,
+        drawdown_preferred_tfsa_fraction=0.5,
+        reinvestment_preference_tfsa_fraction=0.8)
+    self.rows = [Row("A", 10, 0.5, 1, 10), Row("B", 3, None, 0, 0), Row("C", float('nan'), float('nan'), 0, 0)]
+
+  def tearDown(self):
+    self.directory.cleanup()
+
+  def testRecordLookupRoundTrip(self):
+    with results_store.ResultsStore(self.path) as store:
+      store.Record(self.strategy, person.FEMALE, 100, True, self.rows, seed=3, wall_seconds=1.5)
+    with results_store.ResultsStore(self.path) as store:
+      stored = store.Lookup(self.strategy, person.FEMALE, True, 100)
+
+    self.assertEqual(stored.n, 100)
+    self.assertEqual(stored.seed, 3)
+    self.assertEqual(stored.wall_seconds, 1.5)
+    self.assertEqual(list(stored.components), ["A", "B", "C"])
+    self.assertEqual(stored.components["A"], (10, 0.5))
+    self.assertEqual(stored.components["B"], (3, None))
+    self.assertTrue(math.isnan(stored.components["C"][0]))
+
+  def testLookupPrefersLargestSufficientN(self):
+    with results_store.ResultsStore(self.path) as store:
+      store.Record(self.strategy, person.FEMALE, 100, True, self.rows)
+      store.Record(self.strategy, person.FEMALE, 1000, True, self.rows)
+      store.Record(self.strategy, person.FEMALE, 500, True, self.rows)
+
+      self.assertEqual(store.Lookup(self.strategy, person.FEMALE, True, 200).n, 1000)
+      self.assertIsNone(store.Lookup(self.strategy, person.FEMALE, True, 2000))
+
+  def testLookupMatchesEverything(self):
+    with results_store.ResultsStore(self.path) as store:
+      store.Record(self.strategy, person.FEMALE, 100, True, self.rows)
+
+      self.assertIsNotNone(store.Lookup(self.strategy, person.FEMALE, True, 100))
+      self.assertIsNone(store.Lookup(self.strategy._replace(savings_rate=0.2), person.FEMALE, True, 100))
+      self.assertIsNone(store.Lookup(self.strategy, person.MALE, True, 100))
+      self.assertIsNone(store.Lookup(self.strategy, person.FEMALE, False, 100))
+      self.assertIsNone(store.Lookup(self.strategy, person.FEMALE, True, 100, parameter_hash="other"))
+      self.assertIsNone(store.Lookup(self.strategy, person.FEMALE, True, 100, engine_version=person.ENGINE_VERSION + 1))
+
+  def testLookupMatchesSamplingAndSeed(self):
+    with results_store.ResultsStore(self.path) as store:
+      store.Record(self.strategy, person.FEMALE, 100, True, self.rows, seed=3, sampling="antithetic")
+
+      self.assertIsNone(store.Lookup(self.strategy, person.FEMALE, True, 100))
+      self.assertIsNotNone(store.Lookup(self.strategy, person.FEMALE, True, 100, "antithetic"))
+      self.assertIsNotNone(store.Lookup(self.strategy, person.FEMALE, True, 100, "antithetic", seed=3))
+      self.assertIsNone(store.Lookup(self.strategy, person.FEMALE, True, 100, "antithetic", seed=4))
+
+  def testOpenDatabaseWithoutSampling(self):
+    connection = sqlite3.connect(self.path)
+    connection.executescript(results_store._SCHEMA.replace("sampling TEXT NOT NULL DEFAULT '',", ""))
+    connection.close()
+    with results_store.ResultsStore(self.path) as store:
+      store.Record(self.strategy, person.FEMALE, 100, True, self.rows, sampling="plain")
+      self.assertIsNotNone(store.Lookup(self.strategy, person.FEMALE, True, 100, "plain"))
+
+  def testLookupMissesAfterParameterChange(self):
+    with results_store.ResultsStore(self.path) as store:
+      store.Record(self.strategy, person.FEMALE, 100, True, self.rows)
+      original = world.UNEMPLOYMENT_PROBABILITY
+      try:
+        world.UNEMPLOYMENT_PROBABILITY = 0.2
+        self.assertIsNone(store.Lookup(self.strategy, person.FEMALE, True, 100))
+      finally:
+        world.UNEMPLOYMENT_PROBABILITY = original
+
+
+if __name__ == '__main__':
+  unittest.main()
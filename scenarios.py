@@ -0,0 +1,157 @@
+"""Economic scenario generators: models of the inflation and investment return paths that lives live through.
+
+Each model is a namedtuple of its parameters, so it can be compared, hashed
+and sent to worker processes, with a Generate method that returns a
+MarketPath for every life of a whole block in one call, one per random
+stream. Paths are long enough for the longest life in the mortality tables.
+
+IIDNormal is the model Person draws from year by year when no scenario is
+given. AR1Inflation makes inflation persistent [1], RegimeSwitching moves
+between market regimes by a Markov chain [2], and BlockBootstrap resamples
+runs of consecutive years from a history of inflation and returns [3].
+
+[1] https://en.wikipedia.org/wiki/Autoregressive_model
+[2] https://en.wikipedia.org/wiki/Markov_chain
+[3] https://en.wikipedia.org/wiki/Bootstrapping_(statistics)#Block_bootstrap
+"""
+
+import collections
+import csv
+import math
+import random
+import world
+
+# Inflation for each year of the longest life, including the year of death, and investment returns for each year before it
+PATH_YEARS = max(max(world.MALE_MORTALITY), max(world.FEMALE_MORTALITY)) - world.START_AGE + 1
+
+# Inflation and investment return for each year from world.BASE_YEAR on
+MarketPath = collections.namedtuple("MarketPath", ["inflation", "growth_rate"])
+
+Regime = collections.namedtuple("Regime", ["inflation_mean", "inflation_stddev", "return_mean", "return_stddev"])
+
+# Annual persistence of inflation shocks
+AR1_INFLATION_PERSISTENCE = 0.6
+
+# Calm markets, and bear markets with lower and more volatile returns. The chain spends a fifth of
+# years in the bear regime, so the long run mean and standard deviation of returns are close to the world's.
+CALM_REGIME = Regime(world.INFLATION_MEAN, world.INFLATION_STDDEV, world.MEAN_INVESTMENT_RETURN + 0.02, 0.75 * world.STD_INVESTMENT_RETURN)
+BEAR_REGIME = Regime(world.INFLATION_MEAN, 1.5 * world.INFLATION_STDDEV, world.MEAN_INVESTMENT_RETURN - 0.08, 1.5 * world.STD_INVESTMENT_RETURN)
+REGIME_TRANSITIONS = ((0.9, 0.1), (0.4, 0.6))
+
+# Years in each block resampled from a history
+BOOTSTRAP_BLOCK_YEARS = 5
+
+
+class IIDNormal(collections.namedtuple("IIDNormal", ["inflation_mean", "inflation_stddev", "return_mean", "return_stddev"],
+                                       defaults=[world.INFLATION_MEAN, world.INFLATION_STDDEV, world.MEAN_INVESTMENT_RETURN, world.STD_INVESTMENT_RETURN])):
+  """Independent normal inflation and investment return every year"""
+
+  def Generate(self, rngs, years=PATH_YEARS):
+    return [MarketPath([rng.normalvariate(self.inflation_mean, self.inflation_stddev) for _ in range(years)],
+                       [rng.normalvariate(self.return_mean, self.return_stddev) for _ in range(years)])
+            for rng in rngs]
+
+
+class AR1Inflation(collections.namedtuple("AR1Inflation", ["persistence", "inflation_mean", "inflation_stddev", "return_mean", "return_stddev"],
+                                          defaults=[AR1_INFLATION_PERSISTENCE, world.INFLATION_MEAN, world.INFLATION_STDDEV,
+                                                    world.MEAN_INVESTMENT_RETURN, world.STD_INVESTMENT_RETURN])):
+  """Inflation that reverts to its mean by an AR(1) process, and independent normal investment returns.
+
+  Paths start from the stationary distribution, and the innovations are
+  scaled so that inflation in any one year has the same mean and standard
+  deviation as in IIDNormal.
+  """
+
+  def Generate(self, rngs, years=PATH_YEARS):
+    innovation_stddev = self.inflation_stddev * math.sqrt(1 - self.persistence**2)
+    paths = []
+    for rng in rngs:
+      inflation = [rng.normalvariate(self.inflation_mean, self.inflation_stddev)]
+      for _ in range(years - 1):
+        inflation.append(self.inflation_mean + self.persistence * (inflation[-1] - self.inflation_mean) + rng.normalvariate(0, innovation_stddev))
+      paths.append(MarketPath(inflation, [rng.normalvariate(self.return_mean, self.return_stddev) for _ in range(years)]))
+    return paths
+
+
+class RegimeSwitching(collections.namedtuple("RegimeSwitching", ["regimes", "transitions"],
+                                             defaults=[(CALM_REGIME, BEAR_REGIME), REGIME_TRANSITIONS])):
+  """Normal inflation and investment returns whose parameters follow a Markov chain of Regimes.
+
+  transitions[i][j] is the probability of moving from regime i to regime j
+  from one year to the next. Paths start from the chain's stationary
+  distribution.
+  """
+
+  def StationaryDistribution(self):
+    """Returns the long run fraction of years spent in each regime"""
+    distribution = [1 / len(self.regimes)] * len(self.regimes)
+    for _ in range(1000):
+      distribution = [sum(p * row[j] for p, row in zip(distribution, self.transitions)) for j in range(len(self.regimes))]
+    return distribution
+
+  def Generate(self, rngs, years=PATH_YEARS):
+    states = range(len(self.regimes))
+    stationary = self.StationaryDistribution()
+    paths = []
+    for rng in rngs:
+      state = rng.choices(states, stationary)[0]
+      path = MarketPath([], [])
+      for _ in range(years):
+        regime = self.regimes[state]
+        path.inflation.append(rng.normalvariate(regime.inflation_mean, regime.inflation_stddev))
+        path.growth_rate.append(rng.normalvariate(regime.return_mean, regime.return_stddev))
+        state = rng.choices(states, self.transitions[state])[0]
+      paths.append(path)
+    return paths
+
+
+class BlockBootstrap(collections.namedtuple("BlockBootstrap", ["history", "block_years"], defaults=[BOOTSTRAP_BLOCK_YEARS])):
+  """Paths made of blocks of block_years consecutive years of history, a tuple of (inflation, investment return) pairs.
+
+  Blocks start at uniformly chosen years and wrap around the end of the
+  history, so every year is equally likely to be drawn. Runs of bad years
+  within a block are kept together.
+  """
+
+  def Generate(self, rngs, years=PATH_YEARS):
+    paths = []
+    for rng in rngs:
+      path = MarketPath([], [])
+      while len(path.inflation) < years:
+        start = rng.randrange(len(self.history))
+        for i in range(start, start + min(self.block_years, years - len(path.inflation))):
+          inflation, growth_rate = self.history[i % len(self.history)]
+          path.inflation.append(inflation)
+          path.growth_rate.append(growth_rate)
+      paths.append(path)
+    return paths
+
+
+def ReadHistory(path):
+  """Returns the (inflation, investment return) pairs in a CSV file with "inflation" and "return" columns of annual fractions, in file order"""
+  with open(path, newline='') as f:
+    reader = csv.DictReader(f)
+    if not reader.fieldnames or not {"inflation", "return"} <= set(reader.fieldnames):
+      raise ValueError("%s needs inflation and return columns" % path)
+    history = tuple((float(row["inflation"]), float(row["return"])) for row in reader)
+  if not history:
+    raise ValueError("%s has no years of history" % path)
+  return history
+
+def PathRandom(seed, path):
+  """Returns the random stream for one market path of a run with the given root seed"""
+  return random.Random("%d/market/%d" % (seed, path))
+
+def GeneratePaths(model, seed, first_life, n, cohort_size=0):
+  """Returns the MarketPaths of lives first_life to first_life + n - 1 of a run with the given root seed.
+
+  Each life's path comes from its own PathRandom stream, so it doesn't
+  depend on which lives are generated together. If cohort_size is set,
+  lives are taken in cohorts of that many, which all live through the same
+  market-wide path.
+  """
+  lives = range(first_life, first_life + n)
+  path_numbers = [life // cohort_size for life in lives] if cohort_size else list(lives)
+  unique = sorted(set(path_numbers))
+  paths = dict(zip(unique, model.Generate([PathRandom(seed, path) for path in unique])))
+  return [paths[path] for path in path_numbers]
@@ -0,0 +1,77 @@
+import os
+import random
+import statistics
+import tempfile
+import unittest
+import scenarios
+import world
+
+class ScenariosTest(unittest.TestCase):
+
+  def testIIDNormal(self):
+    paths = scenarios.IIDNormal().Generate([random.Random(i) for i in range(20)])
+    self.assertEqual(len(paths), 20)
+    self.assertEqual(len(paths[0].inflation), scenarios.PATH_YEARS)
+    self.assertEqual(len(paths[0].growth_rate), scenarios.PATH_YEARS)
+    inflation = [x for path in paths for x in path.inflation]
+    self.assertAlmostEqual(statistics.mean(inflation), world.INFLATION_MEAN, delta=0.001)
+    self.assertAlmostEqual(statistics.stdev(inflation), world.INFLATION_STDDEV, delta=0.001)
+
+  def testAR1Inflation(self):
+    model = scenarios.AR1Inflation(persistence=0.8)
+    inflation = model.Generate([random.Random(1)], 20000)[0].inflation
+    self.assertAlmostEqual(statistics.mean(inflation), world.INFLATION_MEAN, delta=0.001)
+    self.assertAlmostEqual(statistics.stdev(inflation), world.INFLATION_STDDEV, delta=0.0005)
+    self.assertAlmostEqual(statistics.correlation(inflation[:-1], inflation[1:]), 0.8, delta=0.02)
+
+  def testRegimeSwitching(self):
+    model = scenarios.RegimeSwitching()
+    stationary = model.StationaryDistribution()
+    self.assertAlmostEqual(stationary[0], 0.8)
+    self.assertAlmostEqual(stationary[1], 0.2)
+
+    growth_rate = model.Generate([random.Random(1)], 50000)[0].growth_rate
+    self.assertAlmostEqual(statistics.mean(growth_rate), world.MEAN_INVESTMENT_RETURN, delta=0.003)
+    # Bear years follow each other, so returns are correlated from year to year
+    self.assertGreater(statistics.correlation(growth_rate[:-1], growth_rate[1:]), 0.05)
+
+  def testBlockBootstrap(self):
+    history = tuple((i / 100, i / 10) for i in range(7))
+    path = scenarios.BlockBootstrap(history, block_years=3).Generate([random.Random(1)], 10)[0]
+    self.assertEqual(len(path.inflation), 10)
+    self.assertEqual(len(path.growth_rate), 10)
+    # Years come from the history in runs of three consecutive years, wrapping around its end
+    years = [round(inflation * 100) for inflation in path.inflation]
+    for start in (0, 3, 6):
+      self.assertEqual(years[start + 1:start + 3], [(years[start] + 1) % 7, (years[start] + 2) % 7])
+    self.assertEqual(path.growth_rate, [year / 10 for year in years])
+
+  def testReadHistory(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      path = os.path.join(tmpdir, "history.csv")
+      with open(path, "w") as f:
+        f.write("year,inflation,return\n2000,0.027,-0.05\n2001,0.025,0.1\n")
+      self.assertEqual(scenarios.ReadHistory(path), ((0.027, -0.05), (0.025, 0.1)))
+
+      with open(path, "w") as f:
+        f.write("year,return\n2000,-0.05\n")
+      with self.assertRaises(ValueError):
+        scenarios.ReadHistory(path)
+
+  def testGeneratePathsIndependentOfBlocks(self):
+    model = scenarios.IIDNormal()
+    whole = scenarios.GeneratePaths(model, 1, 0, 10)
+    self.assertEqual(scenarios.GeneratePaths(model, 1, 4, 6), whole[4:])
+    self.assertNotEqual(whole[0], whole[1])
+
+  def testGeneratePathsCohorts(self):
+    paths = scenarios.GeneratePaths(scenarios.IIDNormal(), 1, 3, 6, cohort_size=4)
+    self.assertEqual(paths[0], scenarios.GeneratePaths(scenarios.IIDNormal(), 1, 0, 1, cohort_size=4)[0])
+    # Lives 4 to 7 are the second cohort
+    self.assertNotEqual(paths[0], paths[1])
+    self.assertEqual(paths[1], paths[4])
+    self.assertNotEqual(paths[4], paths[5])
+
+
+if __name__ == '__main__':
+  unittest.main()
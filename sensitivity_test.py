@@ -0,0 +1,58 @@
+import math
+import random
+import unittest
+import sensitivity
+
+def Ishigami(point):
+  x = [-math.pi + 2 * math.pi * u for u in point]
+  return math.sin(x[0]) + 7 * math.sin(x[1])**2 + 0.1 * x[2]**4 * math.sin(x[0])
+
+class SensitivityTest(unittest.TestCase):
+
+  def testSaltelliDesignShape(self):
+    points = sensitivity.SaltelliDesign(8, 3)
+    self.assertEqual(len(points), 8 * 5)
+    a, b = points[:8], points[8:16]
+    ab_1 = points[24:32]
+    for row_a, row_b, row_ab in zip(a, b, ab_1):
+      self.assertEqual(row_ab, [row_a[0], row_b[1], row_a[2]])
+
+  def testSobolIndicesIshigami(self):
+    n = 4096
+    values = [Ishigami(point) for point in sensitivity.SaltelliDesign(n, 3)]
+    first_order, total_order = sensitivity.SobolIndices(values, n, 3)
+
+    # Analytic values for a=7, b=0.1
+    for estimate, expected in zip(first_order, [0.3139, 0.4424, 0]):
+      self.assertAlmostEqual(estimate, expected, delta=0.03)
+    for estimate, expected in zip(total_order, [0.5576, 0.4424, 0.2437]):
+      self.assertAlmostEqual(estimate, expected, delta=0.03)
+
+  def testSobolIndicesNoVariance(self):
+    first_order, total_order = sensitivity.SobolIndices([1] * 12, 3, 2)
+    self.assertTrue(all(math.isnan(s) for s in first_order + total_order))
+
+  def testBootstrapSobolIndices(self):
+    n = 256
+    rng = random.Random(1)
+    chunk_values = [[Ishigami(point) + rng.gauss(0, 0.5) for _ in range(8)]
+                    for point in sensitivity.SaltelliDesign(n, 3)]
+    first_order, total_order = sensitivity.BootstrapSobolIndices(chunk_values, n, 3, resamples=50, rng=random.Random(2))
+
+    self.assertEqual(len(first_order), 3)
+    for estimate, low, high in first_order + total_order:
+      self.assertLessEqual(low, high)
+      self.assertGreater(high - low, 0)
+    self.assertAlmostEqual(total_order[1][0], 0.4424, delta=0.1)
+
+  def testBootstrapSobolIndicesIdenticalChunks(self):
+    n = 64
+    chunk_values = [[Ishigami(point)] * 4 for point in sensitivity.SaltelliDesign(n, 3)]
+    first_order, _ = sensitivity.BootstrapSobolIndices(chunk_values, n, 3, resamples=20)
+    for estimate, low, high in first_order:
+      self.assertAlmostEqual(low, estimate)
+      self.assertAlmostEqual(high, estimate)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,92 @@
+"""Writes a JSON-lines stream of run statistics that can be tailed while a run is in progress."""
+
+import json
+import time
+
+
+def EvaluationFields(timing, person_years):
+  """Summarizes a PopulationTiming for one fitness evaluation as a dict.
+
+  person_years is the number of simulated years lived, e.g. the count of the
+  lifetime consumption accumulator.
+  """
+  lives = sum(t.n for t in timing.worker_timings)
+  busy_seconds = sum(t.simulation_seconds for t in timing.worker_timings)
+  return {
+      "wall_seconds": timing.wall_seconds,
+      "lives": lives,
+      "lives_per_sec": lives / timing.wall_seconds if timing.wall_seconds else None,
+      "person_years": person_years,
+      "person_years_per_sec": person_years / timing.wall_seconds if timing.wall_seconds else None,
+      "workers": timing.workers,
+      "pool_utilization": busy_seconds / (timing.wall_seconds * timing.workers) if timing.wall_seconds else None,
+      "peak_rss_kb": [t.peak_rss_kb for t in timing.worker_timings],
+  }
+
+
+class GenerationStats(object):
+  """Totals the evaluations done over one generation of an optimization run."""
+
+  def __init__(self):
+    self.start = time.perf_counter()
+    self.evaluations = 0
+    self.cache_hits = 0
+    self.lives = 0
+    self.person_years = 0
+    self.evaluation_seconds = 0
+    self.busy_seconds = 0
+    self.worker_seconds = 0
+    self.peak_rss_kb = 0
+
+  def AddEvaluation(self, timing, person_years):
+    self.evaluations += 1
+    self.lives += sum(t.n for t in timing.worker_timings)
+    self.person_years += person_years
+    self.evaluation_seconds += timing.wall_seconds
+    self.busy_seconds += sum(t.simulation_seconds for t in timing.worker_timings)
+    self.worker_seconds += timing.wall_seconds * timing.workers
+    self.peak_rss_kb = max([self.peak_rss_kb] + [t.peak_rss_kb for t in timing.worker_timings])
+
+  def AddCacheHit(self):
+    self.cache_hits += 1
+
+  def Fields(self):
+    wall_seconds = time.perf_counter() - self.start
+    return {
+        "wall_seconds": wall_seconds,
+        "evaluations": self.evaluations,
+        "cache_hits": self.cache_hits,
+        "lives": self.lives,
+        "lives_per_sec": self.lives / wall_seconds if wall_seconds else None,
+        "person_years": self.person_years,
+        "person_years_per_sec": self.person_years / wall_seconds if wall_seconds else None,
+        "pool_utilization": self.busy_seconds / self.worker_seconds if self.worker_seconds else None,
+        "peak_rss_kb": self.peak_rss_kb,
+    }
+
+
+class TelemetryWriter(object):
+  """Appends one JSON object per line to a file.
+
+  The file is line buffered so that every record is visible to readers as soon
+  as it is written, without an explicit flush.
+  """
+
+  def __init__(self, path):
+    self.out = open(path, 'a', buffering=1)
+    self.start = time.time()
+
+  def Write(self, record_type, **fields):
+    now = time.time()
+    record = {"type": record_type, "time": now, "elapsed_seconds": now - self.start}
+    record.update(fields)
+    self.out.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+  def Close(self):
+    self.out.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.Close()
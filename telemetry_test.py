@@ -0,0 +1,57 @@
+import collections
+import json
+import os
+import tempfile
+import unittest
+import telemetry
+
+# Stand-ins for the timing records produced by mini_ruthen.TimedRunPopulation
+WorkerTiming = collections.namedtuple("WorkerTiming", ["n", "simulation_seconds", "peak_rss_kb"])
+PopulationTiming = collections.namedtuple("PopulationTiming", ["workers", "wall_seconds", "pool_startup_seconds", "merge_seconds", "worker_timings"])
+
+class TelemetryTest(unittest.TestCase):
+
+  def setUp(self):
+    self.timing = PopulationTiming(2, 4.0, 0.1, 0.1, [WorkerTiming(50, 3.0, 1000), WorkerTiming(50, 3.5, 1200)])
+
+  def testEvaluationFields(self):
+    fields = telemetry.EvaluationFields(self.timing, 2000)
+
+    self.assertEqual(fields["lives"], 100)
+    self.assertAlmostEqual(fields["lives_per_sec"], 25)
+    self.assertAlmostEqual(fields["person_years_per_sec"], 500)
+    self.assertAlmostEqual(fields["pool_utilization"], 6.5 / 8)
+    self.assertEqual(fields["peak_rss_kb"], [1000, 1200])
+
+  def testGenerationStats(self):
+    stats = telemetry.GenerationStats()
+    stats.AddEvaluation(self.timing, 2000)
+    stats.AddEvaluation(self.timing, 1000)
+    stats.AddCacheHit()
+    fields = stats.Fields()
+
+    self.assertEqual(fields["evaluations"], 2)
+    self.assertEqual(fields["cache_hits"], 1)
+    self.assertEqual(fields["lives"], 200)
+    self.assertEqual(fields["person_years"], 3000)
+    self.assertAlmostEqual(fields["pool_utilization"], 13 / 16)
+    self.assertEqual(fields["peak_rss_kb"], 1200)
+
+  def testTelemetryWriterAppends(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      path = os.path.join(tmpdir, "telemetry.jsonl")
+      with telemetry.TelemetryWriter(path) as writer:
+        writer.Write("evaluation", fitness=1.5)
+      with telemetry.TelemetryWriter(path) as writer:
+        writer.Write("generation", generation=0)
+
+      with open(path) as f:
+        records = [json.loads(line) for line in f]
+
+    self.assertEqual([r["type"] for r in records], ["evaluation", "generation"])
+    self.assertEqual(records[0]["fitness"], 1.5)
+    self.assertEqual(records[1]["generation"], 0)
+
+
+if __name__ == '__main__':
+  unittest.main()
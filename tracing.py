@@ -0,0 +1,260 @@
+"""Writes sampled per-life and per-year traces of simulated lives to compressed columnar files.
+
+Rows are buffered into chunks, and a background thread writes each chunk as
+a NumPy .npz archive holding one .npy array per column. The queue between
+them holds only a few chunks, so memory use doesn't grow with the number of
+lives. The archives are written with the standard library only, and load
+with numpy.load, or into pandas with pandas.DataFrame(dict(numpy.load(path))).
+"""
+
+import array
+import collections
+import os
+import queue
+import sys
+import threading
+import zipfile
+import funds
+import incomes
+
+TraceOptions = collections.namedtuple("TraceOptions", ["directory", "sample_every", "per_year", "worker"], defaults=[0])
+
+# Column types are NumPy type strings
+FLOAT = "<f8"
+INT = "<i8"
+BOOL = "|b1"
+
+# Dollar amounts are real if the run is in real dollars
+LIFE_COLUMNS = (
+    ("worker", INT),
+    ("life", INT),
+    ("age_at_death", INT),
+    ("retired", BOOL),
+    ("assets_at_retirement", FLOAT),
+    ("total_retirement_withdrawals", FLOAT),
+    ("total_lifetime_withdrawals", FLOAT),
+    ("total_working_savings", FLOAT),
+    ("positive_earnings_years", INT),
+    ("positive_savings_years", INT),
+    ("ei_years", INT),
+    ("gis_years", INT),
+    ("gross_income_below_lico_years", INT),
+    ("no_assets_years", INT),
+    ("ruined", BOOL),
+    ("received_gis", BOOL),
+    ("ever_below_lico", BOOL),
+    ("consumption_avg_lifetime", FLOAT),
+    ("gross_estate", FLOAT),
+    ("estate_taxes", FLOAT),
+    ("distributable_estate", FLOAT),
+)
+
+# Dollar amounts are nominal; divide by cpi for real values
+YEAR_COLUMNS = (
+    ("worker", INT),
+    ("life", INT),
+    ("age", INT),
+    ("year", INT),
+    ("cpi", FLOAT),
+    ("inflation", FLOAT),
+    ("growth_rate", FLOAT),
+    ("employed", BOOL),
+    ("retired", BOOL),
+    ("earnings", FLOAT),
+    ("ei_benefits", FLOAT),
+    ("cpp_benefits", FLOAT),
+    ("oas_benefits", FLOAT),
+    ("gis_benefits", FLOAT),
+    ("rrsp_withdrawals", FLOAT),
+    ("tfsa_withdrawals", FLOAT),
+    ("nonreg_withdrawals", FLOAT),
+    ("rrsp_deposits", FLOAT),
+    ("tfsa_deposits", FLOAT),
+    ("nonreg_deposits", FLOAT),
+    ("cpp_contribution", FLOAT),
+    ("ei_premium", FLOAT),
+    ("taxable_income", FLOAT),
+    ("taxes_payable", FLOAT),
+    ("sales_taxes", FLOAT),
+    ("consumption", FLOAT),
+    ("assets", FLOAT),
+)
+
+_ARRAY_TYPECODES = {FLOAT: "d", INT: "q", BOOL: "B"}
+
+def NpyBytes(values, dtype):
+  """Returns the contents of a version 1.0 .npy file holding a one dimensional array of values.
+
+  See https://numpy.org/doc/stable/reference/generated/numpy.lib.format.html
+  """
+  data = array.array(_ARRAY_TYPECODES[dtype], values)
+  if sys.byteorder == "big":
+    data.byteswap()
+  header = "{'descr': '%s', 'fortran_order': False, 'shape': (%d,), }" % (dtype, len(data))
+  # The magic string, version, header length and header are padded to a multiple of 64 bytes
+  header += " " * (63 - (10 + len(header)) % 64) + "\n"
+  return b"\x93NUMPY\x01\x00" + len(header).to_bytes(2, "little") + header.encode("latin1") + data.tobytes()
+
+def WriteNpz(path, columns, values):
+  """Writes a compressed .npz archive with one array per column"""
+  partial_path = path + ".partial"
+  with zipfile.ZipFile(partial_path, "w", zipfile.ZIP_DEFLATED) as archive:
+    for (name, dtype), column_values in zip(columns, values):
+      archive.writestr(name + ".npy", NpyBytes(column_values, dtype))
+  os.replace(partial_path, path)
+
+def _YearValues(person, year_rec):
+  def IncomeSum(income_type):
+    return sum(receipt.amount for receipt in year_rec.incomes if receipt.income_type == income_type)
+  def ReceiptSum(receipts, *fund_types):
+    return sum(receipt.amount for receipt in receipts if receipt.fund_type in fund_types)
+  return (
+      year_rec.age,
+      year_rec.year,
+      year_rec.cpi,
+      year_rec.inflation,
+      year_rec.growth_rate,
+      year_rec.is_employed,
+      year_rec.is_retired,
+      IncomeSum(incomes.INCOME_TYPE_EARNINGS),
+      IncomeSum(incomes.INCOME_TYPE_EI),
+      IncomeSum(incomes.INCOME_TYPE_CPP),
+      IncomeSum(incomes.INCOME_TYPE_OAS),
+      IncomeSum(incomes.INCOME_TYPE_GIS),
+      ReceiptSum(year_rec.withdrawals, funds.FUND_TYPE_RRSP, funds.FUND_TYPE_BRIDGING),
+      ReceiptSum(year_rec.withdrawals, funds.FUND_TYPE_TFSA),
+      ReceiptSum(year_rec.withdrawals, funds.FUND_TYPE_NONREG),
+      ReceiptSum(year_rec.deposits, funds.FUND_TYPE_RRSP, funds.FUND_TYPE_BRIDGING),
+      ReceiptSum(year_rec.deposits, funds.FUND_TYPE_TFSA),
+      ReceiptSum(year_rec.deposits, funds.FUND_TYPE_NONREG),
+      year_rec.cpp_contribution,
+      year_rec.ei_premium,
+      year_rec.taxable_income,
+      year_rec.taxes_payable,
+      year_rec.sales_taxes,
+      year_rec.consumption,
+      person.funds.Total(),
+  )
+
+def _LifeValues(person, year_rec):
+  cpi = year_rec.cpi if person.real_values else 1
+  return (
+      person.age,
+      person.retired,
+      person.assets_at_retirement,
+      person.total_retirement_withdrawals,
+      person.total_lifetime_withdrawals,
+      person.total_working_savings,
+      person.positive_earnings_years,
+      person.positive_savings_years,
+      person.ei_years,
+      person.gis_years,
+      person.gross_income_below_lico_years,
+      person.no_assets_years,
+      person.has_been_ruined,
+      person.has_received_gis,
+      person.has_experienced_income_under_lico,
+      person.accumulators.lifetime_consumption_summary.mean,
+      year_rec.gross_estate / cpi,
+      year_rec.estate_taxes / cpi,
+      person.accumulators.distributable_estate.mean,
+  )
+
+
+class _Table(object):
+  """Buffers rows column by column and hands full chunks to the writer thread"""
+
+  def __init__(self, writer, name, columns):
+    self.writer = writer
+    self.name = name
+    self.columns = columns
+    self.values = [[] for _ in columns]
+    self.chunks_written = 0
+
+  def Append(self, row):
+    for column_values, value in zip(self.values, row):
+      column_values.append(value)
+    if len(self.values[0]) >= self.writer.chunk_rows:
+      self.Flush()
+
+  def Flush(self):
+    if not self.values[0]:
+      return
+    path = os.path.join(self.writer.options.directory, "%s-%s-%05d.npz" % (self.writer.prefix, self.name, self.chunks_written))
+    self.writer.Put((path, self.columns, self.values))
+    self.values = [[] for _ in self.columns]
+    self.chunks_written += 1
+
+
+class LifeTrace(object):
+  """What a Person reports its years and its end of life to"""
+
+  def __init__(self, writer, life):
+    self.writer = writer
+    self.key = (writer.options.worker, life)
+
+  def AddYear(self, person, year_rec):
+    if self.writer.year_table:
+      self.writer.year_table.Append(self.key + _YearValues(person, year_rec))
+
+  def AddLife(self, person, year_rec):
+    self.writer.life_table.Append(self.key + _LifeValues(person, year_rec))
+
+
+class TraceWriter(object):
+  """Writes trace files for one worker, named <worker>-<pid>-<life|year>-<chunk>.npz
+
+  Lives whose index is a multiple of options.sample_every are traced. Per-year
+  rows are only written if options.per_year is set.
+  """
+
+  def __init__(self, options, chunk_rows=65536, max_queued_chunks=2):
+    self.options = options
+    self.chunk_rows = chunk_rows
+    self.prefix = "%d-%d" % (options.worker, os.getpid())
+    self.life_table = _Table(self, "life", LIFE_COLUMNS)
+    self.year_table = _Table(self, "year", YEAR_COLUMNS) if options.per_year else None
+    self.error = None
+    os.makedirs(options.directory, exist_ok=True)
+    self.queue = queue.Queue(max_queued_chunks)
+    self.thread = threading.Thread(target=self._WriteChunks, daemon=True)
+    self.thread.start()
+
+  def _WriteChunks(self):
+    while True:
+      chunk = self.queue.get()
+      if chunk is None:
+        return
+      if self.error is None:
+        try:
+          WriteNpz(*chunk)
+        except Exception as e:
+          self.error = e
+
+  def Put(self, chunk):
+    """Queues a chunk for writing, blocking while the queue is full"""
+    if self.error is not None:
+      raise self.error
+    self.queue.put(chunk)
+
+  def ForLife(self, life):
+    """Returns a LifeTrace for life number life if it is sampled, otherwise None"""
+    if life % self.options.sample_every:
+      return None
+    return LifeTrace(self, life)
+
+  def Close(self):
+    """Writes any remaining rows and waits for the writer thread to finish"""
+    self.life_table.Flush()
+    if self.year_table:
+      self.year_table.Flush()
+    self.queue.put(None)
+    self.thread.join()
+    if self.error is not None:
+      raise self.error
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.Close()
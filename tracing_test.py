@@ -0,0 +1,102 @@
+import ast
+import array
+import glob
+import os
+import random
+import tempfile
+import unittest
+import zipfile
+import person
+import tracing
+
+def ReadNpy(data):
+  """Parses a .npy file written by tracing.NpyBytes, returning (header, values)"""
+  header_length = int.from_bytes(data[8:10], "little")
+  header = ast.literal_eval(data[10:10 + header_length].decode("latin1"))
+  typecode = {tracing.FLOAT: "d", tracing.INT: "q", tracing.BOOL: "B"}[header["descr"]]
+  values = array.array(typecode)
+  values.frombytes(data[10 + header_length:])
+  return header, list(values)
+
+def ReadNpz(path):
+  with zipfile.ZipFile(path) as archive:
+    return {name[:-4]: ReadNpy(archive.read(name))[1] for name in archive.namelist()}
+
+class TracingTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.TemporaryDirectory()
+    self.default_strategy = person.Strategy(
+        planned_retirement_age=65,
+        savings_threshold=0,
+        savings_rate=0.1,
+        savings_rrsp_fraction=0.1,
+        savings_tfsa_fraction=0.2,
+        lico_target_fraction=1.0,
+        working_period_drawdown_tfsa_fraction=0.5,
+        working_period_drawdown_nonreg_fraction=0.5,
+        oas_bridging_fraction=1.0,
+        drawdown_ced_fraction=0.8,
+        initial_cd_fraction=0.04,
+        drawdown_preferred_rrsp_fraction=0.35,
+        drawdown_preferred_tfsa_fraction=0.5,
+        reinvestment_preference_tfsa_fraction=0.8)
+
+  def tearDown(self):
+    self.directory.cleanup()
+
+  def testNpyBytes(self):
+    data = tracing.NpyBytes([1.5, -2, 3], tracing.FLOAT)
+    header, values = ReadNpy(data)
+
+    self.assertTrue(data.startswith(b"\x93NUMPY\x01\x00"))
+    self.assertEqual((10 + int.from_bytes(data[8:10], "little")) % 64, 0)
+    self.assertEqual(header, {"descr": "<f8", "fortran_order": False, "shape": (3,)})
+    self.assertEqual(values, [1.5, -2, 3])
+
+  def testNpyBytesBool(self):
+    header, values = ReadNpy(tracing.NpyBytes([True, False], tracing.BOOL))
+
+    self.assertEqual(header["descr"], "|b1")
+    self.assertEqual(values, [1, 0])
+
+  def testTraceWriterSamplesLives(self):
+    options = tracing.TraceOptions(self.directory.name, sample_every=3, per_year=False, worker=2)
+    with tracing.TraceWriter(options) as writer:
+      traced = [life for life in range(10) if writer.ForLife(life)]
+
+    self.assertEqual(traced, [0, 3, 6, 9])
+
+  def testTraceWriterChunks(self):
+    options = tracing.TraceOptions(self.directory.name, sample_every=1, per_year=True, worker=2)
+    random.seed(1)
+    with tracing.TraceWriter(options, chunk_rows=20) as writer:
+      years_lived = []
+      for life in range(3):
+        p = person.Person(self.default_strategy, trace=writer.ForLife(life))
+        p.LiveLife()
+        years_lived.append(p.age - person.world.START_AGE)
+
+    life_paths = sorted(glob.glob(os.path.join(self.directory.name, "*-life-*.npz")))
+    year_paths = sorted(glob.glob(os.path.join(self.directory.name, "*-year-*.npz")))
+    self.assertEqual(len(life_paths), 1)
+    self.assertEqual(len(year_paths), (sum(years_lived) + 19) // 20)
+
+    lives = ReadNpz(life_paths[0])
+    self.assertEqual(set(lives), set(name for name, _ in tracing.LIFE_COLUMNS))
+    self.assertEqual(lives["worker"], [2, 2, 2])
+    self.assertEqual(lives["life"], [0, 1, 2])
+
+    years = [ReadNpz(path) for path in year_paths]
+    self.assertEqual(sum(len(chunk["age"]) for chunk in years), sum(years_lived))
+    self.assertEqual(years[0]["age"][0], person.world.START_AGE)
+
+  def testUntracedPerson(self):
+    p = person.Person(self.default_strategy)
+    p.LiveLife()
+
+    self.assertEqual(os.listdir(self.directory.name), [])
+
+
+if __name__ == '__main__':
+  unittest.main()
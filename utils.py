@@ -38,35 +38,127 @@ class SummaryStatsAccumulator(object):
   to update from intermediate objects of this class as well as from single
   data points.
 
+  Values can also arrive in clusters that are correlated within but
+  independent between, like the two lives of an antithetic pair. If they all
+  do, the standard error is the ratio estimator's [2], computed from the
+  cluster totals, which accounts for the correlation. A cluster given a key,
+  like a randomized quasi-Monte Carlo replicate, can be added a piece at a
+  time, even from different accumulators, as long as they are merged in the
+  end.
+
+  Clusters may also carry control variates: totals of quantities with known
+  expectation, less that expectation. If every cluster does, adjusted_mean
+  and adjusted_stderr come from regressing the clusters' residuals from the
+  ratio estimate on their control variates [3].
+
+  Values may be weighted, using West's weighted form of the updates [4]. n is
+  then the sum of the weights, and the unclustered standard error uses the
+  effective sample size n**2 / weight_squares [5].
+
   [1] http://i.stanford.edu/pub/cstr/reports/cs/tr/79/773/CS-TR-79-773.pdf
+  [2] https://en.wikipedia.org/wiki/Ratio_estimator
+  [3] https://en.wikipedia.org/wiki/Control_variates
+  [4] https://doi.org/10.1145/359146.359153
+  [5] https://en.wikipedia.org/wiki/Effective_sample_size
   """
   def __init__(self):
     self.n = 0
     self.mean = 0
     self.M2 = 0
-
-  def UpdateOneValue(self, value):
-    self.n += 1
+    self.weight_squares = 0  # sum of the squares of the weights
+    # Sums over clusters of their totals S and sizes n, for UpdateCluster
+    self.clusters = 0
+    self.cluster_total_squares = 0  # sum of S**2
+    self.cluster_total_sizes = 0  # sum of S*n
+    self.cluster_size_squares = 0  # sum of n**2
+    self.keyed_clusters = {}  # key -> [S, n]
+    # Sums over clusters of their control variates x, for UpdateCluster with controls
+    self.controlled_clusters = 0
+    self.control_sums = None  # sum of x
+    self.control_products = None  # sum of x*x', as a list of rows
+    self.control_total_products = None  # sum of x*S
+    self.control_size_products = None  # sum of x*n
+    self.keyed_cluster_controls = {}  # key -> x
+
+  def UpdateOneValue(self, value, weight=1):
+    if not weight:
+      return
+    self.n += weight
+    self.weight_squares += weight * weight
     delta = value - self.mean
-    self.mean += delta / self.n
-    self.M2 += delta * (value - self.mean)
+    self.mean += delta * weight / self.n
+    self.M2 += weight * delta * (value - self.mean)
 
-  def UpdateSubsample(self, n, mean, M2):
+  def UpdateSubsample(self, n, mean, M2, weight_squares=None):
+    """Adds a subsample with the given statistics. weight_squares defaults to n, as for unit weights."""
     if not (self.n or n):
       return
     delta = mean - self.mean
     self.mean = (self.mean * self.n + mean * n) / (self.n + n)
     self.M2 += M2 + math.pow(delta, 2) * self.n * n / (self.n + n)
     self.n += n
+    self.weight_squares += n if weight_squares is None else weight_squares
 
-  def UpdateAccumulator(self, acc):
-    self.UpdateSubsample(acc.n, acc.mean, acc.M2)
+  def UpdateAccumulator(self, acc, weight=1):
+    """Adds the values accumulated by acc, each counted weight times"""
+    if not (acc.n or acc.clusters or acc.keyed_clusters):
+      return
+    self.UpdateSubsample(acc.n * weight, acc.mean, acc.M2 * weight, acc.weight_squares * weight * weight)
+    self.clusters += acc.clusters
+    self.cluster_total_squares += acc.cluster_total_squares * weight * weight
+    self.cluster_total_sizes += acc.cluster_total_sizes * weight * weight
+    self.cluster_size_squares += acc.cluster_size_squares * weight * weight
+    for key, (total, n) in acc.keyed_clusters.items():
+      cluster = self.keyed_clusters.setdefault(key, [0, 0])
+      cluster[0] += total * weight
+      cluster[1] += n * weight
+    if acc.controlled_clusters:
+      self.controlled_clusters += acc.controlled_clusters
+      self.control_sums = _AddScaled(self.control_sums, acc.control_sums)
+      self.control_products = [_AddScaled(row, acc_row) for row, acc_row in zip(self.control_products or [None] * len(acc.control_products), acc.control_products)]
+      self.control_total_products = _AddScaled(self.control_total_products, acc.control_total_products, weight)
+      self.control_size_products = _AddScaled(self.control_size_products, acc.control_size_products, weight)
+    for key, controls in acc.keyed_cluster_controls.items():
+      self.keyed_cluster_controls[key] = _AddScaled(self.keyed_cluster_controls.get(key), controls)
+
+  def UpdateCluster(self, acc, key=None, controls=None):
+    """Adds the values accumulated by acc, which has no clusters of its own, as one cluster, or to the cluster with the given key.
+
+    controls, if given, are the cluster's control variates, or its share of them for a keyed cluster.
+    A cluster with controls counts even if it has no values, so that the
+    control variates of all clusters still average to their expectations.
+    """
+    if not acc.n and controls is None:
+      return
+    total = acc.mean * acc.n
+    if key is None:
+      self.clusters += 1
+      self.cluster_total_squares += total * total
+      self.cluster_total_sizes += total * acc.n
+      self.cluster_size_squares += acc.n * acc.n
+      if controls is not None:
+        self.controlled_clusters += 1
+        self.control_sums = _AddScaled(self.control_sums, controls)
+        self.control_products = [_AddScaled(row, controls, x) for row, x in zip(self.control_products or [None] * len(controls), controls)]
+        self.control_total_products = _AddScaled(self.control_total_products, controls, total)
+        self.control_size_products = _AddScaled(self.control_size_products, controls, acc.n)
+    else:
+      cluster = self.keyed_clusters.setdefault(key, [0, 0])
+      cluster[0] += total
+      cluster[1] += acc.n
+      if controls is not None:
+        self.keyed_cluster_controls[key] = _AddScaled(self.keyed_cluster_controls.get(key), controls)
+    self.UpdateSubsample(acc.n, acc.mean, acc.M2, acc.weight_squares)
 
   @property
   def variance(self):
-    """Returns the sample variance, or NaN if fewer than 2 updates."""
-    if self.n > 1:
-      return self.M2 / (self.n - 1)
+    """Returns the sample variance, or NaN if fewer than 2 updates.
+
+    With weights, this is the unbiased estimate for reliability weights,
+    which reduces to the usual one when they are all 1.
+    """
+    if self.n and self.n * self.n > self.weight_squares:
+      return self.M2 / (self.n - self.weight_squares / self.n)
     else:
       return float('nan')
 
@@ -75,14 +167,108 @@ class SummaryStatsAccumulator(object):
     """Returns the sample standard deviation, or NaN if fewer than 2 updates."""
     return math.sqrt(self.variance)
 
+  def _ResidualSquares(self):
+    """Returns the sum over clusters of the squares of their residuals S - mean * n"""
+    residual_squares = (self.cluster_total_squares - 2 * self.mean * self.cluster_total_sizes +
+                        self.mean * self.mean * self.cluster_size_squares)
+    residual_squares += sum((total - self.mean * n)**2 for total, n in self.keyed_clusters.values())
+    return residual_squares
+
   @property
   def stderr(self):
-    """Returns the standard error, or NaN if fewer than 2 updates."""
+    """Returns the standard error, or NaN if fewer than 2 updates or clusters."""
+    clusters = self.clusters + len(self.keyed_clusters)
+    if clusters:
+      if clusters < 2:
+        return float('nan')
+      return math.sqrt(max(self._ResidualSquares(), 0) * clusters / (clusters - 1)) / self.n
     if self.n:
-      return math.sqrt(self.variance/self.n)
+      return math.sqrt(self.variance / self.effective_n)
     else:
       return float('nan')
 
+  @property
+  def effective_n(self):
+    """Returns the effective sample size, which is n if all weights are 1."""
+    return self.n * self.n / self.weight_squares if self.n else 0
+
+  def _ControlAdjustment(self):
+    """Returns the control variate adjusted (mean, stderr), or None if some cluster has no control variates"""
+    clusters = self.clusters + len(self.keyed_clusters)
+    if not clusters or not self.n or self.controlled_clusters + len(self.keyed_cluster_controls) < clusters:
+      return None
+    sums = list(self.control_sums or [])
+    products = [list(row) for row in self.control_products or []]
+    total_products = list(self.control_total_products or [])
+    size_products = list(self.control_size_products or [])
+    for key, controls in self.keyed_cluster_controls.items():
+      total, n = self.keyed_clusters[key]
+      sums = _AddScaled(sums or None, controls)
+      products = [_AddScaled(row or None, controls, x) for row, x in zip(products or [None] * len(controls), controls)]
+      total_products = _AddScaled(total_products or None, controls, total)
+      size_products = _AddScaled(size_products or None, controls, n)
+
+    # Regress the residuals S - mean * n, which sum to zero, on the centered control variates
+    means = [x / clusters for x in sums]
+    covariances = [[products[i][j] - clusters * means[i] * means[j] for j in range(len(means))] for i in range(len(means))]
+    residual_covariances = [total_product - self.mean * size_product for total_product, size_product in zip(total_products, size_products)]
+    coefficients = _SolveLinear(covariances, residual_covariances)
+    if coefficients is None:
+      return None
+    used = sum(1 for coefficient in coefficients if coefficient)
+    mean = self.mean - sum(b * x for b, x in zip(coefficients, sums)) / self.n
+    if clusters < used + 2:
+      return mean, float('nan')
+    residual_squares = self._ResidualSquares() - sum(b * c for b, c in zip(coefficients, residual_covariances))
+    return mean, math.sqrt(max(residual_squares, 0) * clusters / (clusters - used - 1)) / self.n
+
+  @property
+  def adjusted_mean(self):
+    """Returns the control variate adjusted mean, or the mean if there are no control variates."""
+    adjustment = self._ControlAdjustment()
+    return self.mean if adjustment is None else adjustment[0]
+
+  @property
+  def adjusted_stderr(self):
+    """Returns the standard error of adjusted_mean."""
+    adjustment = self._ControlAdjustment()
+    return self.stderr if adjustment is None else adjustment[1]
+
+
+def _AddScaled(values, increments, scale=1):
+  """Returns values plus scale times increments, elementwise. values may be None, for zeros."""
+  if values is None:
+    return [scale * increment for increment in increments]
+  return [value + scale * increment for value, increment in zip(values, increments)]
+
+def _SolveLinear(matrix, vector):
+  """Solves matrix * x = vector by Gaussian elimination with partial pivoting.
+
+  Variables whose column is degenerate, like a control variate that never
+  varies, are set to zero. Returns None if the system is otherwise singular.
+  """
+  size = len(vector)
+  scale = max([abs(matrix[i][i]) for i in range(size)] + [0])
+  if not scale:
+    return [0] * size
+  keep = [i for i in range(size) if matrix[i][i] > 1e-12 * scale]
+  rows = [[matrix[i][j] for j in keep] + [vector[i]] for i in keep]
+  for column in range(len(keep)):
+    pivot = max(range(column, len(keep)), key=lambda row: abs(rows[row][column]))
+    if abs(rows[pivot][column]) <= 1e-12 * scale:
+      return None
+    rows[column], rows[pivot] = rows[pivot], rows[column]
+    for row in range(column + 1, len(keep)):
+      factor = rows[row][column] / rows[column][column]
+      rows[row] = [a - factor * b for a, b in zip(rows[row], rows[column])]
+  solution = [0] * len(keep)
+  for row in reversed(range(len(keep))):
+    solution[row] = (rows[row][-1] - sum(rows[row][j] * solution[j] for j in range(row + 1, len(keep)))) / rows[row][row]
+  result = [0] * size
+  for i, value in zip(keep, solution):
+    result[i] = value
+  return result
+
 
 class QuantileAccumulator(object):
   """This uses a streaming parallel histogram building algorithm described by
@@ -122,32 +308,58 @@ class QuantileAccumulator(object):
       else:
         diffs[0:2] = [(self.bins[1][0] - self.bins[0][0], diffs[1][1])]
 
-  def UpdateOneValue(self, value):
-    bisect.insort_left(self.bins, (value, 1))
+  def UpdateOneValue(self, value, weight=1):
+    if not weight:
+      return
+    bisect.insort_left(self.bins, (value, weight))
     self._Merge()
 
   def UpdateHistogram(self, bins):
+    if not bins:
+      return
     self.bins.extend(bins)
     self.bins.sort()
     self._Merge()
 
-  def UpdateAccumulator(self, acc):
-    self.UpdateHistogram(acc.bins)
+  def UpdateAccumulator(self, acc, weight=1):
+    """Adds acc's histogram, with its counts multiplied by weight"""
+    self.UpdateHistogram(acc.bins if weight == 1 else [(value, count * weight) for value, count in acc.bins if count * weight])
+
+  def UpdateCluster(self, acc, key=None, controls=None):
+    self.UpdateAccumulator(acc)
 
   def Quantile(self, q):
-    if q < 0 or 1 < q:
-      raise ValueError("quantile should be a number between 0 and 1, inclusive")
+    return self.Finalize().Quantile(q)
+
+  def Finalize(self):
+    """Returns a FinalizedQuantileAccumulator for answering quantile queries on the current histogram"""
+    return FinalizedQuantileAccumulator(self.bins)
+
+
+class FinalizedQuantileAccumulator(object):
+  """A read only view of a QuantileAccumulator histogram with its cumulative counts precomputed.
+
+  Each quantile query is a binary search, so it is cheap to ask for many.
+  """
+  def __init__(self, bins):
+    self.bins = list(bins)
 
     # Cumulative sum of the counts at each bin point, treating the point as the center of the bin
     bin_counts = [0] + [b[1] for b in self.bins] + [0]
-    cumsums = [0]
+    self.cumsums = [0]
     for i in range(1, len(bin_counts)):
       bin_count = (bin_counts[i] + bin_counts[i-1])/2
-      cumsums.append(cumsums[-1] + bin_count)
+      self.cumsums.append(self.cumsums[-1] + bin_count)
+
+  def Quantile(self, q):
+    if q < 0 or 1 < q:
+      raise ValueError("quantile should be a number between 0 and 1, inclusive")
+    if not self.bins:
+      return float('nan')
 
     # Find the index of the interval in which the desired quantile lies
-    n_points = q * cumsums[-1]
-    i = bisect.bisect(cumsums, n_points)-1
+    n_points = q * self.cumsums[-1]
+    i = bisect.bisect(self.cumsums, n_points)-1
 
     if i <= 0:
       # special case, quantile falls before first bin
@@ -156,9 +368,13 @@ class QuantileAccumulator(object):
       # Special case, quantile falls at or after last bin
       return self.bins[-1][0]
     else:
-      bin_frac = (n_points - cumsums[i])/(cumsums[i+1] - cumsums[i])
+      bin_frac = (n_points - self.cumsums[i])/(self.cumsums[i+1] - self.cumsums[i])
       return self.bins[i-1][0] + bin_frac * (self.bins[i][0] - self.bins[i-1][0])
 
+  def Quantiles(self, qs):
+    """Returns a list with the quantile for each q in qs"""
+    return [self.Quantile(q) for q in qs]
+
 
 class PicklableLambda(object):
   """cPickle is dumb, but we need lambdas."""
@@ -177,12 +393,20 @@ class KeyedAccumulator(object):
     self.default_factory = PicklableLambda(subaccumulator_class, subaccumulator_args)
     self._accumulators = collections.defaultdict(self.default_factory)
 
-  def UpdateOneValue(self, value, key):
-    self._accumulators[key].UpdateOneValue(value)
+  def UpdateOneValue(self, value, key, weight=1):
+    self._accumulators[key].UpdateOneValue(value, weight)
 
-  def UpdateAccumulator(self, acc):
+  def UpdateAccumulator(self, acc, weight=1):
     for key in acc._accumulators:
-      self._accumulators[key].UpdateAccumulator(acc._accumulators[key])
+      self._accumulators[key].UpdateAccumulator(acc._accumulators[key], weight)
+
+  def UpdateCluster(self, acc, cluster_key=None, controls=None):
+    """Adds each of acc's subaccumulators as a cluster of the subaccumulator with the same key.
+
+    Control variates are only used for fitness components, so they are ignored here.
+    """
+    for key in acc._accumulators:
+      self._accumulators[key].UpdateCluster(acc._accumulators[key], cluster_key)
 
   def Query(self, keys):
     """Returns an accumulator resulting from the merge of all subaccumulators with the given keys."""
@@ -192,9 +416,93 @@ class KeyedAccumulator(object):
       result.UpdateAccumulator(self._accumulators.get(key, default))
     return result        
 
+  def Finalize(self, groups=None):
+    """Returns a FinalizedKeyedAccumulator snapshot, for SummaryStatsAccumulator subaccumulators.
+
+    groups maps names to lists of keys. Each group is merged once here, rather
+    than on every Query.
+    """
+    groups = groups or {}
+    return FinalizedKeyedAccumulator(
+        {key: SummarySnapshot.FromAccumulator(acc) for key, acc in self._accumulators.items()},
+        {name: SummarySnapshot.FromAccumulator(self.Query(keys)) for name, keys in groups.items()})
+
+
+class SummarySnapshot(collections.namedtuple("SummarySnapshot", ["n", "mean", "stderr"])):
+  """The statistics of a SummaryStatsAccumulator at some point in time"""
+
+  @classmethod
+  def FromAccumulator(cls, acc):
+    return cls(acc.n, acc.mean, acc.stderr)
+
+EMPTY_SUMMARY_SNAPSHOT = SummarySnapshot.FromAccumulator(SummaryStatsAccumulator())
+
+
+class FinalizedKeyedAccumulator(object):
+  """A read only table of SummarySnapshots by key and by group of keys, made by KeyedAccumulator.Finalize"""
+
+  def __init__(self, keys, groups):
+    self.keys = keys
+    self.groups = groups
+
+  def __getitem__(self, key):
+    """Returns the snapshot for key, which is empty if nothing was accumulated for it"""
+    return self.keys.get(key, EMPTY_SUMMARY_SNAPSHOT)
+
+  def Group(self, name):
+    return self.groups[name]
+
+
+class NullAccumulator(object):
+  """Stands in for an accumulator that nothing will read, ignoring all updates"""
+  n = 0
+  mean = float('nan')
+  stddev = float('nan')
+  stderr = float('nan')
+  adjusted_mean = float('nan')
+  adjusted_stderr = float('nan')
+
+  def UpdateOneValue(self, *args, weight=1):
+    pass
+
+  def UpdateAccumulator(self, acc, weight=1):
+    pass
+
+  def UpdateCluster(self, acc, key=None, controls=None):
+    pass
+
+  def Finalize(self):
+    return FinalizedQuantileAccumulator([])
+
+NULL_ACCUMULATOR = NullAccumulator()
+
+
+class ControlVariateAccumulator(object):
+  """Sums the control variates of the lives in a bundle, so they can go with it when it is merged as a cluster"""
+
+  def __init__(self):
+    self.totals = None
+
+  def UpdateOneValue(self, controls):
+    self.totals = _AddScaled(self.totals, controls)
+
+  def UpdateAccumulator(self, acc, weight=1):
+    if acc.totals is not None:
+      self.totals = _AddScaled(self.totals, acc.totals, weight)
+
+  def UpdateCluster(self, acc, key=None, controls=None):
+    self.UpdateAccumulator(acc)
+
 
 class AccumulatorBundle(object):
-  def __init__(self, basic_only=False):
+  """All the accumulators for a population, or for one person.
+
+  The fitness function accumulators always exist; the rest only exist unless
+  basic_only is set. If plan is given, it is the set of names of the fitness
+  function accumulators that will be read, and the others are replaced by
+  NULL_ACCUMULATOR. Bundles that get merged together need the same plan.
+  """
+  def __init__(self, basic_only=False, plan=None):
     # Accumulators needed for fitness function
     self.lifetime_consumption_summary = SummaryStatsAccumulator()
     self.lifetime_consumption_hist = QuantileAccumulator()
@@ -222,6 +530,14 @@ class AccumulatorBundle(object):
     self.retirement_consumption_less_working_consumption = SummaryStatsAccumulator()
     self.distributable_estate = SummaryStatsAccumulator()
 
+    if plan is not None:
+      for name in list(self.__dict__):
+        if name not in plan:
+          setattr(self, name, NULL_ACCUMULATOR)
+
+    # Control variates of the lives accumulated, whatever the plan
+    self.control_variates = ControlVariateAccumulator()
+
     if basic_only:
       return
 
@@ -299,7 +615,6 @@ class AccumulatorBundle(object):
     self.lifetime_consumption_summary.UpdateOneValue(consumption)
     self.lifetime_consumption_hist.UpdateOneValue(consumption)
     self.discounted_lifetime_consumption_summary.UpdateOneValue(discounted_consumption)
-    self.years_with_negative_consumption.UpdateOneValue(1 if consumption < 0 else 0)
     if is_retired:
       self.retired_consumption_summary.UpdateOneValue(consumption)
       self.retired_consumption_hist.UpdateOneValue(consumption)
@@ -309,10 +624,26 @@ class AccumulatorBundle(object):
       self.working_consumption_summary.UpdateOneValue(consumption)
       self.working_consumption_hist.UpdateOneValue(consumption)
     if hasattr(self, 'consumption_by_age'):
+      self.years_with_negative_consumption.UpdateOneValue(1 if consumption < 0 else 0)
       self.consumption_by_age.UpdateOneValue(consumption, age)
       self.period_consumption.UpdateOneValue(consumption, period)
 
-  def Merge(self, bundle):
-    """Merge in another AccumulatorBundle."""
+  def Tracks(self, name):
+    """Returns whether the named accumulator exists and isn't a NullAccumulator"""
+    return not isinstance(getattr(self, name, NULL_ACCUMULATOR), NullAccumulator)
+
+  def Merge(self, bundle, weight=1):
+    """Merge in another AccumulatorBundle, counting each of its values weight times."""
+    for attr in self.__dict__:
+      getattr(self, attr).UpdateAccumulator(getattr(bundle, attr), weight)
+
+  def MergeCluster(self, bundle, key=None, controlled=False):
+    """Merge in another AccumulatorBundle, whose values are independent of the others but not of each other.
+
+    If key is given, the bundle's values join the cluster with that key. If
+    controlled is set, the bundle's control variates go with it, for the
+    adjusted means of the fitness components.
+    """
+    controls = bundle.control_variates.totals if controlled else None
     for attr in self.__dict__:
-      getattr(self, attr).UpdateAccumulator(getattr(bundle, attr))
+      getattr(self, attr).UpdateCluster(getattr(bundle, attr), key, controls)
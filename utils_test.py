@@ -1,3 +1,5 @@
+import math
+import random
 import unittest
 import utils
 import person
@@ -88,6 +90,120 @@ class UtilsTest(unittest.TestCase):
     self.assertAlmostEqual(acc1.M2, 5200)
     self.assertAlmostEqual(acc1.variance, 216.666666667)
     self.assertAlmostEqual(acc1.stddev, 14.719601444)
+
+  def testSummaryStatsAccumulatorUpdateAccumulatorWeighted(self):
+    acc = utils.SummaryStatsAccumulator()
+    weighted = utils.SummaryStatsAccumulator()
+    for values, weight in [([3, 1, 4], 2), ([1, 5], 1), ([9, 2, 6], 3)]:
+      part = utils.SummaryStatsAccumulator()
+      for value in values:
+        part.UpdateOneValue(value)
+        for _ in range(weight):
+          acc.UpdateOneValue(value)
+      weighted.UpdateAccumulator(part, weight)
+
+    self.assertEqual(weighted.n, acc.n)
+    self.assertAlmostEqual(weighted.mean, acc.mean)
+    self.assertAlmostEqual(weighted.M2, acc.M2)
+
+  def testSummaryStatsAccumulatorUpdateOneValueWeighted(self):
+    acc = utils.SummaryStatsAccumulator()
+    repeated = utils.SummaryStatsAccumulator()
+    for value, weight in [(3, 2), (1, 1), (4, 3), (1, 0), (5, 1)]:
+      acc.UpdateOneValue(value, weight)
+      for _ in range(weight):
+        repeated.UpdateOneValue(value)
+
+    self.assertEqual(acc.n, 7)
+    self.assertEqual(acc.weight_squares, 15)
+    self.assertAlmostEqual(acc.mean, repeated.mean)
+    self.assertAlmostEqual(acc.M2, repeated.M2)
+    self.assertAlmostEqual(acc.effective_n, 49 / 15)
+    self.assertAlmostEqual(acc.variance, acc.M2 / (7 - 15 / 7))
+    self.assertAlmostEqual(acc.stderr, math.sqrt(acc.variance / acc.effective_n))
+
+  def testSummaryStatsAccumulatorUnitWeightsUnchanged(self):
+    acc = utils.SummaryStatsAccumulator()
+    for i in [3, 1, 4, 1, 5, 9, 2, 6]:
+      acc.UpdateOneValue(i)
+
+    self.assertEqual(acc.effective_n, acc.n)
+    self.assertEqual(acc.variance, acc.M2 / (acc.n - 1))
+    self.assertEqual(acc.stderr, math.sqrt(acc.variance / acc.n))
+
+  def testSummaryStatsAccumulatorUpdateAccumulatorWeightedValues(self):
+    whole = utils.SummaryStatsAccumulator()
+    parts = [utils.SummaryStatsAccumulator(), utils.SummaryStatsAccumulator()]
+    for i, (value, weight) in enumerate([(3, 0.5), (1, 2.5), (4, 0.25), (1, 1), (5, 3), (9, 0.75)]):
+      whole.UpdateOneValue(value, weight)
+      parts[i % 2].UpdateOneValue(value, weight)
+    parts[0].UpdateAccumulator(parts[1])
+
+    self.assertAlmostEqual(parts[0].n, whole.n)
+    self.assertAlmostEqual(parts[0].weight_squares, whole.weight_squares)
+    self.assertAlmostEqual(parts[0].mean, whole.mean)
+    self.assertAlmostEqual(parts[0].M2, whole.M2)
+    self.assertAlmostEqual(parts[0].stderr, whole.stderr)
+
+  def testSummaryStatsAccumulatorSingletonClusters(self):
+    acc = utils.SummaryStatsAccumulator()
+    clustered = utils.SummaryStatsAccumulator()
+    for i in [3, 1, 4, 1, 5, 9, 2, 6]:
+      acc.UpdateOneValue(i)
+      cluster = utils.SummaryStatsAccumulator()
+      cluster.UpdateOneValue(i)
+      clustered.UpdateCluster(cluster)
+
+    self.assertEqual(clustered.n, acc.n)
+    self.assertAlmostEqual(clustered.mean, acc.mean)
+    self.assertAlmostEqual(clustered.stderr, acc.stderr)
+
+  def testSummaryStatsAccumulatorAntitheticClusters(self):
+    acc = utils.SummaryStatsAccumulator()
+    merged = utils.SummaryStatsAccumulator()
+    for i in [3, 1, 4, 1, 5]:
+      pair = utils.SummaryStatsAccumulator()
+      pair.UpdateOneValue(10 + i)
+      pair.UpdateOneValue(10 - i)
+      # Clusters survive merging accumulators together
+      cluster_acc = utils.SummaryStatsAccumulator()
+      cluster_acc.UpdateCluster(pair)
+      merged.UpdateAccumulator(cluster_acc)
+
+    self.assertEqual(merged.n, 10)
+    self.assertEqual(merged.clusters, 5)
+    self.assertAlmostEqual(merged.mean, 10)
+    self.assertAlmostEqual(merged.stderr, 0)
+    self.assertGreater(merged.stddev, 0)
+
+  def testSummaryStatsAccumulatorKeyedClusters(self):
+    # Two replicates, each split over two accumulators
+    whole = utils.SummaryStatsAccumulator()
+    parts = [utils.SummaryStatsAccumulator(), utils.SummaryStatsAccumulator()]
+    for key, values in [(0, [1, 2, 3, 4]), (1, [5, 6, 7, 9])]:
+      cluster = utils.SummaryStatsAccumulator()
+      for i, value in enumerate(values):
+        cluster.UpdateOneValue(value)
+        part = utils.SummaryStatsAccumulator()
+        part.UpdateOneValue(value)
+        parts[i % 2].UpdateCluster(part, key)
+      whole.UpdateCluster(cluster)
+    parts[0].UpdateAccumulator(parts[1])
+
+    self.assertEqual(parts[0].n, 8)
+    self.assertAlmostEqual(parts[0].mean, whole.mean)
+    self.assertAlmostEqual(parts[0].stderr, whole.stderr)
+    # The replicate means are 2.5 and 6.75
+    self.assertAlmostEqual(parts[0].stderr, 2.125)
+
+  def testSummaryStatsAccumulatorOneCluster(self):
+    pair = utils.SummaryStatsAccumulator()
+    pair.UpdateOneValue(1)
+    pair.UpdateOneValue(2)
+    acc = utils.SummaryStatsAccumulator()
+    acc.UpdateCluster(pair)
+
+    self.assertTrue(math.isnan(acc.stderr))
   
   def assertHistogramsEqual(self, hist1, hist2, places=7):
     """Compares two lists of (float, int) tuples for equality."""
@@ -101,6 +217,64 @@ class UtilsTest(unittest.TestCase):
     if fail:
       self.fail("Histograms differ: a=%r, b=%r" % (hist1, hist2))
 
+  def testSummaryStatsAccumulatorControlVariates(self):
+    acc = utils.SummaryStatsAccumulator()
+    for x in [0.5, -1, 2, 0.25, -0.75]:
+      cluster = utils.SummaryStatsAccumulator()
+      cluster.UpdateOneValue(5 + 3 * x)
+      acc.UpdateCluster(cluster, controls=(x, 0))
+
+    # The values are exactly linear in the first control, and the second never varies
+    self.assertNotAlmostEqual(acc.mean, 5)
+    self.assertAlmostEqual(acc.adjusted_mean, 5)
+    self.assertAlmostEqual(acc.adjusted_stderr, 0)
+
+  def testSummaryStatsAccumulatorControlVariatesMerge(self):
+    whole = utils.SummaryStatsAccumulator()
+    parts = [utils.SummaryStatsAccumulator(), utils.SummaryStatsAccumulator()]
+    for i, (y, x) in enumerate([(3, 0.1), (1, -0.4), (4, 0.3), (1, -0.2), (5, 0.6), (9, 0.9), (2, -0.5), (6, 0.1)]):
+      cluster = utils.SummaryStatsAccumulator()
+      cluster.UpdateOneValue(y)
+      cluster.UpdateOneValue(y + 1)
+      whole.UpdateCluster(cluster, controls=(x,))
+      parts[i % 2].UpdateCluster(cluster, controls=(x,))
+    parts[0].UpdateAccumulator(parts[1])
+
+    self.assertAlmostEqual(parts[0].adjusted_mean, whole.adjusted_mean)
+    self.assertAlmostEqual(parts[0].adjusted_stderr, whole.adjusted_stderr)
+    self.assertLess(whole.adjusted_stderr, whole.stderr)
+
+  def testSummaryStatsAccumulatorControlVariatesEmptyClusters(self):
+    # Only clusters with a positive control have a value, like lives that live to retire
+    acc = utils.SummaryStatsAccumulator()
+    rng = random.Random(1)
+    for _ in range(2000):
+      x = rng.uniform(-1, 1)
+      cluster = utils.SummaryStatsAccumulator()
+      if x > 0:
+        cluster.UpdateOneValue(1 + x)
+      acc.UpdateCluster(cluster, controls=(x,))
+
+    self.assertEqual(acc.clusters, 2000)
+    self.assertAlmostEqual(acc.mean, 1.5, delta=0.02)
+    self.assertAlmostEqual(acc.adjusted_mean, 1.5, delta=0.05)
+    self.assertGreater(acc.adjusted_stderr, 0)
+
+    # Merging keeps the empty clusters
+    merged = utils.SummaryStatsAccumulator()
+    empty = utils.SummaryStatsAccumulator()
+    empty.UpdateCluster(utils.SummaryStatsAccumulator(), controls=(-0.5,))
+    merged.UpdateAccumulator(empty)
+    self.assertEqual(merged.controlled_clusters, 1)
+
+  def testSummaryStatsAccumulatorNoControlVariates(self):
+    acc = utils.SummaryStatsAccumulator()
+    for i in [3, 1, 4, 1, 5]:
+      acc.UpdateOneValue(i)
+
+    self.assertEqual(acc.adjusted_mean, acc.mean)
+    self.assertEqual(acc.adjusted_stderr, acc.stderr)
+
   def testQuantileAccumulatorUpdateOneValueNoMerge(self):
     acc = utils.QuantileAccumulator(max_bins=3)
     acc.UpdateOneValue(5)
@@ -137,6 +311,27 @@ class UtilsTest(unittest.TestCase):
 
     self.assertHistogramsEqual(acc1.bins, [(5, 1), (9, 1), (19, 1), (22, 1)])
 
+  def testQuantileAccumulatorUpdateAccumulatorWeighted(self):
+    acc1 = utils.QuantileAccumulator(max_bins=4)
+    acc1.UpdateOneValue(5)
+    acc2 = utils.QuantileAccumulator(max_bins=2)
+    acc2.UpdateOneValue(9)
+    acc2.UpdateOneValue(19)
+
+    acc1.UpdateAccumulator(acc2, 0.25)
+    acc1.UpdateAccumulator(acc2, 0)
+
+    self.assertHistogramsEqual(acc1.bins, [(5, 1), (9, 0.25), (19, 0.25)])
+
+  def testQuantileAccumulatorUpdateOneValueWeighted(self):
+    acc = utils.QuantileAccumulator(max_bins=2)
+    acc.UpdateOneValue(1, 0.5)
+    acc.UpdateOneValue(2, 0)
+    acc.UpdateOneValue(4, 1.5)
+    acc.UpdateOneValue(10, 2)
+
+    self.assertHistogramsEqual(acc.bins, [(3.25, 2), (10, 2)])
+
   def testQuantileAccumulatorUpdateAccumulatorMerge(self):
     acc1 = utils.QuantileAccumulator(max_bins=2)
     acc1.UpdateOneValue(5)
@@ -201,6 +396,30 @@ class UtilsTest(unittest.TestCase):
     self.assertAlmostEqual(acc.Quantile(0.5), 2)
     self.assertAlmostEqual(acc.Quantile(0.6), 2.3333333)
 
+  def testQuantileAccumulatorQuantileEmpty(self):
+    acc = utils.QuantileAccumulator()
+
+    self.assertTrue(math.isnan(acc.Quantile(0.5)))
+
+  def testFinalizedQuantileAccumulatorQuantiles(self):
+    acc = utils.QuantileAccumulator()
+    acc.bins = [(1, 10), (2, 5), (3, 10)]
+    finalized = acc.Finalize()
+
+    quantiles = finalized.Quantiles([0, 0.4, 0.5, 0.6, 1])
+    for quantile, expected in zip(quantiles, [1, 1.6666667, 2, 2.3333333, 3]):
+      self.assertAlmostEqual(quantile, expected)
+    self.assertRaises(ValueError, finalized.Quantile, 1.5)
+
+  def testFinalizedQuantileAccumulatorIsFrozen(self):
+    acc = utils.QuantileAccumulator()
+    acc.bins = [(1, 10), (2, 5), (3, 10)]
+    finalized = acc.Finalize()
+    acc.UpdateOneValue(100)
+
+    self.assertAlmostEqual(finalized.Quantile(1), 3)
+    self.assertAlmostEqual(acc.Quantile(1), 100)
+
   def testKeyedAccumulatorSummaryStatsUpdateOneValue(self):
     acc = utils.KeyedAccumulator(utils.SummaryStatsAccumulator)
     for i in range(2, 52, 2):
@@ -214,6 +433,16 @@ class UtilsTest(unittest.TestCase):
     self.assertAlmostEqual(subacc.variance, 216.666666667)
     self.assertAlmostEqual(subacc.stddev, 14.719601444)
 
+  def testKeyedAccumulatorSummaryStatsUpdateOneValueWeighted(self):
+    acc = utils.KeyedAccumulator(utils.SummaryStatsAccumulator)
+    acc.UpdateOneValue(2, "a", 3)
+    acc.UpdateOneValue(6, "a", 1)
+    acc.UpdateOneValue(5, "b")
+
+    self.assertEqual(acc.Query(["a"]).n, 4)
+    self.assertAlmostEqual(acc.Query(["a"]).mean, 3)
+    self.assertEqual(acc.Query(["a", "b"]).weight_squares, 11)
+
   def testKeyedAccumulatorQuantileUpdateOneValue(self):
     acc = utils.KeyedAccumulator(utils.QuantileAccumulator, {'max_bins':3})
     acc.UpdateOneValue(5, 'key')
@@ -250,6 +479,28 @@ class UtilsTest(unittest.TestCase):
 
     self.assertHistogramsEqual(subacc.bins, [(5, 1), (9, 1), (22, 1)])
   
+  def testKeyedAccumulatorFinalize(self):
+    acc = utils.KeyedAccumulator(utils.SummaryStatsAccumulator)
+    for i in range(2, 52, 2):
+      acc.UpdateOneValue(i, 'key1' if i < 26 else 'key2')
+
+    snapshot = acc.Finalize({'both': ['key1', 'key2', 'key3']})
+
+    self.assertEqual(snapshot['key1'].n, 12)
+    self.assertAlmostEqual(snapshot['key1'].mean, 13)
+    self.assertEqual(snapshot['key2'].n, 13)
+    self.assertEqual(snapshot.Group('both').n, 25)
+    self.assertAlmostEqual(snapshot.Group('both').mean, 26)
+    self.assertAlmostEqual(snapshot.Group('both').stderr, 2.9439203)
+
+  def testKeyedAccumulatorFinalizeMissingKey(self):
+    acc = utils.KeyedAccumulator(utils.SummaryStatsAccumulator)
+    snapshot = acc.Finalize()
+
+    self.assertEqual(snapshot['key'].n, 0)
+    self.assertEqual(snapshot['key'].mean, acc.Query(['key']).mean)
+    self.assertEqual(len(acc._accumulators), 0)
+
   def testKeyedAccumulatorMissingKeysQueryIsIdempotent(self):
     acc = utils.KeyedAccumulator(utils.QuantileAccumulator)
     subacc = acc.Query(['key'])
@@ -339,5 +590,22 @@ class UtilsTest(unittest.TestCase):
     self.assertEqual(bundle1.pre_disability_retired_consumption_summary.n, 1)
 
 
+  def testAccumulatorBundlePlan(self):
+    plan = ["lifetime_consumption_summary", "retired_consumption_hist"]
+    bundle1 = utils.AccumulatorBundle(basic_only=True, plan=plan)
+    bundle1.UpdateConsumption(200, year=world.BASE_YEAR + 40, is_retired=True, period=person.RETIRED)
+    bundle2 = utils.AccumulatorBundle(basic_only=True, plan=plan)
+    bundle2.UpdateConsumption(100, year=world.BASE_YEAR + 1, is_retired=False, period=person.EMPLOYED)
+    bundle1.Merge(bundle2)
+
+    self.assertTrue(bundle1.Tracks("lifetime_consumption_summary"))
+    self.assertFalse(bundle1.Tracks("lifetime_consumption_hist"))
+    self.assertFalse(bundle1.Tracks("consumption_by_age"))
+    self.assertEqual(bundle1.lifetime_consumption_summary.mean, 150)
+    self.assertHistogramsEqual(bundle1.retired_consumption_hist.bins, [(200, 1)])
+    self.assertEqual(bundle1.working_consumption_summary.n, 0)
+    self.assertTrue(math.isnan(bundle1.working_consumption_summary.mean))
+    self.assertTrue(math.isnan(bundle1.lifetime_consumption_hist.Finalize().Quantile(0.5)))
+
 if __name__ == '__main__':
   unittest.main()
@@ -1,6 +1,7 @@
 # Parameter/Constant definitions for mini-Ruthen
 
 import collections
+import hashlib
 
 # Unless otherwise noted, all dollar amounts are real dollar amounts
 
@@ -414,3 +415,12 @@ UNEMPLOYMENT_PROBABILITY = 0.10
 
 # Fitness component constants
 FRACTION_WORKING_CONSUMPTION = 0.8
+
+def ParameterHash():
+  """Returns a short hex digest of the current values of all the parameters above.
+
+  Results simulated under different parameters hash differently, so stored
+  results can be matched to the world they were simulated in.
+  """
+  parameters = sorted((name, value) for name, value in globals().items() if name.isupper())
+  return hashlib.sha256(repr(parameters).encode()).hexdigest()[:16]
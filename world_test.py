@@ -32,5 +32,16 @@ class ExtendedDictTest(unittest.TestCase):
     self.assertEqual(world.FEDERAL_TAX_SCHEDULE[10200000], 2928837)
     self.assertAlmostEqual(world.FEDERAL_TAX_SCHEDULE[10000], 1500.01137578)
 
+  def testParameterHash(self):
+    digest = world.ParameterHash()
+    self.assertEqual(digest, world.ParameterHash())
+    original = world.UNEMPLOYMENT_PROBABILITY
+    try:
+      world.UNEMPLOYMENT_PROBABILITY = 0.2
+      self.assertNotEqual(digest, world.ParameterHash())
+    finally:
+      world.UNEMPLOYMENT_PROBABILITY = original
+    self.assertEqual(digest, world.ParameterHash())
+
 if __name__ == '__main__':
   unittest.main()